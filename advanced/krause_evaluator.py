@@ -60,6 +60,12 @@ class KrauseEvaluator(object):
     self._save_theta0_ops = None
 
     self._sqrt_MS_g = {}
+    self._assign_sqrt_MS_g_ops = None
+    # Square gradients are summed up in graph while evaluating training set
+    self._sum_square_g = {}
+    self._num_batches = None
+    self._reset_grad_stats_ops = None
+    self._accumulate_grad_stats_op = None
     self._decay_rate_buffer = {}
 
     self._avg_sqrt_MS_g = None
@@ -116,11 +122,39 @@ class KrauseEvaluator(object):
       self._sqrt_MS_g = {
         theta: tf.Variable(tf.zeros_like(theta), trainable=False)
         for theta in var_list}
+    # Accumulators should be neither saved nor restored
+    collections = [tf.GraphKeys.GLOBAL_VARIABLES, pedia.do_not_save]
+    with tf.name_scope('de_sum_square_g'):
+      self._sum_square_g = {
+        theta: tf.Variable(tf.zeros_like(theta), trainable=False,
+                           collections=collections) for theta in var_list}
+      self._num_batches = tf.Variable(
+        0.0, trainable=False, collections=collections, name='num_batches')
+    self._reset_grad_stats_ops = [
+      tf.assign(v, tf.zeros_like(v)) for v in
+      list(self._sum_square_g.values()) + [self._num_batches]]
+    self._assign_sqrt_MS_g_ops = [
+      tf.assign(sqrt_MS_g, tf.sqrt(self._sum_square_g[theta] / tf.cast(
+        self._num_batches, theta.dtype.base_dtype)))
+      for theta, sqrt_MS_g in self._sqrt_MS_g.items()]
     self._save_theta0_ops = [
       tf.assign(theta0, theta) for theta, theta0 in self._theta_0.items()]
     self._reset_theta_ops = [
       tf.assign(theta, theta0) for theta, theta0 in self._theta_0.items()]
 
+  def _create_accumulate_op(self):
+    """Create an op adding square gradients of a batch to accumulators and
+       returning number of batches accumulated, of shape [1]. Should be
+       called after self._grads has been set"""
+    assert len(self._grads) == len(self._var_list)
+    accumulate_ops = [
+      tf.assign_add(self._sum_square_g[var], tf.square(self._grads[var]))
+      for var in self._var_list]
+    with tf.control_dependencies(accumulate_ops):
+      count = tf.assign_add(self._num_batches, 1.0)
+    # Fetches in Model.evaluate should have a first dimension
+    self._accumulate_grad_stats_op = tf.reshape(count, [1])
+
   def _calculate_gradient_stats(self):
     # Sanity check
     checker.check_type(th.train_set, DataSet)
@@ -128,8 +162,10 @@ class KrauseEvaluator(object):
     checker.check_positive_integer(th.de_num_steps)
     self.show_status('Calculating gradient stats on training set ...')
 
-    grad_square = [tf.square(self._grads[var]) for var in self._var_list]
-    fetches = grad_square
+    # Square gradients are accumulated in the same run as forward and
+    # .. backward pass thus only a counter is fetched for each batch
+    self._model.session.run(self._reset_grad_stats_ops)
+    fetches = [self._accumulate_grad_stats_op]
     if self._metric_quantity is not None:
       assert isinstance(self._metric_quantity, Quantity)
       fetches.append(self._metric_quantity.quantities)
@@ -161,14 +197,8 @@ class KrauseEvaluator(object):
         self._metric_quantity.name,
         th.decimal_str(metric_val, th.val_decimals)))
 
-    # Assign mean square grads
-    assign_ops = []
-    for var, output_list in zip(self._var_list, outputs):
-      assert isinstance(output_list, list)
-      mean_square = np.mean(output_list, axis=0)
-      sqrt_mean_square = np.sqrt(mean_square)
-      assign_ops.append(tf.assign(self._sqrt_MS_g[var], sqrt_mean_square))
-    self._model.session.run(assign_ops)
+    # Assign root mean square grads
+    self._model.session.run(self._assign_sqrt_MS_g_ops)
 
     # After gradient stats have been calculated, save them into disk
     # .. if necessary
@@ -184,15 +214,16 @@ class KrauseEvaluator(object):
 
   # region : Public Methods
 
-  def reset_parameters(self):
+  def reset_parameters(self, verbose=True):
     self._model.session.run(self._reset_theta_ops)
-    self.show_status('Model parameters have been reset.')
+    if verbose: self.show_status('Model parameters have been reset.')
 
   def minimize(self, loss):
     assert isinstance(loss, tf.Tensor)
     grads = OrderedDict({
       v: g for v, g in zip(self._var_list, tf.gradients(loss, self._var_list))})
     self._grads = grads
+    self._create_accumulate_op()
     update_ops = []
     for var in self._var_list:
       new_var = (var - self._tf_eta * tf.divide(
@@ -204,7 +235,27 @@ class KrauseEvaluator(object):
       self._calculate_gradient_stats()
     return tf.group(*update_ops)
 
-  def set_hyper_parameters(self, eta, lambd):
+  def get_state(self):
+    """Return initial parameters and sqrt_MS_g keyed by variable names so
+       that they can be loaded into a replica of the model"""
+    theta0, sqrt_MS_g = self._model.session.run(
+      [[self._theta_0[v] for v in self._var_list],
+       [self._sqrt_MS_g[v] for v in self._var_list]])
+    names = [v.name for v in self._var_list]
+    return {'theta0': dict(zip(names, theta0)),
+            'sqrt_MS_g': dict(zip(names, sqrt_MS_g))}
+
+  def load_state(self, state):
+    """Load state got from `get_state` of another evaluator whose model
+       has the same structure"""
+    session = self._model.session
+    for var in self._var_list:
+      theta0 = state['theta0'][var.name]
+      var.load(theta0, session)
+      self._theta_0[var].load(theta0, session)
+      self._sqrt_MS_g[var].load(state['sqrt_MS_g'][var.name], session)
+
+  def set_hyper_parameters(self, eta, lambd, verbose=True):
     assert isinstance(eta, float) and isinstance(lambd, float)
     assert eta > 0 and lambd > 0
     self._eta, self._lambda = eta, lambd
@@ -213,8 +264,44 @@ class KrauseEvaluator(object):
       [self._set_eta_op, self._set_lambda_op],
       feed_dict={self._eta_placeholder: eta, self._lambda_placeholder: lambd})
     # Show status
+    if not verbose: return
     console.show_info('Hyper parameters for dynamic evaluation updated:')
     console.supplement('eta = {}, lambda = {}'.format(eta, lambd))
 
   # endregion : Public Methods
 
+
+if __name__ == '__main__':
+  # Check that accumulating square gradients in graph gives the same
+  # .. sqrt_MS_g as averaging fetched square gradients on a small LSTM
+  rng = np.random.RandomState(0)
+  x = tf.placeholder(tf.float32, [None, 10, 5])
+  y = tf.placeholder(tf.float32, [None, 10, 3])
+  outputs, _ = tf.nn.dynamic_rnn(
+    tf.nn.rnn_cell.LSTMCell(8), x, dtype=tf.float32)
+  loss = tf.reduce_mean(tf.square(tf.layers.dense(outputs, 3) - y))
+
+  ke = KrauseEvaluator.__new__(KrauseEvaluator)
+  ke._create_slots()
+  ke._grads = OrderedDict(
+    zip(ke._var_list, tf.gradients(loss, ke._var_list)))
+  ke._create_accumulate_op()
+  square_grads = [tf.square(ke._grads[v]) for v in ke._var_list]
+  batches = [{x: rng.randn(4, 10, 5), y: rng.randn(4, 10, 3)}
+             for _ in range(20)]
+
+  with tf.Session() as sess:
+    sess.run(tf.global_variables_initializer())
+    # (1) Fetch square gradients of each batch and average them on host
+    output_lists = zip(*[sess.run(square_grads, b) for b in batches])
+    expected = [np.sqrt(np.mean(l, axis=0)) for l in output_lists]
+    # (2) Accumulate in graph (twice to check resetting)
+    for _ in range(2):
+      sess.run(ke._reset_grad_stats_ops)
+      counts = [sess.run(ke._accumulate_grad_stats_op, b) for b in batches]
+      sess.run(ke._assign_sqrt_MS_g_ops)
+    actual = sess.run([ke._sqrt_MS_g[v] for v in ke._var_list])
+    assert counts[-1][0] == len(batches)
+    for e, a in zip(expected, actual):
+      assert np.allclose(e, a, rtol=1e-5, atol=1e-8)
+    print('>> sqrt_MS_g of {} variables matches'.format(len(actual)))
@@ -39,6 +39,12 @@ class AdvancedConfigs(object):
     False, 'Whether to evaluate test set in a common way before dynamic '
            'evaluation')
   de_delay = Flag.integer(1, 'Update delay. First used in LOB prediction')
+  de_workers = Flag.integer(
+    1, 'Number of model replicas evaluating HP grid concurrently in dynamic '
+       'evaluation. A model builder should be provided')
+  de_halving_rounds = Flag.integer(
+    0, 'Rounds of successive halving on prefixes of validation set, each of '
+       'which drops the worse half of HP settings before the full search')
 
   @property
   def de_eta_option(self):
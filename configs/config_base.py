@@ -79,6 +79,9 @@ class Config(
   developer_args = Flag.string(
     '', 'Args for developers to develop', is_key=None)
   verbose_config = Flag.string('', 'String for configuring verbosity')
+  finalize_graph = Flag.boolean(
+    False, 'Whether to finalize graph after model is launched so that any op '
+           'created afterwards raises an error')
 
   stats_max_length = Flag.integer(20, 'Maximum length a Statistic can keep')
 
@@ -141,7 +144,7 @@ class Config(
       return
 
     # If attribute is not a Flag, use default __setattr__
-    attr = object.__getattribute__(self, name)
+    attr = self.get_attr(name)
     if not isinstance(attr, Flag):
       object.__setattr__(self, name, value)
       return
@@ -163,6 +166,8 @@ class Config(
 
     attr._value = value
     if attr.ready_to_be_key: attr._is_key = True
+    # Keep compiled configs in sync
+    attr.notify()
 
     # Replace the attr with a new Flag TODO: tasks with multi hubs?
     # object.__setattr__(self, name, attr.new_value(value))
@@ -191,13 +196,19 @@ class Config(
   def redirect(self, config):
     """Redirect self to config"""
     assert isinstance(config, Config)
+    # Compiled values should be resolved again after redirecting
+    if self.is_compiled:
+      self.decompile()
+      self.redirect(config)
+      self.compile()
+      return
 
     # flag_names = [name for name, value in self.__dict__.items()
     #               if isinstance(value, Flag)]
 
     flag_names = [name for name in config.__dir__()
                   if hasattr(config, name) and
-                  isinstance(object.__getattribute__(config, name), Flag)]
+                  isinstance(config.get_attr(name), Flag)]
     for name in flag_names:
       # value = getattr(config, name)
       # Set flag to self
@@ -226,10 +237,12 @@ class Config(
       self.monitor_weight_grads = True
 
   def get_attr(self, name):
+    compiled_flags = self.__dict__.get('_compiled_flags', {})
+    if name in compiled_flags: return compiled_flags[name]
     return object.__getattribute__(self, name)
 
   def get_flag(self, name):
-    flag = super().__getattribute__(name)
+    flag = self.get_attr(name)
     if not isinstance(flag, Flag):
       raise TypeError('!! flag {} not found'.format(name))
     return flag
@@ -265,5 +278,90 @@ class Config(
 
   # endregion : Public Methods
 
+  # region : Compile
+
+  @property
+  def is_compiled(self):
+    return '_compiled_flags' in self.__dict__
+
+  def compile(self):
+    """Resolve all flags once and store their values as plain instance
+       attributes. The class of self is switched to a subclass without the
+       overridden __getattribute__, so that reading a flag (e.g. in the inner
+       loop of a trainer) is a plain attribute load. Setting a flag via any
+       config sharing the same Flag object refreshes the compiled value.
+    """
+    if self.is_compiled: return
+    # Flags are looked up without triggering properties
+    compiled_flags = OrderedDict()
+    for name in dir(self.__class__):
+      attr = self.__dict__.get(name, getattr(self.__class__, name, None))
+      if isinstance(attr, Flag): compiled_flags[name] = attr
+    flag_names = {}
+    for name, flag in compiled_flags.items():
+      flag_names.setdefault(id(flag), []).append(name)
+      object.__setattr__(self, name, flag.value)
+    object.__setattr__(self, '_compiled_flags', compiled_flags)
+    object.__setattr__(self, '_compiled_flag_names', flag_names)
+    object.__setattr__(self, '__class__', self._get_compiled_class())
+    Flag.compiled_configs.append(self)
+
+  def decompile(self):
+    if not self.is_compiled: return
+    Flag.compiled_configs.remove(self)
+    object.__setattr__(self, '__class__', self.__class__.__bases__[0])
+    compiled_flags = self.__dict__.pop('_compiled_flags')
+    self.__dict__.pop('_compiled_flag_names')
+    for name, flag in compiled_flags.items():
+      object.__setattr__(self, name, flag)
+
+  def refresh(self, flag):
+    """Refresh compiled value of the given flag"""
+    for name in self._compiled_flag_names.get(id(flag), ()):
+      object.__setattr__(self, name, flag.value)
+
+  @classmethod
+  def _get_compiled_class(cls):
+    compiled_class = cls.__dict__.get('_compiled_class', None)
+    if compiled_class is None:
+      compiled_class = type(cls.__name__, (cls,), {
+        '__getattribute__': object.__getattribute__,
+        '__module__': cls.__module__})
+      cls._compiled_class = compiled_class
+    return compiled_class
+
+  # endregion : Compile
+
 
 Config.register()
+
+
+if __name__ == '__main__':
+  import time
+
+  # Micro-benchmark: cost of reading flags which are frequently read in
+  # .. the inner loop of Trainer
+  names = ['note_cycle', 'state_nan_protection', 'etch_on',
+           'terminate_on_nan', 'supreme_reset_flag', 'monitor_weight_grads',
+           'prefetch_depth', 'progress_bar', 'allow_loss_in_loop',
+           'export_note']
+  hub = Config()
+  hub.note_cycle = 10
+  steps = 10000
+
+  def run():
+    tic = time.time()
+    for _ in range(steps):
+      for name in names: getattr(hub, name)
+    return (time.time() - tic) / steps * 1e6
+
+  t0 = run()
+  hub.compile()
+  t1 = run()
+  assert hub.note_cycle == 10
+  hub.note_cycle = 20
+  assert hub.note_cycle == 20
+  hub.decompile()
+  assert hub.note_cycle == 20
+  print('>> {} flag reads per step: {:.2f} us -> {:.2f} us'.format(
+    len(names), t0, t1))
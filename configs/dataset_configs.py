@@ -54,6 +54,13 @@ class DataConfigs(object):
     None, 'Whether to use volume information only', is_key=None)
   horizon = Flag.integer(None, 'Horizon used in FI-2010 data', is_key=None)
 
+  # BigData configs
+  shard_buffer_size = Flag.integer(
+    1, 'Number of shards kept open in BigData.gen_batches when shuffle is '
+       'on. Samples are mixed across all open shards')
+  shard_read_ahead = Flag.boolean(
+    False, 'Whether to load the next shard of BigData in background')
+
   # BETA configs
   use_wheel = Flag.boolean(
     True, 'Whether to used wheel to select sequences', is_key=None)
@@ -12,6 +12,10 @@ flags = tf.app.flags
 # TODO: Value set to Flag should be checked
 
 class Flag(object):
+  # Configs compiled via Config.compile. They are notified when the value of
+  # .. a flag changes so that their compiled values stay in sync
+  compiled_configs = []
+
   def __init__(self, default_value, description, register=None, name=None,
                is_key=False, **kwargs):
     """
@@ -151,6 +155,10 @@ class Flag(object):
   def freeze(self, value):
     self._value = value
     self._frozen = True
+    self.notify()
+
+  def notify(self):
+    for config in Flag.compiled_configs: config.refresh(self)
 
   # endregion : Public Methods
 
@@ -111,6 +111,10 @@ class ModelConfigs(object):
   signal_size = Flag.integer(None, 'Hyper signal size', is_key=None)
 
   etch_string = Flag.string(None, 'An etch config string', is_key=None)
+  etch_global_frac = Flag.float(
+    None, 'If set, this fraction of remaining weights with the smallest '
+          'magnitudes across all etch kernels is pruned in each etch',
+    is_key=None)
 
   lottery_kernel = Flag.string(
     'lottery18', 'Method used in Lottery(EtchKernel) to get new mask',
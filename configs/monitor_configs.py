@@ -3,6 +3,7 @@ from __future__ import division
 from __future__ import print_function
 
 from .flag import Flag
+from tframe.utils import checker
 
 
 class MonitorConfigs(object):
@@ -14,9 +15,13 @@ class MonitorConfigs(object):
   # monitor_preact = Flag.boolean(False, 'Whether to enable pre-act summary')
   # monitor_postact = Flag.boolean(False, 'Whether to enable post-act summary')
   monitor_weight_grads = Flag.boolean(False, 'Whether to monitor weights grad')
+  monitor_grad_cycle = Flag.integer(
+    1, 'Weight gradients are fetched and recorded every this many steps')
 
   def smooth_out_monitor_configs(self):
-    pass
+    # A cycle of 0 makes np.mod return nan thus gradients would never be
+    # .. fetched
+    checker.check_positive_integer(self.monitor_grad_cycle)
 
     # if self.monitor in (True, False):
     #   self.monitor_grad = self.monitor
@@ -10,6 +10,9 @@ class NoteConfigs(object):
 
   gather_file_name = Flag.string('gather.txt', '...')
   gather_summ_name = Flag.string('gather.sum', '...')
+  job_key = Flag.string(
+    None, 'Key of the sweep job this run belongs to. Taken down to note so '
+          'that finished jobs can be skipped when a sweep is resumed')
   show_record_history_in_note = Flag.boolean(False, '...')
 
   export_note = Flag.boolean(False, 'Whether to take notes')
@@ -25,6 +28,12 @@ class NoteConfigs(object):
     False, 'Whether to export tensors to note')
   export_tensors_upon_validation = Flag.boolean(
     False, 'Whether to export tensors after validation')
+  stream_tensors_to_disk = Flag.boolean(
+    False, 'Whether to stream exported tensors to a chunked store in note '
+           'folder instead of keeping them in note')
+  tensor_chunk_size = Flag.integer(16, 'Snapshots per chunk in tensor store')
+  compress_tensor_store = Flag.boolean(
+    False, 'Whether to compress chunks in tensor store')
   export_states = Flag.boolean(False, '...')
   export_dy_ds = Flag.boolean(False, '...')
   export_gates = Flag.boolean(False, '...')
@@ -13,6 +13,9 @@ class RNNConfigs(object):
 
   # Training configs
   parallel_on = Flag.boolean(False, 'Whether to turn on parallel option')
+  state_on_device = Flag.boolean(
+    False, 'Whether to keep train state buffers in non-trainable variables '
+           'instead of fetching and feeding them in each step')
 
   # Basic RNN configs
   rc_dims = Flag.whatever(None, '...')
@@ -17,6 +17,9 @@ class TrainerConfigs(object):
   save_model_at_the_end = Flag.boolean(False, '...')
   overwrite = Flag.boolean(False, 'Whether to overwrite records')
   summary = Flag.boolean(False, 'Whether to write summary')
+  summary_cycle = Flag.integer(
+    1, 'Train step summaries will be evaluated every summary_cycle steps',
+    is_key=None)
   epoch_as_step = Flag.boolean(True, '...')
   snapshot = Flag.boolean(False, 'Whether to take snapshot during training')
   evaluate_model = Flag.boolean(
@@ -94,6 +97,16 @@ class TrainerConfigs(object):
   adam_epsilon = Flag.float(
     1e-8, 'epsilon used for initiating AdamOptimizer', is_key=None)
 
+  prefetch_depth = Flag.integer(
+    0, 'Number of training batches to be prepared in background. '
+       'Prefetching is disabled if set to 0')
+  prefetch_backend = Flag.string(
+    'thread', "Worker backend used for prefetching, 'thread' or 'process'. "
+              "Only 'thread' is safe while a session is running")
+  compile_hub = Flag.boolean(
+    False, 'Whether to resolve all flags once before training so that reading '
+           'them in the training loop costs plain attribute loads')
+
   def get_global_regularizer(self):
     if not self.use_global_regularizer: return None
     from tframe import regularizers
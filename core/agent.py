@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import os
 import time
+import uuid
 
 import tensorflow as tf
 import tframe as tfr
@@ -16,6 +17,8 @@ from tframe.configs.config_base import Config
 
 from tframe.utils import imtool
 from tframe.utils import Note
+from tframe.utils.note_store import NoteStore, locked
+from tframe.utils.tensor_store import TensorStore
 from tframe.utils.local import check_path, clear_paths, write_file
 from tframe.utils.local import save_checkpoint, load_checkpoint
 
@@ -37,6 +40,8 @@ class Agent(object):
     # An agent saves model and writes summary
     self._saver = None
     self._summary_writer = None
+    # Variable slots whose host-side caches become invalid on loading
+    self._variable_slots = []
     # An agent holds a default note
     self._note = Note()
     context.note = self._note
@@ -121,11 +126,16 @@ class Agent(object):
     return feed_dict
 
   def load(self):
+    # Variables may be overwritten thus cached values should be cleared
+    for slot in self._variable_slots: slot.clear_cache()
     # TODO: when save_model option is turned off and the user want to
     #   try loading the exist model, set overwrite to False
     if not hub.save_model and hub.overwrite: return False, 0, None
     return load_checkpoint(self.ckpt_dir, self.session, self._saver)
 
+  def register_variable_slot(self, slot):
+    self._variable_slots.append(slot)
+
   def save_model(self, rounds=None, suffix=None):
     """rounds is used only by trainer"""
     path = self.model_path
@@ -207,6 +217,9 @@ class Agent(object):
     # Handle structure detail here
     self._model.handle_structure_detail()
 
+    # Any op created afterwards will raise an error
+    if hub.finalize_graph: self._graph.finalize()
+
     return load_flag
 
   def shutdown(self):
@@ -238,6 +251,14 @@ class Agent(object):
     if hub.epoch_as_step and context.trainer.total_rounds is not None:
       step = int(context.trainer.total_rounds * 1000)
     else: step = self._model.counter
+    if hub.stream_tensors_to_disk and self._note.tensor_store is None:
+      # Each note owns a store so that runs under the same mark never touch
+      # .. tensors referenced by notes gathered before
+      file_name = 'notes_{}_{}.tensors'.format(
+        time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+      self._note.set_tensor_store(TensorStore(
+        os.path.abspath(os.path.join(self.note_dir, file_name)),
+        hub.tensor_chunk_size, hub.compress_tensor_store))
     self._note.take_down_scalars_and_tensors(step, scalars, tensors)
 
   # endregion : For TensorViewer
@@ -247,26 +268,20 @@ class Agent(object):
   def put_down_configs(self, th):
     assert isinstance(th, Config)
     self._note.put_down_configs(th.key_options)
+    if th.job_key is not None: self._note.put_down_job_key(th.job_key)
 
   def put_down_criterion(self, name, value):
     self._note.put_down_criterion(name, value)
 
   def gather_to_summary(self):
-    import pickle
-    # Try to load note list into summaries
+    # Append note to the store. Legacy summary file will be converted
     file_path = self.gather_summ_path
-    if os.path.exists(file_path):
-      with open(file_path, 'rb') as f: summary = pickle.load(f)
-      assert len(summary) > 0
-    else: summary = []
-    # Add note to list and save
-    note = self._note.tensor_free if hub.gather_only_scalars else self._note
-    summary.append(note)
-    with open(file_path, 'wb') as f:
-      pickle.dump(summary, f, pickle.HIGHEST_PROTOCOL)
+    if hub.gather_only_scalars: note = self._note.tensor_free
+    else: note = self._note.anchored_to(file_path)
+    count = NoteStore(file_path).append(note)
     # Show status
     console.show_status('Note added to summaries ({} => {}) at `{}`'.format(
-      len(summary) - 1, len(summary), file_path))
+      count - 1, count, file_path))
 
   # endregion : For SummaryViewer
 
@@ -302,22 +317,17 @@ class Agent(object):
 
   def gather_notes(self, take_down_time=False):
     assert hub.gather_note
-    # If gather file does not exist, create one
-    with open(self.gather_path, 'a'): pass
-    # Gather notes to .txt file
+    # Append notes to .txt file
     line = self._note.content
-    with open(self.gather_path, 'r+') as f:
-      content = f.readlines()
-      f.seek(0)
-      f.truncate()
-      if take_down_time:
-        time_str = time.strftime('[{}-{}-%d %H:%M:%S]'.format(
-          time.strftime('%Y')[2:], time.strftime('%B')[:3]))
-        line = '[{}] {}'.format(time_str, line)
-      f.write(line + '\n')
-      f.write('-' * 79 + '\n')
-      f.writelines(content)
-      # TODO: find a way to update immediately after training is over
+    if take_down_time:
+      time_str = time.strftime('[{}-{}-%d %H:%M:%S]'.format(
+        time.strftime('%Y')[2:], time.strftime('%B')[:3]))
+      line = '[{}] {}'.format(time_str, line)
+    # Concurrent jobs may gather to the same file
+    with locked(self.gather_path + '.lock'):
+      with open(self.gather_path, 'a') as f:
+        f.write(line + '\n')
+        f.write('-' * 79 + '\n')
     # Gather notes to .summ file
     self.gather_to_summary()
 
@@ -17,6 +17,11 @@ class Group(object):
     self._model = model
     # Attributes
     self._slots = []
+    # Fetch plans keyed by whether summary slots should be included and the
+    # .. set of sleeping slots. Plans are dropped only when slots are plugged,
+    # .. added or removed
+    self._plans = {}
+    self._sleeping = frozenset()
     self._init_slots(slots)
     self.name = name
     # Make sure group has at least one slot
@@ -34,26 +39,16 @@ class Group(object):
 
   def run(self, feed_dict=None, allow_sum=True):
     """Run group in session. Slots except SummarySlot should be activated"""
-    fetches = []
-    for slot in self._slots:
-      if isinstance(slot, SummarySlot) and (
-          not slot.activated or not tfr.context.hub.summary or not allow_sum):
-        continue
-      # if not slot.activated:
-      #   raise AssertionError('!! {} must be activated'.format(slot.name))
-      if slot.activated and not slot.sleep: fetches.append(slot)
+    ops, summary_indices, tensor_slots = self._get_plan(
+      allow_sum and tfr.context.hub.summary)
 
     with self._model.graph.as_default():
-      results = self._model.session.run(
-        [slot.op for slot in fetches], feed_dict=feed_dict)
+      results = self._model.session.run(ops, feed_dict=feed_dict)
 
     # Check results
-    tensor_dict = collections.OrderedDict()
-    for slot, val in zip(fetches, results):
-      if isinstance(slot, SummarySlot):
-        self._model.agent.write_summary(val)
-      elif isinstance(slot, (TensorSlot, NestedTensorSlot)):
-        tensor_dict[slot] = val
+    for i in summary_indices: self._model.agent.write_summary(results[i])
+    tensor_dict = collections.OrderedDict(
+      [(slot, results[i]) for i, slot in tensor_slots])
 
     # Return tensor dictionary
     return tensor_dict
@@ -62,10 +57,23 @@ class Group(object):
     if not isinstance(slot, Slot):
       raise TypeError('!! member added to a group must be a Slot')
     self._slots.append(slot)
+    slot._groups.append(self)
+    self.on_slot_sleep_changed(slot)
+    self._plans = {}
 
   def remove(self, slot):
     assert isinstance(slot, Slot)
     self._slots.remove(slot)
+    slot._groups.remove(self)
+    self._sleeping = self._sleeping - {slot}
+    self._plans = {}
+
+  def on_slot_plugged(self, slot):
+    self._plans = {}
+
+  def on_slot_sleep_changed(self, slot):
+    if slot.sleep: self._sleeping = self._sleeping | {slot}
+    else: self._sleeping = self._sleeping - {slot}
 
   # endregion : Public Methods
 
@@ -75,6 +83,96 @@ class Group(object):
     if len(slots) == 0: raise ValueError('!! not slot found')
     for slot in slots: self.add(slot)
 
+  def _get_plan(self, with_summary):
+    """Return (ops, summary_indices, [(index, slot), ...]) to be used in
+       `run`. Toggling sleep state of a slot switches between cached plans
+       instead of recompiling them"""
+    key = (with_summary, self._sleeping)
+    if key not in self._plans:
+      self._plans[key] = self._compile_plan(with_summary)
+    return self._plans[key]
+
+  def _compile_plan(self, with_summary):
+    fetches = []
+    for slot in self._slots:
+      if isinstance(slot, SummarySlot) and not with_summary: continue
+      # if not slot.activated:
+      #   raise AssertionError('!! {} must be activated'.format(slot.name))
+      if slot.activated and not slot.sleep: fetches.append(slot)
+    summary_indices = [i for i, slot in enumerate(fetches)
+                       if isinstance(slot, SummarySlot)]
+    tensor_slots = [(i, slot) for i, slot in enumerate(fetches)
+                    if isinstance(slot, (TensorSlot, NestedTensorSlot))]
+    return [slot.op for slot in fetches], summary_indices, tensor_slots
+
   # endregion : Private Methods
 
 
+if __name__ == '__main__':
+  import time
+  import numpy as np
+  import tensorflow as tf
+  from tframe import Classifier, DataSet, hub, pedia
+  from tframe.layers import Input, Activation
+  from tframe.layers.hyper.dense import Dense
+
+  def legacy_feed_dict(model, batch, is_training):
+    """Feed dict resolved by matching names on every step, used as reference"""
+    feed_dict = {}
+    for tensor in tf.get_collection(pedia.default_feed_dict):
+      if 'input' in tensor.name.lower():
+        feed_dict[tensor] = batch[pedia.features]
+      elif tensor.name.lower() in ('target', 'targets'):
+        if batch.targets is not None: feed_dict[tensor] = batch.targets
+      elif pedia.gather_indices in tensor.name:
+        feed_dict[tensor] = batch.gather_indices
+      else:
+        name = tensor.name.split('/')[-1].split(':')[0]
+        val = batch.data_dict.get(name, None)
+        if val is not None: feed_dict[tensor] = val
+    feed_dict.update(model.agent.get_status_feed_dict(is_training))
+    return feed_dict
+
+  def legacy_run(group, feed_dict, allow_sum=True):
+    """Fetch list rebuilt on every step, used as reference"""
+    fetches = []
+    for slot in group._slots:
+      if isinstance(slot, SummarySlot) and (
+          not slot.activated or not hub.summary or not allow_sum): continue
+      if slot.activated and not slot.sleep: fetches.append(slot)
+    with group._model.graph.as_default():
+      results = group._model.session.run(
+        [slot.op for slot in fetches], feed_dict=feed_dict)
+    tensor_dict = collections.OrderedDict()
+    for slot, val in zip(fetches, results):
+      if isinstance(slot, SummarySlot): group._model.agent.write_summary(val)
+      elif isinstance(slot, (TensorSlot, NestedTensorSlot)):
+        tensor_dict[slot] = val
+    return tensor_dict
+
+  # Host-side overhead per step on a tiny model
+  hub.save_model, hub.overwrite = False, True
+  model = Classifier(mark='group_bench')
+  model.add(Input(sample_shape=[8]))
+  model.add(Dense(num_neurons=4))
+  model.add(Activation('softmax'))
+  model.build(tf.train.GradientDescentOptimizer(0.01))
+  model.launch_model(overwrite=False)
+  batch = DataSet(np.random.randn(16, 8).astype(np.float32),
+                  np.eye(4)[np.random.randint(0, 4, 16)].astype(np.float32))
+  group, n = model._update_group, 2000
+
+  with model.graph.as_default():
+    for name, get_feed_dict, run in (
+        ('Legacy', lambda: legacy_feed_dict(model, batch, True),
+         lambda fd: legacy_run(group, fd)),
+        ('Compiled', lambda: model._get_default_feed_dict(batch, True),
+         lambda fd: group.run(fd))):
+      tic = time.time()
+      for _ in range(n): feed_dict = get_feed_dict()
+      t_feed = (time.time() - tic) / n * 1e6
+      tic = time.time()
+      for _ in range(n): run(get_feed_dict())
+      t_step = (time.time() - tic) / n * 1e6
+      print('>> {}: feed dict {:.1f} us, update step {:.1f} us'.format(
+        name, t_feed, t_step))
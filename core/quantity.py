@@ -40,12 +40,25 @@ class Quantity(object):
   }
 
   def __init__(self, kernel, tf_summ_method=None, np_summ_method=None,
-               last_only=False, name='Unknown', use_logits=False, **kwargs):
+               last_only=False, name='Unknown', use_logits=False,
+               running_summ=None, **kwargs):
+    """Construct a quantity
+    :param running_summ: a RunningSummary equivalent to np_summ_method. If
+                         provided, batch validation will aggregate quantities
+                         incrementally instead of gathering all of them as
+                         long as this can be done exactly. Inferred
+                         automatically for registered tf methods.
+    """
     self._kernel = tfr.checker.check_callable(kernel)
     self._tf_summ_method = tf_summ_method
     if tf_summ_method is not None: tfr.checker.check_callable(tf_summ_method)
     self._np_summ_method = np_summ_method
     if np_summ_method is not None: tfr.checker.check_callable(np_summ_method)
+    if running_summ is not None:
+      tfr.checker.check_type(running_summ, RunningSummary)
+    elif np_summ_method is None:
+      running_summ = RunningSummary.tf2running.get(tf_summ_method, None)
+    self._running_summ = running_summ
 
     self._last_only = tfr.checker.check_type(last_only, bool)
     self._quantities = None
@@ -85,6 +98,12 @@ class Quantity(object):
     self._np_summ_method = self.tf2np[self._tf_summ_method]
     return self.np_summ_method
 
+  def new_running_summary(self):
+    """Return an empty RunningSummary for aggregating quantities batch by
+       batch, or None if np_summ_method is not decomposable"""
+    if self._running_summ is None: return None
+    return self._running_summ.copy()
+
   def __call__(self, truth, output, **kwargs):
     assert isinstance(truth, tf.Tensor) and isinstance(output, tf.Tensor)
     # Replace output with logits if necessary
@@ -207,3 +226,122 @@ class Quantity(object):
 
 
 
+
+
+class RunningSummary(object):
+  """Incremental version of np.mean or np.linalg.norm for quantities taking
+     integer values, e.g. correct predictions counted by accuracy. Integers
+     and their sums are exact in floating point as long as they do not exceed
+     2^(nmant + 1), thus numpy gets the same sum in any reduction order and
+     `result` is bit-identical to applying the summ method on concatenated
+     quantities while only a running sum and a counter are kept.
+
+     If a non-integer quantity is added or the sum of absolute values grows
+     out of the exact range, `exact` turns False and `result` can not be used.
+  """
+  MEAN = 'mean'
+  NORM = 'norm'
+
+  def __init__(self, method=MEAN):
+    assert method in (self.MEAN, self.NORM)
+    self._method = method
+    # Sums are kept in Python integers which never overflow
+    self._total = 0
+    self._abs_total = 0
+    self._count = 0
+    self._dtype = None
+    self.exact = True
+
+  @property
+  def acc_dtype(self):
+    """Data type in which numpy accumulates quantities"""
+    if np.issubdtype(self._dtype, np.floating): return self._dtype
+    return np.dtype(np.float64)
+
+  @property
+  def result(self):
+    if self._count == 0: raise AssertionError('!! No quantity has been added')
+    if not self.exact: raise AssertionError(
+      '!! Quantities can not be reduced exactly')
+    total = self.acc_dtype.type(self._total)
+    # np.linalg.norm returns sqrt(x.dot(x))
+    if self._method == self.NORM: return np.sqrt(total)
+    # np.mean divides the sum by an intp count and casts it back
+    return total.dtype.type(total / np.intp(self._count))
+
+  def copy(self):
+    return RunningSummary(self._method)
+
+  def update(self, x):
+    if not self.exact: return
+    x = np.asarray(x)
+    if self._dtype is None: self._dtype = x.dtype
+    self.exact = x.dtype == self._dtype and x.dtype in (
+      np.bool_, np.int32, np.int64, np.float32, np.float64)
+    if self.exact and x.size > 0: self.exact = self._accumulate(x)
+    self._count += x.size
+
+  def _accumulate(self, x):
+    """Add integer values in x to running sums. Return False if they can not
+       be summed up exactly"""
+    if np.issubdtype(x.dtype, np.floating):
+      # NaN is rejected as well
+      if not np.all(x == np.round(x)): return False
+    x = x.astype(np.float64)
+    if self._method == self.NORM: x = np.square(x)
+    limit = 2 ** (np.finfo(self.acc_dtype).nmant + 1)
+    # Terms are bounded so that they can be summed up as int64
+    max_abs = np.max(np.abs(x))
+    if max_abs > limit or max_abs * x.size >= 2 ** 63: return False
+    x = x.astype(np.int64)
+    self._total += int(np.sum(x))
+    self._abs_total += int(np.sum(np.abs(x)))
+    return self._abs_total <= limit
+
+  # region : Presets
+
+  @classmethod
+  def mean(cls): return RunningSummary(cls.MEAN)
+
+  @classmethod
+  def norm(cls): return RunningSummary(cls.NORM)
+
+  # endregion : Presets
+
+
+RunningSummary.tf2running = {
+  tf.reduce_mean: RunningSummary.mean(),
+  tf.norm: RunningSummary.norm(),
+}
+
+
+if __name__ == '__main__':
+  # Running summaries must be bit-identical to the gather path
+  rng = np.random.RandomState(0)
+
+  def check(tf_summ_method, batches):
+    q = Quantity(lambda *args: None, tf_summ_method)
+    r = q.new_running_summary()
+    for b in batches: r.update(b)
+    if not r.exact: return False
+    expected = q.apply_np_summ_method(np.concatenate(batches, axis=0))
+    assert r.result.dtype == expected.dtype
+    assert r.result.tobytes() == expected.tobytes()
+    return True
+
+  for method in (tf.reduce_mean, tf.norm):
+    for dtype in (np.float32, np.float64, np.int32, np.int64, np.bool_):
+      for _ in range(20):
+        # Correct predictions of accuracy, in irregular batches
+        sizes = rng.randint(1, 5000, size=rng.randint(1, 30))
+        batches = [(rng.rand(n, 3) < 0.7).astype(dtype) for n in sizes]
+        assert check(method, batches)
+    # Integer counts and empty batches
+    batches = [rng.randint(-50, 50, size=(n,)).astype(np.float32)
+               for n in (100, 0, 3000, 1)]
+    assert check(method, batches)
+    # Non-integer quantities and sums out of exact range are not reduced
+    assert not check(method, [rng.rand(100).astype(np.float32)])
+    assert not check(method, [np.ones(2 ** 24 + 1, np.float32)])
+    assert not check(method, [np.array([np.nan], np.float32)])
+  print('All checks passed')
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
 import tensorflow as tf
 
 import tframe as tfr
@@ -17,12 +18,36 @@ class Slot(object):
   def __init__(self, model, name):
     assert isinstance(model, tfr.models.Model)
     self._model = model
-    self._op = None
+    self._plugged_op = None
+    self._sleep = False
     self.name = name
-    self.sleep = False
+    # Groups containing this slot, notified when this slot changes its state
+    self._groups = []
 
   # region : Properties
 
+  @property
+  def _op(self):
+    return self._plugged_op
+
+  @_op.setter
+  def _op(self, val):
+    changed = val is not self._plugged_op
+    self._plugged_op = val
+    if changed:
+      for group in self._groups: group.on_slot_plugged(self)
+
+  @property
+  def sleep(self):
+    return self._sleep
+
+  @sleep.setter
+  def sleep(self, val):
+    val = bool(val)
+    if val == self._sleep: return
+    self._sleep = val
+    for group in self._groups: group.on_slot_sleep_changed(self)
+
   @property
   def activated(self):
     return self._op is not None
@@ -195,6 +220,11 @@ class VariableSlot(TensorSlot):
   _null_value = -1.0
   def __init__(self, model, name='variable'):
     super().__init__(model, name)
+    # Assign op is built once when plugged so that graph won't grow
+    self._value_placeholder = None
+    self._assign_op = None
+    # Host-side copy of variable value, None means not fetched yet
+    self._cached_value = None
 
   @property
   def variable(self):
@@ -204,8 +234,30 @@ class VariableSlot(TensorSlot):
   def never_assigned(self):
     return self.fetch() == self._null_value
 
+  def plug(self, op, collection=None, quantity_def=None):
+    """Should be called under the graph of the model"""
+    super().plug(op, collection, quantity_def)
+    self._value_placeholder = tf.placeholder(
+      op.dtype.base_dtype, shape=op.shape, name='{}_value'.format(self.name))
+    self._assign_op = tf.assign(op, self._value_placeholder)
+    self._cached_value = None
+    self._model.agent.register_variable_slot(self)
+
+  def fetch(self, feed_dict=None):
+    if self._cached_value is None:
+      self._cached_value = super().fetch(feed_dict)
+    return self._cached_value
+
   def assign(self, value):
-    self._model.session.run(tf.assign(self._op, value))
+    # Cache value as it will be read back from the variable, e.g., a record
+    # .. assigned as a python float must compare the same as after restore
+    value = np.asarray(value, dtype=self._op.dtype.base_dtype.as_numpy_dtype)
+    self._model.session.run(
+      self._assign_op, feed_dict={self._value_placeholder: value})
+    self._cached_value = value[()] if value.ndim == 0 else value
+
+  def clear_cache(self):
+    self._cached_value = None
 
 
 class OutputSlot(TensorSlot):
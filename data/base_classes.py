@@ -65,6 +65,9 @@ class TFRData(object):
 
   @property
   def groups(self):
+    # Groups are calculated lazily since most subsets (e.g. batches) will
+    # .. never use them
+    if self.GROUPS not in self.properties: self.refresh_groups()
     val = self.properties[self.GROUPS]
     assert isinstance(val, list) and len(val) == self.num_classes
     return val
@@ -97,6 +100,9 @@ class TFRData(object):
   def gen_rnn_batches(self, batch_size=1, num_steps=-1, shuffle=False):
     raise NotImplementedError
 
+  def refresh_groups(self, target_key='targets'):
+    raise NotImplementedError
+
   # region : Public Methods
 
   def remove_batch_preprocessor(self):
@@ -308,14 +314,7 @@ class ImageDataAgent(DataAgent):
     data_set = DataSet(images, labels, name=cls.DATA_NAME, **cls.PROPERTIES)
 
     # Generate groups if necessary
-    if data_set.num_classes is not None:
-      groups = []
-      dense_labels = misc.convert_to_dense_labels(labels)
-      for i in range(data_set.num_classes):
-        # Find samples of class i and append to groups
-        samples = list(np.argwhere([j == i for j in dense_labels]).ravel())
-        groups.append(samples)
-      data_set.properties[data_set.GROUPS] = groups
+    if data_set.num_classes is not None: data_set.refresh_groups()
 
     # Show status
     console.show_status('Successfully converted {} samples'.format(
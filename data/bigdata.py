@@ -5,12 +5,15 @@ from __future__ import print_function
 import os
 import numpy as np
 import collections
+from concurrent.futures import ThreadPoolExecutor
 
 from tframe import console
 from tframe import checker
+from tframe import hub
 from tframe.utils.local import check_path
 from tframe.data.base_classes import TFRData
 from tframe.data.dataset import DataSet
+from tframe.data.columnar import ColumnarFile
 from tframe.data.sequences.signals.signal_set import SignalSet
 
 
@@ -31,6 +34,8 @@ class BigData(TFRData):
     self.name = os.path.basename(data_dir)
     self.init_f = None
     self.round_len_f = None
+    # Sizes of shards loaded so far, used for round length of mixed batches
+    self._shard_sizes = {}
 
     # Generate data info
     self._generate_meta(data_dir)
@@ -51,15 +56,26 @@ class BigData(TFRData):
   def is_regular_array(self):
     return False
 
+  @property
+  def shard_sizes(self):
+    # Metadata saved before shard sizes were recorded do not have this
+    if getattr(self, '_shard_sizes', None) is None: self._shard_sizes = {}
+    return self._shard_sizes
+
   # endregion : Properties
 
   # region : Public Methods
 
-  def get_round_length(self, batch_size, num_steps=None):
+  def get_round_length(self, batch_size, num_steps=None, training=False):
     if self.init_f is not None:
       if callable(self.round_len_f):
         return self.round_len_f(self, batch_size, num_steps)
       else: return None
+    # Mixed batches are full except for the last one. Sizes of shards are
+    # .. known only after they have been loaded once
+    if training and num_steps is None and hub.shard_buffer_size > 1:
+      if len(self.shard_sizes) < self.size: return None
+      return int(np.ceil(sum(self.shard_sizes.values()) / batch_size))
     round_len = 0
     for len_list in self.structure:
       checker.check_type(len_list, int)
@@ -76,23 +92,21 @@ class BigData(TFRData):
     return round_len
 
   def gen_batches(self, batch_size, shuffle=False, is_training=False):
-    for f in self.files.keys():
-      file_path = os.path.join(self.data_dir, f)
-      data_set = self._load_data_set(file_path)
-      self._check_data_set(data_set)
+    data_sets = self._gen_data_sets(shuffle)
+    # Mix samples across several open shards if required
+    if shuffle and hub.shard_buffer_size > 1:
+      yield from self._gen_mixed_batches(
+        data_sets, batch_size, hub.shard_buffer_size, is_training)
+      return
+    for data_set in data_sets:
       for batch in data_set.gen_batches(batch_size, shuffle):
         yield batch
-      del data_set
 
   def gen_rnn_batches(self, batch_size=1, num_steps=-1, shuffle=False,
                       is_training=False):
-    for f in self.files.keys():
-      file_path = os.path.join(self.data_dir, f)
-      data_set = self._load_data_set(file_path)
-      self._check_data_set(data_set)
+    for data_set in self._gen_data_sets(shuffle):
       for batch in data_set.gen_rnn_batches(batch_size, num_steps, shuffle):
         yield batch
-      del data_set
 
   def load_data_set(self, index=0):
     file_name = list(self.files.keys())[index]
@@ -128,6 +142,86 @@ class BigData(TFRData):
 
   # region : Private Methods
 
+  def _gen_data_sets(self, shuffle):
+    """Yield data sets in self.files one by one. Shard order will be
+       shuffled if required. If hub.shard_read_ahead is True, the next shard
+       will be loaded in background while the current one is being used"""
+    files = list(self.files.keys())
+    if shuffle: np.random.shuffle(files)
+    if hub.shard_read_ahead: return self._read_ahead(files)
+    return (self._load_shard(f) for f in files)
+
+  def _read_ahead(self, files):
+    """Yield shards one by one while loading the next one in a background
+       thread. At most one shard is loaded ahead"""
+    if len(files) == 0: return
+    with ThreadPoolExecutor(max_workers=1) as executor:
+      future = executor.submit(self._load_shard, files[0])
+      for i in range(len(files)):
+        data_set = future.result()
+        if i + 1 < len(files):
+          future = executor.submit(self._load_shard, files[i + 1])
+        yield data_set
+
+  def _load_shard(self, file_name):
+    data_set = self._load_data_set(os.path.join(self.data_dir, file_name))
+    self._check_data_set(data_set)
+    self.shard_sizes[file_name] = data_set.size
+    return data_set
+
+  @staticmethod
+  def _gen_mixed_batches(data_sets, batch_size, buffer_size, is_training):
+    """Each batch is sampled without replacement from the union of
+       `buffer_size` open shards. An exhausted shard is replaced by the next
+       one in `data_sets`. More shards are opened if samples left in open
+       shards are not enough for a batch, so that all batches are full except
+       for the last one"""
+    checker.check_positive_integer(batch_size)
+    data_sets = iter(data_sets)
+    # Each item in pool is [data_set, shuffled_indices, cursor]
+    pool = []
+    while True:
+      # Open shards if necessary
+      while (len(pool) < buffer_size or
+             sum([len(item[1]) - item[2] for item in pool]) < batch_size):
+        data_set = next(data_sets, None)
+        if data_set is None: break
+        assert isinstance(data_set, DataSet)
+        pool.append([data_set, np.random.permutation(data_set.size), 0])
+      if len(pool) == 0: break
+
+      # Decide how many samples each shard contributes to this batch by
+      # .. drawing from a multivariate hypergeometric distribution
+      remains = [len(indices) - cursor for _, indices, cursor in pool]
+      left, rest = min(batch_size, sum(remains)), sum(remains)
+      batches = []
+      for item, r in zip(pool, remains):
+        rest -= r
+        if left == 0: break
+        n = np.random.hypergeometric(r, rest, left) if rest > 0 else left
+        left -= n
+        if n == 0: continue
+        data_set, indices, cursor = item
+        batch = data_set[indices[cursor:cursor + n]]
+        item[2] += n
+        if data_set.batch_preprocessor is not None:
+          batch = data_set.batch_preprocessor(batch, is_training)
+        if not batch.is_regular_array: batch = batch.stack
+        batches.append(batch)
+
+      # Remove exhausted shards
+      pool = [item for item in pool if item[2] < len(item[1])]
+      yield BigData._merge_batches(batches)
+
+  @staticmethod
+  def _merge_batches(batches):
+    assert len(batches) > 0
+    if len(batches) == 1: return batches[0]
+    data_dict = {k: np.concatenate([b.data_dict[k] for b in batches], axis=0)
+                 for k in batches[0].data_dict.keys()}
+    return DataSet(data_dict=data_dict, name='mixed_batch',
+                   **batches[0].properties)
+
   def _check_data_set(self, data_set):
     if callable(self.init_f):
       self.init_f(data_set)
@@ -143,6 +237,8 @@ class BigData(TFRData):
       return DataSet.load(file_name)
     elif extension == SignalSet.EXTENSION:
       return SignalSet.load(file_name)
+    elif extension == ColumnarFile.EXTENSION:
+      return ColumnarFile.read(file_name)
     else: raise TypeError(
       '!! Can not load file with extension .{}'.format(extension))
 
@@ -176,10 +272,20 @@ class BigData(TFRData):
     # Scan directory
     num_files = len(file_list)
     for i, file_name in enumerate(file_list):
-      data_set = self._load_data_set(file_name)
-      self.files[os.path.basename(file_name)] = data_set.structure
+      self.files[os.path.basename(file_name)] = self._read_structure(file_name)
       console.print_progress(i + 1, num_files)
-      del data_set
+
+  def _read_structure(self, file_name):
+    """Read structure of a shard without loading the whole data set if
+       possible"""
+    extension = file_name.split('.')[-1]
+    # Structure of a regular DataSet is always [1]
+    if extension == DataSet.EXTENSION: return [1]
+    # Columnar files can provide structure by reading offsets only
+    if extension == ColumnarFile.EXTENSION:
+      return ColumnarFile.read_structure(file_name)
+    data_set = self._load_data_set(file_name)
+    return data_set.structure
 
   # endregion : Private Methods
 
@@ -0,0 +1,244 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import pickle
+import numpy as np
+
+from tframe import checker
+from tframe import console
+from tframe import local
+
+
+class ColumnarFile(object):
+  """On-disk format for DataSet and SequenceSet in which each entry of
+     data_dict/summ_dict is stored as a raw contiguous array so that it can
+     be mapped into memory via np.memmap instead of being unpickled.
+
+     A data set `xxx` is stored as 2 files:
+     (1) xxx.tfdm:     raw column data, each column aligned to ALIGNMENT bytes
+     (2) xxx.tfdm.hdr: a small pickled header containing column layouts,
+                       properties and other attributes of the data set
+
+     Column layouts:
+     (1) array:     a regular numpy array (entries of DataSet.data_dict)
+     (2) sequences: a list of sequences stored as one concatenated array.
+                    Since all sequence lists in a SequenceSet share the same
+                    structure, a single offsets array is stored for them
+     (3) summaries: a list of arrays with shape [1, *dim] stored as an
+                    array with shape [N, *dim]
+     (4) scalars:   a list of scalars stored as a 1-D array
+  """
+  EXTENSION = 'tfdm'
+  HEADER_EXTENSION = 'hdr'
+  VERSION = 1
+  ALIGNMENT = 64
+
+  ARRAY = 'array'
+  SEQUENCES = 'sequences'
+  SUMMARIES = 'summaries'
+  SCALARS = 'scalars'
+
+  OFFSETS = '__offsets__'
+
+  # region : Public Methods
+
+  @classmethod
+  def write(cls, data_set, filename):
+    from tframe.data.dataset import DataSet
+    from tframe.data.sequences.seq_set import SequenceSet
+    from tframe.data.sequences.signals.signal_set import SignalSet
+    assert isinstance(data_set, DataSet)
+    if isinstance(data_set, SignalSet): raise TypeError(
+      '!! SignalSet can not be saved as columnar file')
+
+    filename = cls._check_filename(filename)
+    local.check_path(filename, is_file_path=True)
+    columns = []
+    with open(filename, 'wb') as f:
+      if isinstance(data_set, SequenceSet):
+        offsets = np.cumsum([0] + data_set.structure).astype(np.int64)
+        columns.append(cls._write_column(f, None, cls.OFFSETS, cls.ARRAY,
+                                         [offsets]))
+        for key, seq_list in data_set.data_dict.items():
+          columns.append(cls._write_column(
+            f, 'data_dict', key, cls.SEQUENCES, seq_list))
+        for key, summ_list in data_set.summ_dict.items():
+          if checker.check_scalar_list(summ_list):
+            columns.append(cls._write_column(
+              f, 'summ_dict', key, cls.SCALARS, [np.array(summ_list)]))
+          else: columns.append(cls._write_column(
+            f, 'summ_dict', key, cls.SUMMARIES, summ_list))
+      else:
+        for key, array in data_set.data_dict.items():
+          columns.append(cls._write_column(
+            f, 'data_dict', key, cls.ARRAY, [array]))
+
+    # Write header
+    header = {'version': cls.VERSION, 'class': data_set.__class__,
+              'state': cls._get_state(data_set), 'columns': columns}
+    with open(cls._header_path(filename), 'wb') as f:
+      pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+    return filename
+
+  @classmethod
+  def read(cls, filename, mmap_mode='r'):
+    """Load data set from a columnar file. Arrays in the returned data set
+       are views of np.memmap thus no data is read until being accessed"""
+    filename = cls._check_filename(filename)
+    header = cls.read_header(filename)
+    columns = {c['key']: c for c in header['columns']}
+    offsets = None
+    if cls.OFFSETS in columns:
+      offsets = np.asarray(cls._map(filename, columns.pop(cls.OFFSETS), 'r'))
+
+    data_dict, summ_dict = {}, {}
+    for key, c in columns.items():
+      array = cls._map(filename, c, mmap_mode)
+      if c['layout'] == cls.SEQUENCES:
+        value = [array[i:j] for i, j in zip(offsets[:-1], offsets[1:])]
+      elif c['layout'] == cls.SUMMARIES:
+        value = [array[i:i + 1] for i in range(len(array))]
+      elif c['layout'] == cls.SCALARS: value = array.tolist()
+      else: value = array
+      (data_dict if c['dict'] == 'data_dict' else summ_dict)[key] = value
+
+    # Restore data set without calling its constructor
+    data_set = cls._restore(header, data_dict, summ_dict)
+    # A loaded sequence set can be stacked without copying
+    cls._set_stack(data_set, filename, columns)
+    return data_set
+
+  @classmethod
+  def read_header(cls, filename):
+    filename = cls._check_filename(filename)
+    with open(cls._header_path(filename), 'rb') as f:
+      header = pickle.load(f)
+    if header.get('version', None) != cls.VERSION:
+      raise TypeError('!! Unsupported columnar file version {}'.format(
+        header.get('version', None)))
+    return header
+
+  @classmethod
+  def read_structure(cls, filename):
+    """Read the structure of data set by touching offsets only"""
+    filename = cls._check_filename(filename)
+    header = cls.read_header(filename)
+    for c in header['columns']:
+      if c['key'] == cls.OFFSETS:
+        return np.diff(cls._map(filename, c, 'r')).tolist()
+    return [1]
+
+  @classmethod
+  def convert(cls, src, dst=None):
+    """Convert a pickled .tfd/.tfds file to columnar file"""
+    if dst is None: dst = os.path.splitext(src)[0]
+    console.show_status('Converting `{}` ...'.format(src))
+    with open(src, 'rb') as f: data_set = pickle.load(f)
+    dst = cls.write(data_set, dst)
+    console.show_status('Columnar file saved to `{}`'.format(dst))
+    return dst
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  @classmethod
+  def _check_filename(cls, filename):
+    assert isinstance(filename, str)
+    if filename.split('.')[-1] != cls.EXTENSION:
+      filename += '.{}'.format(cls.EXTENSION)
+    return filename
+
+  @classmethod
+  def _header_path(cls, filename):
+    return '{}.{}'.format(filename, cls.HEADER_EXTENSION)
+
+  @classmethod
+  def _write_column(cls, f, dict_name, key, layout, arrays):
+    """Write a list of arrays sharing the same sample shape to f contiguously
+       and return the column description"""
+    assert len(arrays) > 0
+    dtype = np.asarray(arrays[0]).dtype
+    if dtype.hasobject: raise TypeError(
+      '!! Object array `{}` can not be saved as columnar file'.format(key))
+    # Align column
+    offset = f.tell()
+    pad = -offset % cls.ALIGNMENT
+    if pad > 0: f.write(b'\0' * pad)
+    offset += pad
+    # Write arrays one by one to avoid concatenating them in memory
+    length, sample_shape = 0, np.asarray(arrays[0]).shape[1:]
+    for a in arrays:
+      a = np.ascontiguousarray(a, dtype=dtype)
+      if a.shape[1:] != sample_shape: raise ValueError(
+        '!! Sample shapes in `{}` are inconformity'.format(key))
+      a.tofile(f)
+      length += len(a)
+    return {'key': key, 'dict': dict_name, 'layout': layout,
+            'dtype': dtype.str, 'shape': (length,) + tuple(sample_shape),
+            'offset': offset}
+
+  @staticmethod
+  def _map(filename, column, mmap_mode):
+    if column['shape'][0] == 0:
+      return np.zeros(column['shape'], dtype=np.dtype(column['dtype']))
+    return np.memmap(filename, dtype=np.dtype(column['dtype']), mode=mmap_mode,
+                     offset=column['offset'], shape=column['shape'])
+
+  @staticmethod
+  def _get_state(data_set):
+    from tframe.data.sequences.seq_set import SequenceSet
+    state = data_set.__dict__.copy()
+    for key in ('data_dict', 'summ_dict', 'indices', '_ordered_indices'):
+      state.pop(key, None)
+    # Stacks are derived data and should not be saved
+    properties = data_set.properties.copy()
+    properties.pop(SequenceSet.DATA_STACK, None)
+    properties.pop(SequenceSet.PADDED_STACK, None)
+    state['properties'] = properties
+    return state
+
+  @staticmethod
+  def _restore(header, data_dict, summ_dict):
+    from tframe.data.sequences.seq_set import SequenceSet
+    cls = header['class']
+    data_set = cls.__new__(cls)
+    data_set.__dict__.update(header['state'])
+    data_set.data_dict = data_dict
+    if issubclass(cls, SequenceSet): data_set.summ_dict = summ_dict
+    data_set.indices = None
+    data_set._ordered_indices = np.arange(data_set.size)
+    return data_set
+
+  @classmethod
+  def _set_stack(cls, data_set, filename, columns):
+    from tframe.data.dataset import DataSet
+    from tframe.data.sequences.seq_set import SequenceSet
+    if not isinstance(data_set, SequenceSet) or data_set.summ_dict: return
+    stack_dict = {key: cls._map(filename, c, 'r') for key, c in columns.items()}
+    data_set.properties[SequenceSet.DATA_STACK] = DataSet(
+      data_dict=stack_dict, name=data_set.name + '(stacked)',
+      **data_set.properties)
+
+  # endregion : Private Methods
+
+
+if __name__ == '__main__':
+  import sys
+  import time
+  import resource
+
+  # Usage: python columnar.py path/to/data.tfds
+  # Convert a pickled data set and compare load time and peak RSS
+  src = sys.argv[1]
+  dst = ColumnarFile.convert(src)
+  def _rss(): return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+  for name, load in (('columnar', lambda: ColumnarFile.read(dst)),
+                     ('pickle', lambda: pickle.load(open(src, 'rb')))):
+    rss, tic = _rss(), time.time()
+    data_set = load()
+    print('>> {}: {:.2f} secs, peak RSS +{:.1f} MB'.format(
+      name, time.time() - tic, _rss() - rss))
@@ -2,7 +2,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+import queue
+import pickle
+import threading
+import numpy as np
+import multiprocessing as mp
+
 from tframe import checker
+from tframe import console
 from tframe import hub
 
 from tframe.data.base_classes import TFRData
@@ -11,19 +19,51 @@ from tframe.data.sequences.seq_set import SequenceSet
 
 
 class PerpetualMachine(TFRData):
-
-  def __init__(self, name, engine, **kwargs):
+  """Two backends are supported for background workers:
+     (1) 'thread':  data sets are produced by daemon threads drawing from
+                    numpy global random state. Cheap, and safe while a
+                    tensorflow session is running.
+     (2) 'process': data sets are produced by spawned processes, each
+                    seeding numpy with seed + i. Since forking a process
+                    whose tensorflow session threads are running is not
+                    safe, processes are spawned and engine must be
+                    picklable. Pays off only when engine is slow enough to
+                    cover pickling data sets back, and never on a single
+                    CPU, in which case thread backend is used instead.
+  """
+  THREAD = 'thread'
+  PROCESS = 'process'
+
+  _TIMEOUT = 0.1
+
+  def __init__(self, name, engine, num_workers=0, queue_depth=2, seed=None,
+               backend=THREAD, **kwargs):
     """Construct a `perpetual machine`
     :param name: name
     :param engine: a function accepts `size` as input. engine takes care of
                    properties like `n_to_one`.
+    :param num_workers: if positive, data sets will be produced by this
+                        number of background workers
+    :param queue_depth: maximum number of data sets prepared in advance by
+                        each worker
+    :param seed: base seed of process workers. Worker i seeds numpy with
+                 seed + i and data sets are consumed from workers in turn so
+                 that produced batches are reproducible. If not provided,
+                 the base seed is drawn from numpy global random state
+    :param backend: 'thread' or 'process'
     """
     # Call parent't constructor
     super().__init__(name)
     # Check input
     assert callable(engine)
+    if backend not in (self.THREAD, self.PROCESS): raise ValueError(
+      '!! Unknown perpetual machine backend `{}`'.format(backend))
     self.engine = engine
     self.generate_sequence = None
+    self.num_workers = checker.check_type(num_workers, int)
+    self.queue_depth = checker.check_positive_integer(queue_depth)
+    self.seed = seed
+    self.backend = self._check_backend(backend)
     # Force to examine engine
     self._examine_engine()
     # Set property
@@ -43,16 +83,14 @@ class PerpetualMachine(TFRData):
 
   def gen_batches(self, batch_size, shuffle=False, is_training=False):
     checker.check_positive_integer(batch_size)
-    while True:
-      # gen_batches for sequences is not supported yet
-      assert not self.generate_sequence
-      yield self.engine(batch_size)
+    # gen_batches for sequences is not supported yet
+    assert not self.generate_sequence
+    for data_set in self._gen_data_sets(batch_size): yield data_set
 
   def gen_rnn_batches(self, batch_size=1, num_steps=-1, shuffle=False,
                       is_training=False):
     checker.check_positive_integer(batch_size)
-    while True:
-      data_set = self.engine(batch_size)
+    for data_set in self._gen_data_sets(batch_size):
       assert isinstance(data_set, DataSet)
       for batch in data_set.gen_rnn_batches(batch_size, num_steps):
         yield batch
@@ -74,4 +112,84 @@ class PerpetualMachine(TFRData):
       raise AssertionError('!! Meant to generate a data set of size {} but '
                            'get a size {}'.format(N, data_batch.size))
 
+  def _check_backend(self, backend):
+    if self.num_workers <= 0 or backend == self.THREAD: return backend
+    if (os.cpu_count() or 1) < 2:
+      console.warning('Process workers of perpetual machine can not run '
+                      'faster on a single CPU, thread backend is used')
+      return self.THREAD
+    try: pickle.dumps(self.engine)
+    except Exception: raise TypeError(
+      '!! engine must be picklable to be sent to process workers')
+    return backend
+
+  def _gen_data_sets(self, size):
+    if self.num_workers <= 0:
+      while True: yield self.engine(size)
+
+    if self.backend == self.PROCESS:
+      seed = self.seed
+      if seed is None: seed = np.random.randint(2 ** 31 - self.num_workers)
+      seeds = [seed + i for i in range(self.num_workers)]
+      ctx = mp.get_context('spawn')
+      stop = ctx.Event()
+      queues = [ctx.Queue(maxsize=self.queue_depth)
+                for _ in range(self.num_workers)]
+      Worker = ctx.Process
+    else:
+      seeds = [None] * self.num_workers
+      stop = threading.Event()
+      queues = [queue.Queue(maxsize=self.queue_depth)
+                for _ in range(self.num_workers)]
+      Worker = threading.Thread
+    workers = [Worker(target=_produce, daemon=True, args=(
+      self.engine, size, s, q, stop)) for s, q in zip(seeds, queues)]
+    for w in workers: w.start()
+    try:
+      # Consume data sets from workers in turn
+      i = 0
+      while True:
+        yield self._get(queues[i], workers[i])
+        i = (i + 1) % self.num_workers
+    finally:
+      stop.set()
+      # Drain queues so that blocked workers can exit
+      for q in queues:
+        try:
+          while True: q.get_nowait()
+        except queue.Empty: pass
+      for w in workers:
+        w.join(timeout=1.0)
+        if isinstance(w, threading.Thread): continue
+        if w.is_alive(): w.terminate()
+
+  @classmethod
+  def _get(cls, q, worker):
+    while True:
+      try: item = q.get(timeout=cls._TIMEOUT)
+      except queue.Empty:
+        if worker.is_alive(): continue
+        raise AssertionError('!! Worker of perpetual machine exited '
+                             'unexpectedly')
+      if isinstance(item, str): raise RuntimeError(
+        '!! Error occurred in worker of perpetual machine:\n{}'.format(item))
+      return item
+
   # endregion : Private Methods
+
+
+def _produce(engine, size, seed, q, stop):
+  """Target of workers. Thread workers share numpy global random state
+     with the main thread thus are not seeded"""
+  import traceback
+  if seed is not None: np.random.seed(seed)
+  try:
+    while not stop.is_set():
+      data_set = engine(size)
+      while not stop.is_set():
+        try:
+          q.put(data_set, timeout=0.1)
+          break
+        except queue.Full: continue
+  except Exception:
+    q.put(traceback.format_exc())
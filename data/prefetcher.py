@@ -0,0 +1,329 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import queue
+import random
+import threading
+import traceback
+import multiprocessing as mp
+
+import numpy as np
+
+from tframe import checker
+from tframe.data.base_classes import TFRData
+
+
+class Prefetcher(object):
+  """Prefetcher wraps a batch generator of a TFRData and runs it in a
+     background worker so that batch construction (fancy indexing,
+     _finalize, padding, batch_preprocessor, etc.) overlaps with the update
+     step running on the main thread.
+
+     Batches are yielded exactly in the order they are generated, with all
+     signals like `should_reset_state`, `active_length` and `active_indices`
+     preserved. The `dynamic_round_len` of the data set stays valid until the
+     last batch has been consumed by the caller.
+
+     Two backends are supported:
+     (1) 'thread':  the generator runs in a daemon thread sharing memory with
+                    the main thread. Cheap, recommended when most of the work
+                    is done in numpy (which releases the GIL).
+     (2) 'process': the generator runs in a forked child process and batches
+                    are sent back via a multiprocessing queue. Callable
+                    properties (e.g. batch_preprocessor) are stripped before
+                    pickling and restored from the source data set. Since the
+                    child works on a copy of the random state, a seed is drawn
+                    from the parent's numpy RNG on each round and used to
+                    reseed the child, so that shuffling and augmentation noise
+                    differ across rounds.
+
+     Forking a process whose tensorflow session threads are running is not
+     safe, thus 'thread' is the only backend to be used during training.
+     'process' is meant for generators running without a live session.
+  """
+  THREAD = 'thread'
+  PROCESS = 'process'
+
+  _END = '__END_OF_BATCHES__'
+  _TIMEOUT = 0.1
+
+  def __init__(self, data_set, batches, depth=2, backend=THREAD):
+    """Construct a prefetcher
+    :param data_set: the TFRData from which `batches` is generated
+    :param batches: a batch generator (or any iterable) of `data_set`
+    :param depth: maximum number of batches prepared in advance
+    :param backend: 'thread' or 'process'
+    """
+    assert isinstance(data_set, TFRData)
+    if backend not in (self.THREAD, self.PROCESS): raise ValueError(
+      '!! Unknown prefetch backend `{}`'.format(backend))
+    self._data_set = data_set
+    self._batches = batches
+    self._depth = checker.check_positive_integer(depth)
+    self._backend = backend
+
+    self._queue = None
+    self._stop = None
+    self._worker = None
+    # Used only by thread backend to hold the tail of the generator
+    self._consumed = 0
+    self._condition = threading.Condition()
+
+  # region : Properties
+
+  @property
+  def is_threaded(self): return self._backend == self.THREAD
+
+  # endregion : Properties
+
+  # region : Overriden Methods
+
+  def __iter__(self):
+    self._start()
+    round_len, count = None, 0
+    try:
+      while True:
+        item = self._get()
+        # The sentinel may have been pickled thus `is` can not be used
+        if isinstance(item, str) and item == self._END: break
+        if isinstance(item, _Failure): item.raise_()
+        batch, round_len_ = item
+        if count == 0:
+          round_len = round_len_
+          # In process mode dynamic_round_len is set only in the child
+          if not self.is_threaded and round_len is not None:
+            self._data_set._dynamic_round_len = round_len
+        count += 1
+        yield self._unpack(batch)
+        self._acknowledge()
+    finally:
+      self.close()
+      if not self.is_threaded and round_len is not None:
+        self._data_set._dynamic_round_len = None
+
+  # endregion : Overriden Methods
+
+  # region : Public Methods
+
+  def close(self):
+    if self._worker is None: return
+    self._stop.set()
+    # Wake up the worker if it is holding the tail of generator
+    with self._condition: self._condition.notify_all()
+    # Drain the queue so that a blocked worker can exit
+    try:
+      while True: self._queue.get_nowait()
+    except queue.Empty: pass
+    self._worker.join(timeout=1.0)
+    if not self.is_threaded and self._worker.is_alive():
+      self._worker.terminate()
+    self._worker = None
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  def _start(self):
+    assert self._worker is None
+    if self.is_threaded:
+      self._queue = queue.Queue(maxsize=self._depth)
+      self._stop = threading.Event()
+      self._worker = threading.Thread(target=self._produce, daemon=True)
+    else:
+      # Generators can not be pickled thus fork is required
+      ctx = mp.get_context('fork')
+      self._queue = ctx.Queue(maxsize=self._depth)
+      self._stop = ctx.Event()
+      # Advance the parent's RNG and pass the seed to the child
+      seed = np.random.randint(np.iinfo(np.int32).max)
+      self._worker = ctx.Process(
+        target=self._produce, args=(seed,), daemon=True)
+    self._worker.start()
+
+  def _produce(self, seed=None):
+    if seed is not None: np.random.seed(seed), random.seed(seed)
+    count, round_len = 0, None
+    try:
+      for batch in self._batches:
+        if count == 0:
+          round_len = getattr(self._data_set, '_dynamic_round_len', None)
+        if not self._put((self._pack(batch), round_len)): return
+        count += 1
+        # The generator clears dynamic_round_len after yielding its last
+        # .. batch. Hold it until all batches have been consumed
+        if self.is_threaded and count == round_len: self._wait_for(count)
+        if self._stop.is_set(): return
+    except Exception as e:
+      self._put(_Failure(e))
+      return
+    self._put(self._END)
+
+  def _put(self, item):
+    while not self._stop.is_set():
+      try:
+        self._queue.put(item, timeout=self._TIMEOUT)
+        return True
+      except queue.Full: continue
+    return False
+
+  def _get(self):
+    while True:
+      try: return self._queue.get(timeout=self._TIMEOUT)
+      except queue.Empty:
+        if not self._worker.is_alive(): return self._get_nowait()
+
+  def _get_nowait(self):
+    try: return self._queue.get_nowait()
+    except queue.Empty: raise AssertionError(
+      '!! Prefetch worker exited unexpectedly')
+
+  def _acknowledge(self):
+    if not self.is_threaded: return
+    with self._condition:
+      self._consumed += 1
+      self._condition.notify_all()
+
+  def _wait_for(self, count):
+    with self._condition:
+      while self._consumed < count and not self._stop.is_set():
+        self._condition.wait(timeout=self._TIMEOUT)
+
+  def _pack(self, batch):
+    if self.is_threaded: return batch
+    state = batch.__dict__.copy()
+    properties = getattr(batch, 'properties', None)
+    if isinstance(properties, dict):
+      state['properties'] = {
+        k: v for k, v in properties.items() if not callable(v)}
+    return batch.__class__, state
+
+  def _unpack(self, batch):
+    if self.is_threaded: return batch
+    cls, state = batch
+    batch = cls.__new__(cls)
+    batch.__dict__.update(state)
+    # Restore callable properties from the source data set
+    if isinstance(state.get('properties', None), dict):
+      for k, v in self._data_set.properties.items():
+        if callable(v): batch.properties[k] = v
+    return batch
+
+  # endregion : Private Methods
+
+
+class _Failure(object):
+  """Carries an exception raised inside the worker back to the consumer"""
+
+  def __init__(self, error):
+    self.error = error
+    self.trace = traceback.format_exc()
+
+  def __getstate__(self):
+    # Exceptions may not be picklable, keep only their descriptions
+    return {'error': None, 'trace': self.trace}
+
+  def raise_(self):
+    if self.error is not None: raise self.error
+    raise RuntimeError(
+      '!! Error occurred in prefetch worker:\n{}'.format(self.trace))
+
+
+if __name__ == '__main__':
+  import time
+  import numpy as np
+  from tframe.data.dataset import DataSet
+
+  # Micro-benchmark: steps/sec with and without prefetching. The update step
+  # .. is simulated by a matrix product which releases the GIL
+  def preprocessor(batch, _):
+    batch.features = np.tanh(batch.features * 2.0 + 1.0)
+    return batch
+
+  features = np.random.rand(20000, 3072).astype(np.float32)
+  targets = np.eye(10)[np.random.randint(10, size=20000)]
+  data_set = DataSet(features, targets, NUM_CLASSES=10)
+  data_set.batch_preprocessor = preprocessor
+  w = np.random.rand(3072, 512).astype(np.float32)
+
+  def run(depth):
+    tic, steps = time.time(), 0
+    batches = data_set.gen_batches(128, shuffle=True, is_training=True)
+    if depth > 0: batches = Prefetcher(data_set, batches, depth)
+    for batch in batches:
+      np.dot(batch.features, w)
+      steps += 1
+    return steps / (time.time() - tic)
+
+  for d in (0, 1, 4):
+    print('>> depth = {}: {:.1f} steps/sec'.format(d, run(d)))
+
+  # RNN batches on synthetic limit order books shaped like FI-2010 (5 stocks
+  # .. with 40 features each, 3 classes). Signals read by Trainer, i.e.,
+  # .. `should_reset_state` and `dynamic_round_len`, must be the same as those
+  # .. of the non-prefetched run
+  from tframe import hub
+  from tframe.data.sequences.seq_set import SequenceSet
+  from tframe.data.sequences.finance.fi2010 import FI2010
+
+  def gen_lob_set(lengths):
+    return SequenceSet(
+      features=[np.random.rand(L, 40).astype(np.float32) for L in lengths],
+      targets=[np.eye(3)[np.random.randint(3, size=L)] for L in lengths],
+      name='LOB')
+
+  w_rnn = np.random.rand(40, 2048).astype(np.float32)
+
+  def run_rnn(seq_set, batch_size, num_steps, depth, rounds=5):
+    np.random.seed(0)
+    signals, tic = [], time.time()
+    for _ in range(rounds):
+      batches = seq_set.gen_rnn_batches(
+        batch_size, num_steps, shuffle=True, is_training=True)
+      if depth > 0: batches = Prefetcher(seq_set, batches, depth)
+      for batch in batches:
+        np.matmul(batch.features, w_rnn)
+        signals.append((batch.should_reset_state, seq_set.dynamic_round_len,
+                        batch.features.shape, float(np.sum(batch.features))))
+    return len(signals) / (time.time() - tic), signals
+
+  # (1) FI-2010 generator sampling sub-sequences from each stock
+  lob_set = gen_lob_set([2334, 4487, 3855, 5468, 9332])
+  lob_set.set_rnn_batch_generator(FI2010.rnn_batch_generator)
+  hub.sub_seq_len, hub.random_shift_pct = sum(lob_set.structure) // 32, 0.1
+  cases = [('FI-2010 sampling', lob_set, 32, 100)]
+  # (2) Traversal over shuffled sequences of various lengths, in which case
+  # .. round length depends on the permutation of each round
+  cases.append(('Traversal', gen_lob_set(
+    np.random.randint(200, 2000, size=200)), 32, 100))
+
+  for name, seq_set, batch_size, num_steps in cases:
+    if name == 'Traversal': hub.sub_seq_len = 0
+    _, reference = run_rnn(seq_set, batch_size, num_steps, 0)
+    for d in (0, 2):
+      sps, signals = run_rnn(seq_set, batch_size, num_steps, d)
+      assert signals == reference
+      print('>> {}, depth = {}: {:.1f} steps/sec'.format(name, d, sps))
+
+  # Steps/sec of Trainer._inner_loop training a small MLP on the same data
+  # .. without (before) and with (after) prefetching
+  import tensorflow as tf
+  from tframe import Classifier, hub
+  from tframe.layers import Input, Activation
+  from tframe.layers.hyper.dense import Dense
+
+  hub.save_model, hub.overwrite, hub.progress_bar = False, True, False
+  hub.batch_size, hub.epoch, hub.shuffle = 128, 2, True
+  model = Classifier(mark='prefetch_bench')
+  model.add(Input(sample_shape=[3072]))
+  model.add(Dense(num_neurons=512))
+  model.add(Activation('relu'))
+  model.add(Dense(num_neurons=10))
+  model.add(Activation('softmax'))
+  model.build(tf.train.AdamOptimizer(1e-3))
+  for d in (0, 2):
+    hub.prefetch_depth = d
+    counter, tic = model.counter or 0, time.time()
+    model.train(data_set)
+    print('>> Trainer, depth = {}: {:.1f} steps/sec'.format(
+      d, (model.counter - counter) / (time.time() - tic)))
@@ -0,0 +1,158 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import heapq
+import numpy as np
+
+from tframe import checker
+
+
+def _ceil_div(a, b):
+  """Integer ceil division which works for both ints and numpy arrays"""
+  return -(-a // b)
+
+
+def get_truncated_round_len(act_lens, num_steps, training):
+  """Closed-form version of the loop in DataSet.gen_rnn_batches when
+     act_lens is provided.
+
+     During training, each time the shortest sequence finishes, the remaining
+     ones are truncated at that point. Thus the number of batches is
+     sum_k ceil((u_k - u_{k-1}) / num_steps) where u is the sorted distinct
+     lengths. Otherwise, batches with exactly num_steps steps are emitted
+     until the longest sequence finishes.
+  """
+  act_lens = np.asarray(act_lens, dtype=np.int64)
+  assert act_lens.size > 0
+  checker.check_positive_integer(num_steps)
+  if act_lens.min() <= 0:
+    raise AssertionError('!! active lengths must be positive')
+  if not training: return int(_ceil_div(act_lens.max(), num_steps))
+  levels = np.unique(act_lens)
+  return int(np.sum(_ceil_div(np.diff(levels, prepend=0), num_steps)))
+
+
+def get_batched_round_len(structure, indices, batch_size, num_steps, training):
+  """Round length of traversing sequences with lengths `structure` in order
+     `indices` with batches of `batch_size` sequences, i.e.,
+     sum([get_truncated_round_len(batch) for batch in batches])
+     vectorized over all batches.
+  """
+  checker.check_positive_integer(batch_size)
+  checker.check_positive_integer(num_steps)
+  lengths = np.asarray(structure, dtype=np.int64)[np.asarray(indices)]
+  assert lengths.size > 0
+  if lengths.min() <= 0:
+    raise AssertionError('!! active lengths must be positive')
+  # Arrange lengths as a (num_batches, batch_size) matrix. The last batch is
+  # .. padded with its own maximum which adds no new level
+  num_batches = int(_ceil_div(lengths.size, batch_size))
+  pad = num_batches * batch_size - lengths.size
+  if pad > 0:
+    last_max = lengths[(num_batches - 1) * batch_size:].max()
+    lengths = np.concatenate([lengths, np.full(pad, last_max, np.int64)])
+  lengths = lengths.reshape(num_batches, batch_size)
+
+  if not training:
+    return int(np.sum(_ceil_div(lengths.max(axis=1), num_steps)))
+  levels = np.sort(lengths, axis=1)
+  # Duplicated levels have zero differences and thus contribute nothing
+  return int(np.sum(_ceil_div(np.diff(levels, axis=1, prepend=0), num_steps)))
+
+
+def get_parallel_round_len(batch_size, num_steps, lengths):
+  """Round length of ParallelEngine.emit-ing until flameout.
+
+     The engine keeps `batch_size` slots. Each emit advances all slots by
+     min(shortest remainder, num_steps), and exhausted slots are refilled
+     with the next sequence (or removed if there is none left). Only the
+     multiset of slot end points matters, so the process is replayed event
+     by event (one event per finished sequence) using a heap of end points.
+  """
+  checker.check_positive_integer(batch_size)
+  assert isinstance(num_steps, int)
+  lengths = iter(lengths)
+  ends, offset, round_len = [], 0, 0
+
+  def _fill(n):
+    # Zero-length sequences are skipped as they are always inactive
+    for _ in range(n):
+      for length in lengths:
+        if length > 0:
+          heapq.heappush(ends, offset + length)
+          break
+
+  _fill(batch_size)
+  while len(ends) > 0:
+    # Emit until the shortest slot is exhausted
+    m = ends[0] - offset
+    round_len += 1 if num_steps < 0 else int(_ceil_div(m, num_steps))
+    offset = ends[0]
+    # Refill all exhausted slots
+    finished = 0
+    while len(ends) > 0 and ends[0] == offset:
+      heapq.heappop(ends)
+      finished += 1
+    _fill(finished)
+
+  return round_len
+
+
+if __name__ == '__main__':
+  import time
+
+  # Reference implementations replaying the original simulations
+  def simulate_truncated(act_lens, num_steps, training):
+    act_lens, counter = list(act_lens), 0
+    while len(act_lens) > 0:
+      sl = min(act_lens)
+      n = int(np.ceil(sl / num_steps))
+      counter += n
+      L = sl if training else n * num_steps
+      act_lens = [al for al in [al - L for al in act_lens] if al > 0]
+    return counter
+
+  def simulate_parallel(batch_size, num_steps, lengths):
+    slots, cursor, round_len = [None] * batch_size, 0, 0
+    while True:
+      while any(s is None or s == 0 for s in slots):
+        i = [j for j, s in enumerate(slots) if s is None or s == 0][0]
+        if cursor < len(lengths):
+          slots[i] = lengths[cursor]
+          cursor += 1
+        else: slots.pop(i)
+      if len(slots) == 0: break
+      steps = min(slots) if num_steps < 0 else min(min(slots), num_steps)
+      slots = [s - steps for s in slots]
+      round_len += 1
+    return round_len
+
+  # Property check on random length distributions
+  rng = np.random.RandomState(0)
+  for trial in range(2000):
+    n = rng.randint(1, 40)
+    high = rng.choice([3, 20, 200])
+    structure = list(rng.randint(1, high, size=n))
+    bs, ns = rng.randint(1, 9), rng.randint(1, 25)
+    training = bool(rng.randint(2))
+    indices = rng.permutation(n)
+    expected = sum([simulate_truncated(
+      np.array(structure)[indices[i:i + bs]], ns, training)
+      for i in range(0, n, bs)])
+    assert get_batched_round_len(
+      structure, indices, bs, ns, training) == expected
+    assert get_truncated_round_len(
+      structure, ns, training) == simulate_truncated(structure, ns, training)
+    ns_pe = ns if rng.randint(4) else -1
+    assert get_parallel_round_len(bs, ns_pe, structure) == simulate_parallel(
+      bs, ns_pe, structure)
+  print('>> All checks passed')
+
+  # Timing on a large structure
+  structure = list(np.random.randint(100, 5000, size=50000))
+  indices = np.random.permutation(len(structure))
+  tic = time.time()
+  get_batched_round_len(structure, indices, 32, 100, True)
+  get_parallel_round_len(32, 100, structure)
+  print('>> Time elapsed: {:.3f} secs'.format(time.time() - tic))
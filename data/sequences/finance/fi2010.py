@@ -108,9 +108,7 @@ class FI2010(DataAgent):
       data_dir, auction, norm_type, type_id, file_slices=file_slices)
 
     # Wrap raw data into tframe Sequence set
-    data_dict = {'raw_data': features}
-    data_dict.update(targets)
-    seq_set = SequenceSet(data_dict=data_dict, name=cls.DATA_NAME)
+    seq_set = cls._wrap_raw_data(features, targets)
     # Save Sequence set
     seq_set.save(data_path)
     console.show_status('Sequence set saved to `{}`'.format(data_path))
@@ -357,44 +355,13 @@ class FI2010(DataAgent):
       train_dir, True, auction, norm_type)
     test_paths = cls._get_data_file_path_list(
       test_dir, False, auction, norm_type)
-    # Read data from .txt files
-    features, targets = [], {}
-    horizons = [10, 20, 30, 50, 100]
-    for h in horizons: targets[h] = []
-    dim = 144
     if file_slices is None:train_slice, test_slice = slice(0, 1), slice(0, 9)
     else:
       checker.check_type(file_slices, slice)
       assert len(file_slices) == 2
       train_slice, test_slice = file_slices
     data_paths = train_paths[train_slice] + test_paths[test_slice]
-    for i, path in enumerate(data_paths):
-      # Create day slot for features and targets
-      features.append([])
-      for h in horizons: targets[h].append([])
-      console.show_status('Reading data from `{}` ...'.format(
-        os.path.basename(path)))
-      with open(path, 'r') as f: lines = f.readlines()
-      # Sanity check
-      assert len(lines) == dim + len(horizons)
-      # Parse data
-      data = [[s for s in line.split(' ') if s] for line in lines]
-      total = len(data[0])
-      assert [len(d) == total for d in data]
-      bar = ProgressBar(total)
-      # Put data appropriately
-      for j, str_list in enumerate(zip(*data)):
-        col = np.array(str_list, dtype=np.float)
-        features[-1].append(col[:dim])
-        for k, h in enumerate(horizons): targets[h][-1].append(col[dim + k])
-        # Refresh progress bar
-        bar.show(j + 1)
-      # Stack list
-      features[-1] = np.stack(features[-1], axis=0)
-      for k, h in enumerate(horizons):
-        targets[h][-1] = np.array(
-          np.stack(targets[h][-1], axis=0), dtype=np.int64) - 1
-      console.show_status('Successfully read {} event blocks'.format(total))
+    features, targets = cls._read_data_files(data_paths)
     # Sanity check and return
     total = sum([len(x) for x in features])
     console.show_status('Totally {} event blocks read.'.format(total))
@@ -402,6 +369,57 @@ class FI2010(DataAgent):
     else: assert total == 458125
     return features, targets
 
+  @classmethod
+  def _read_data_files(cls, data_paths):
+    """Read features and targets from .txt files"""
+    features, targets = [], {}
+    horizons = [10, 20, 30, 50, 100]
+    for h in horizons: targets[h] = []
+    dim = 144
+    for path in data_paths:
+      console.show_status('Reading data from `{}` ...'.format(
+        os.path.basename(path)))
+      block = cls._read_data_file(path, dim + len(horizons))
+      # Put data appropriately
+      features.append(np.array(block[:, :dim]))
+      for k, h in enumerate(horizons):
+        targets[h].append(np.array(block[:, dim + k], dtype=np.int64) - 1)
+      console.show_status('Successfully read {} event blocks'.format(
+        len(block)))
+    return features, targets
+
+  @classmethod
+  def _wrap_raw_data(cls, features, targets):
+    data_dict = {'raw_data': features}
+    data_dict.update(targets)
+    return SequenceSet(data_dict=data_dict, name=cls.DATA_NAME)
+
+  @classmethod
+  def _read_data_file(cls, path, rows):
+    """Read a .txt file containing `rows` lines of space-separated numbers in
+       one pass and return an array of shape [num_columns, rows], i.e., each
+       row of the returned array is a column of the .txt file.
+       The parsed array is cached beside the .txt file as a .npy file which
+       is reused as long as it is newer than the .txt file.
+    """
+    cache_path = path + '.npy'
+    if (os.path.exists(cache_path) and
+        os.path.getmtime(cache_path) >= os.path.getmtime(path)):
+      return np.load(cache_path, mmap_mode='r')
+    # Parse all numbers at once. Newlines are treated as separators
+    with open(path, 'r') as f: total = len(f.readline().split())
+    data = np.fromfile(path, dtype=np.float64, sep=' ')
+    # Sanity check
+    if data.size != rows * total: raise AssertionError(
+      '!! `{}` should contain {} lines with {} numbers each'.format(
+        os.path.basename(path), rows, total))
+    block = np.ascontiguousarray(np.reshape(data, (rows, total)).T)
+    # Write to a temporary file first so that a broken cache will never be read
+    tmp_path = cache_path + '.tmp.npy'
+    np.save(tmp_path, block)
+    os.replace(tmp_path, cache_path)
+    return block
+
   @classmethod
   def _check_targets(cls, data_dir, auction, data_dict):
     console.show_status('Checking targets list ...')
@@ -533,12 +551,12 @@ class FI2010(DataAgent):
       starts = wise_man.spread(len(x), num, L, rad)
       # Sanity check
       assert len(starts) == num
-      # Put the sub-sequences into corresponding lists
-      for s in starts:
-        features.append(x[s:s+L])
-        targets.append(y[s:s+L])
+      # Gather the sub-sequences at once
+      indices = starts[:, None] + np.arange(L)
+      features.append(x[indices])
+      targets.append(y[indices])
     # Stack features and targets
-    features, targets = np.stack(features), np.stack(targets)
+    features, targets = np.concatenate(features), np.concatenate(targets)
     data_set = DataSet(features, targets, is_rnn_input=True)
     assert data_set.size == batch_size
     # Generate RNN batches using DataSet.gen_rnn_batches
@@ -748,3 +766,59 @@ class Extract(Layer):
       indices = [i for i in range(dim) if i % 2 != 0]
       x = tf.gather(x, indices, axis=-1)
     return x
+
+
+if __name__ == '__main__':
+  import time
+  import shutil
+  import tempfile
+
+  # Reference implementation replaying the original column-by-column parser
+  def read_data_file_loop(path, dim, horizons):
+    with open(path, 'r') as f: lines = f.readlines()
+    data = [[s for s in line.split(' ') if s] for line in lines]
+    features, targets = [], {h: [] for h in horizons}
+    for str_list in zip(*data):
+      col = np.array(str_list, dtype=np.float64)
+      features.append(col[:dim])
+      for k, h in enumerate(horizons): targets[h].append(col[dim + k])
+    targets = {h: np.array(np.stack(t, axis=0), dtype=np.int64) - 1
+               for h, t in targets.items()}
+    return np.stack(features, axis=0), targets
+
+  # Generate small fixtures in the format of FI-2010 .txt files
+  dim, horizons = 144, [10, 20, 30, 50, 100]
+  fixture_dir = tempfile.mkdtemp()
+  try:
+    paths = []
+    for i, total in enumerate((3000, 1700)):
+      path = os.path.join(
+        fixture_dir, 'Test_Dst_NoAuction_DecPre_CF_{}.txt'.format(i + 1))
+      rows = np.concatenate([np.random.rand(dim, total) * 1000,
+                             np.random.randint(1, 4, size=(5, total))])
+      with open(path, 'w') as f:
+        for row in rows:
+          f.write('  ' + ' '.join(['{:.7e}'.format(v) for v in row]) + '\n')
+      paths.append(path)
+
+    tic = time.time()
+    ref_features, ref_targets = [], {h: [] for h in horizons}
+    for path in paths:
+      x, y = read_data_file_loop(path, dim, horizons)
+      ref_features.append(x)
+      for h in horizons: ref_targets[h].append(y[h])
+    ref_set = FI2010._wrap_raw_data(ref_features, ref_targets)
+    print('>> Loop parser: {:.2f} secs'.format(time.time() - tic))
+    for name in ('Vectorized parser (cold)', 'Vectorized parser (warm)'):
+      tic = time.time()
+      seq_set = FI2010._wrap_raw_data(*FI2010._read_data_files(paths))
+      print('>> {}: {:.2f} secs'.format(name, time.time() - tic))
+      # Sequence sets must be identical
+      assert seq_set.structure == ref_set.structure
+      assert set(seq_set.data_dict.keys()) == set(ref_set.data_dict.keys())
+      for key, ref_list in ref_set.data_dict.items():
+        for a, b in zip(seq_set.data_dict[key], ref_list):
+          assert a.dtype == b.dtype and a.shape == b.shape
+          assert a.tobytes() == b.tobytes()
+    print('>> Sequence sets are identical')
+  finally: shutil.rmtree(fixture_dir)
@@ -2,6 +2,7 @@ import numpy as np
 
 from tframe import checker
 from tframe.data.dataset import DataSet
+from tframe.data.round_length import get_parallel_round_len
 
 
 class ParallelEngine(object):
@@ -102,24 +103,9 @@ class ParallelEngine(object):
   @staticmethod
   def get_round_length(batch_size, num_steps, lengths, len_f=None):
     checker.check_type(lengths, int)
-    pe = ParallelEngine(batch_size)
-    round_len, cursor = 0, 0
-
-    while True:
-      # Set sequences and targets if necessary
-      while not pe.is_ready:
-        if cursor < len(lengths):
-          length = lengths[cursor] if len_f is None else len_f(lengths[cursor])
-          ds = DataSet(features=np.zeros(shape=(length, 1)))
-          cursor += 1
-        else: ds = None
-        pe.set_data(ds)
-
-      if pe.flameout: break
-      pe.emit(num_steps)
-      round_len += 1
-
-    return round_len
+    if len_f is not None: lengths = [len_f(l) for l in lengths]
+    # Replay the emitting process without allocating any data
+    return get_parallel_round_len(batch_size, num_steps, lengths)
 
   # endregion : Public Methods
 
@@ -5,6 +5,7 @@ from __future__ import print_function
 import os
 import numpy as np
 import random
+import multiprocessing as mp
 from enum import Enum, unique
 from collections import OrderedDict
 
@@ -50,8 +51,20 @@ class ReberGrammar(object):
   # Generate observation table
   OB_TABLE = np.eye(len(Symbol), dtype=np.float32)
 
-  def __init__(self, embedded=False, multiple=1, specification=None):
+  def __init__(self, embedded=False, multiple=1, specification=None,
+               key=None):
+    """Randomly make a Reber string
+    :param key: if provided, the string encoded by this key (see the `key`
+                property) is rebuilt without drawing any random number
+    """
     assert specification in (None, 'T', 'P')
+    # Symbols to follow if the string is rebuilt from key
+    symbols = None
+    if key is not None:
+      symbols = [Symbol(v) for v in key]
+      if embedded: specification, symbols = symbols[1].name, symbols[2:-2]
+      # The leading B is not a transfer
+      symbols = iter(symbols[1:])
     self._symbol_list = [Symbol.B]
     self._sub_rebers = [[Symbol.B]]
     self._multiple = checker.check_positive_integer(multiple)
@@ -67,7 +80,7 @@ class ReberGrammar(object):
     stat, count = 0, 0
     while stat is not None:
       transfer_list.append(self.TRANSFER_MATRIX[stat])
-      symbol, stat = self._transfer(stat)
+      symbol, stat = self._transfer(stat, symbols)
       self._symbol_list.append(symbol)
       self._sub_rebers[count].append(symbol)
       # Generate next embedded if necessary
@@ -78,6 +91,7 @@ class ReberGrammar(object):
           self._symbol_list.append(Symbol.B)
           self._sub_rebers[count].append(symbol.B)
           transfer_list.append(self.TRANSFER_MATRIX[-1])
+          if symbols is not None: next(symbols)
           stat = 0
     assert len(self._sub_rebers) == self._multiple
 
@@ -129,6 +143,11 @@ class ReberGrammar(object):
   def value(self):
     return np.array([s.value for s in self._symbol_list], dtype=np.int32)
 
+  @property
+  def key(self):
+    """A compact hashable encoding of this string"""
+    return bytes([s.value for s in self._symbol_list])
+
   @property
   def one_hot(self):
     result = np.zeros((len(self), len(Symbol)), np.float32)
@@ -158,30 +177,70 @@ class ReberGrammar(object):
 
   @classmethod
   def make_strings(cls, num, unique=True, exclusive=None, embedded=False,
-                   multiple=1, verbose=False, interleave=True):
+                   multiple=1, verbose=False, interleave=True, num_workers=1,
+                   seed=None):
+    """Make a list of Reber strings.
+    :param num_workers: if larger than 1, candidate strings will be sampled
+                        by this number of processes in chunks sized to the
+                        number of strings still needed. Chunk seeds are
+                        spawned from `seed` and chunks are merged in order
+                        thus the result is determined by `seed`
+    :param seed: base seed for workers. If not provided, it will be drawn
+                 from the global random state
+    """
     # Check input
     if exclusive is None: exclusive = []
     elif not isinstance(exclusive, list):
       raise TypeError('!! exclusive must be a list of Reber strings')
+    checker.check_positive_integer(num_workers)
+    # Keys of strings to be excluded
+    excluded = set([s.key for s in exclusive])
+    # Candidates are sampled as keys. Strings are built only when accepted
+    if num_workers == 1:
+      candidates = lambda token: ReberGrammar._sample_key(
+        embedded, multiple, token)
+    else:
+      # Number of strings needed for each long token
+      if embedded and interleave: demand = {'T': (num + 1) // 2, 'P': num // 2}
+      else: demand = {None: num}
+      candidates = _CandidatePool(
+        demand, excluded, embedded, multiple, unique, num_workers, seed)
     # Make strings
     reber_list = []
     long_token = None
-    for i in range(num):
-      if interleave: long_token = 'T' if long_token in ('P', None) else 'P'
-      while True:
-        string = ReberGrammar(
-          embedded, multiple=multiple, specification=long_token)
-        if unique and string in reber_list: continue
-        if string in exclusive: continue
-        reber_list.append(string)
-        break
-      if verbose:
-        console.clear_line()
-        console.print_progress(i + 1, num)
+    try:
+      for i in range(num):
+        if interleave: long_token = 'T' if long_token in ('P', None) else 'P'
+        while True:
+          key = candidates(long_token)
+          if key in excluded: continue
+          if unique: excluded.add(key)
+          reber_list.append(ReberGrammar(embedded, multiple=multiple, key=key))
+          break
+        if verbose and (i + 1 == num or i % 1000 == 0):
+          console.clear_line()
+          console.print_progress(i + 1, num)
+    finally:
+      if isinstance(candidates, _CandidatePool): candidates.close()
     if verbose: console.clear_line()
     # Return a list of Reber string
     return reber_list
 
+  @staticmethod
+  def encode(reber_list):
+    """Encode a list of Reber strings into one-hot features and local
+       binary targets in a vectorized way. Equivalent to
+       [r.one_hot for r in reber_list], [r.local_binary for r in reber_list]
+    """
+    # The last symbol of each string is not an input
+    lengths = [len(r) - 1 for r in reber_list]
+    indices = np.cumsum(lengths)[:-1]
+    values = np.concatenate([r.value[:-1] for r in reber_list])
+    one_hots = ReberGrammar.OB_TABLE[values]
+    transfer_prob = np.concatenate([r.transfer_prob for r in reber_list])
+    local_binary = np.array(transfer_prob > 0, dtype=transfer_prob.dtype)
+    return np.split(one_hots, indices), np.split(local_binary, indices)
+
   def check_grammar_amu18(self, probs):
     """Return lists of match situations for both RC and ERC criteria
        ref: AMU, 2018"""
@@ -230,12 +289,114 @@ class ReberGrammar(object):
   # region : Private Methods
 
   @classmethod
-  def _transfer(cls, stat):
-    return random.choice(cls.TRANSFER[stat])
+  def _transfer(cls, stat, symbols=None):
+    if symbols is None: return random.choice(cls.TRANSFER[stat])
+    symbol = next(symbols)
+    for choice in cls.TRANSFER[stat]:
+      if choice[0] is symbol: return choice
+    raise ValueError('!! `{}` can not follow state {}'.format(
+      symbol.name, stat))
+
+  @classmethod
+  def _sample_key(cls, embedded=False, multiple=1, specification=None):
+    """Randomly make a Reber string and return its key without building
+       probabilities. Random numbers are drawn in the same order as in
+       __init__ thus ReberGrammar(..., key=cls._sample_key(...)) is the same
+       as ReberGrammar(...) under the same random state"""
+    values, stat, count = [Symbol.B.value], 0, 0
+    while stat is not None:
+      symbol, stat = cls._transfer(stat)
+      values.append(symbol.value)
+      if stat is None:
+        count += 1
+        if count < multiple:
+          values.append(Symbol.B.value)
+          stat = 0
+    if embedded:
+      if specification == 'T': second_symbol = Symbol.T
+      elif specification == 'P': second_symbol = Symbol.P
+      else: second_symbol = random.choice((Symbol.T, Symbol.P))
+      values = ([Symbol.B.value, second_symbol.value] + values +
+                [second_symbol.value, Symbol.E.value])
+    return bytes(values)
 
   # endregion : Private Methods
 
 
+class _CandidatePool(object):
+  """Keys of candidate Reber strings sampled by a pool of processes. Only
+     strings still needed are sampled, in chunks whose seeds are spawned from
+     a single SeedSequence. Chunks are consumed in the order they are
+     spawned"""
+
+  def __init__(self, demand, excluded, embedded, multiple, unique,
+               num_workers, seed=None):
+    assert isinstance(demand, dict) and isinstance(excluded, set)
+    self._demand = demand
+    # Keys to be rejected. This set is updated by the consumer
+    self._excluded = excluded
+    self._embedded = embedded
+    self._multiple = multiple
+    self._unique = unique
+    self._num_workers = num_workers
+    if seed is None: seed = random.randrange(2 ** 31)
+    self._seed_sequence = np.random.SeedSequence(seed)
+    self._served = {token: 0 for token in demand}
+    self._popped = {token: 0 for token in demand}
+    self._queues = {token: [] for token in demand}
+    self._pool = mp.get_context('fork').Pool(num_workers)
+
+  def __call__(self, token):
+    if token not in self._queues: token = None
+    queue = self._queues[token]
+    while True:
+      if len(queue) == 0: self._sample(token)
+      key = queue.pop()
+      self._popped[token] += 1
+      # Keys returned are always accepted by the consumer
+      if key not in self._excluded: break
+    self._served[token] += 1
+    return key
+
+  def close(self):
+    self._pool.terminate()
+    self._pool.join()
+
+  def _sample(self, token):
+    """Sample strings still needed for each token. Since candidates may be
+       rejected, the number to sample is scaled by the acceptance ratio
+       observed so far"""
+    tasks = []
+    for t, queue in self._queues.items():
+      need = self._demand[t] - self._served[t] - len(queue)
+      # The queue of `token` is empty and must be refilled
+      if t == token: need = max(need, 1)
+      if need <= 0: continue
+      if self._served[t] > 0:
+        need = int(np.ceil(need * self._popped[t] / self._served[t]))
+      size = int(np.ceil(need / self._num_workers))
+      for _ in range(min(self._num_workers, need)):
+        seed_sequence = self._seed_sequence.spawn(1)[0]
+        tasks.append((seed_sequence, t, size, self._embedded,
+                      self._multiple, self._unique))
+    chunks = self._pool.map(_sample_chunk, tasks)
+    # Queues are used as stacks (popped from the end) thus strings are put
+    # .. reversely before remaining ones
+    for task, keys in zip(tasks, chunks):
+      self._queues[task[1]][:0] = reversed(keys)
+
+
+def _sample_chunk(args):
+  seed_sequence, token, size, embedded, multiple, unique = args
+  random.seed(int(seed_sequence.generate_state(1)[0]))
+  keys = [ReberGrammar._sample_key(embedded, multiple, token)
+          for _ in range(size)]
+  # Later duplicates in a chunk are always rejected by the consumer, drop
+  # .. them here to save the cost of sending them back
+  if unique: keys = list(OrderedDict.fromkeys(keys))
+  return keys
+
+
 class ERG(DataAgent):
   """Embedded Reber Grammar"""
   DATA_NAME = 'EmbeddedReberGrammar'
@@ -286,9 +447,9 @@ class ERG(DataAgent):
         multiple=multiple)
 
     # Wrap erg into a DataSet
-    features = [erg.one_hot for erg in erg_list]
-    val_targets = [erg.local_binary if local_binary else erg.transfer_prob
-                   for erg in erg_list]
+    features, binaries = ReberGrammar.encode(erg_list)
+    val_targets = (binaries if local_binary
+                   else [erg.transfer_prob for erg in erg_list])
     targets = ([erg.observed_prob for erg in erg_list]
                if not cheat else val_targets)
     # targets = [erg.transfer_prob for erg in erg_list]
@@ -588,15 +749,47 @@ class ERG(DataAgent):
 
 
 if __name__ == '__main__':
-  console.show_status('Making data ...')
-  data_set = ReberGrammar.make_strings(
-    5, unique=True, verbose=True, embedded=True, multiple=1)
-  console.show_status('{} strings have been made'.format(len(data_set)))
-
-
-
-
-
-
+  import time
 
+  # Reference implementation with list-based uniqueness check
+  def make_strings_list(num):
+    reber_list, long_token = [], None
+    for _ in range(num):
+      long_token = 'T' if long_token in ('P', None) else 'P'
+      while True:
+        string = ReberGrammar(True, specification=long_token)
+        if string in reber_list: continue
+        reber_list.append(string)
+        break
+    return reber_list
 
+  # Strings and targets must be unchanged under the same seed
+  random.seed(0)
+  ref = make_strings_list(1000)
+  random.seed(0)
+  strings = ReberGrammar.make_strings(1000, embedded=True)
+  assert [str(r) for r in ref] == [str(r) for r in strings]
+  features, binaries = ReberGrammar.encode(strings)
+  for r, x, y in zip(strings, features, binaries):
+    assert np.array_equal(x, r.one_hot) and np.array_equal(y, r.local_binary)
+  # Multiprocess sampling must be deterministic and unique
+  keys = [[r.key for r in ReberGrammar.make_strings(
+    5000, embedded=True, num_workers=4, seed=1)] for _ in range(2)]
+  assert keys[0] == keys[1] and len(set(keys[0])) == 5000
+  console.show_status('All checks passed')
+
+  tic = time.time()
+  make_strings_list(1000)
+  console.show_status('List-based: 1000 strings made in {:.1f} secs'.format(
+    time.time() - tic))
+  # Distinct embedded strings grow roughly as n^0.58 of the strings sampled,
+  # .. thus only 10000 unique strings are made. Larger sets allow repetition
+  for num in (10000, 100000, 1000000):
+    unique = num <= 10000
+    for num_workers in (1, 4):
+      tic = time.time()
+      ReberGrammar.make_strings(num, unique=unique, embedded=True,
+                                num_workers=num_workers, seed=0)
+      console.show_status(
+        '{} workers: {} {}strings made in {:.1f} secs'.format(
+          num_workers, num, 'unique ' if unique else '', time.time() - tic))
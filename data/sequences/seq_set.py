@@ -8,6 +8,7 @@ from tframe import hub as th
 from tframe import checker, console
 
 from tframe.data.dataset import DataSet
+from tframe.data.round_length import get_batched_round_len
 from tframe.data.sequences.paral_engine import ParallelEngine
 from tframe.utils.fancy.wheel import Wheel
 
@@ -148,6 +149,7 @@ class SequenceSet(DataSet):
       else: raise KeyError('!! Can not resolve "{}"'.format(item))
 
     # If item is index array
+    item = self._check_indices(item)
     f = lambda x: self._get_subset(x, item)
     data_set = SequenceSet(
       data_dict=self._apply(f), summ_dict=self._apply(f, self.summ_dict),
@@ -354,6 +356,13 @@ class SequenceSet(DataSet):
 
   def turn_parallel_on(self): self.properties[self.PARALLEL_ON] = True
 
+  def refresh_groups(self, target_key='targets'):
+    """Sequences are grouped by summary targets only. Targets in data_dict
+       have one label per step thus can not be used"""
+    if target_key not in self.summ_dict.keys(): raise AssertionError(
+      '!! Can not find summary targets with key `{}`'.format(target_key))
+    self._set_groups(self.summ_dict[target_key])
+
   def normalize_feature(self, mu, sigma=None, element_wise=True):
     if element_wise: assert self.equal_length
     assert isinstance(mu, np.ndarray)
@@ -372,8 +381,6 @@ class SequenceSet(DataSet):
     data_set = super()._finalize(data_set, indices)
     data_set.properties.pop(self.DATA_STACK, None)
     data_set.properties.pop(self.PADDED_STACK, None)
-    if self.num_classes is not None and 'targets' in self.summ_dict.keys():
-      data_set.refresh_groups()
     return data_set
 
   def _check_data(self):
@@ -458,17 +465,10 @@ class SequenceSet(DataSet):
     # Check indices
     _indices = self.indices if training else self._ordered_indices
     assert isinstance(_indices, np.ndarray) and _indices.size == self.size
-    # Simulate the gen_batches process in gen_rnn_batches method
-    num_batches = int(np.ceil(self.size / batch_size))
-    counter = 0
-    structure = np.array(self.structure)
-    for i in range(num_batches):
-      # Get sequence list of length `batch_size`
-      indices = self._select(i, batch_size, training=training)
-      act_lens = structure[indices]
-      # Traverse this sequence batch
-      counter += self._get_dynamic_round_len(act_lens, num_steps, training)
-    return counter
+    # Equivalent to simulating the gen_batches process in gen_rnn_batches
+    # .. method batch by batch
+    return get_batched_round_len(
+      self.structure, _indices, batch_size, num_steps, training)
 
   # endregion : Private Methods
 
@@ -544,5 +544,22 @@ class SequenceSet(DataSet):
   # endregion : BETA
 
 
-
-
+if __name__ == '__main__':
+  # Groups of subsets are calculated lazily from summary targets
+  N, C = 100, 3
+  labels = np.random.randint(C, size=N)
+  features = [np.random.rand(np.random.randint(2, 9), 4) for _ in range(N)]
+  summaries = [np.eye(C)[[label]] for label in labels]
+  data_set = SequenceSet(features, summaries, n_to_one=True, NUM_CLASSES=C)
+  indices = np.random.permutation(N)[:40]
+  subset = data_set[indices]
+  for c, group in enumerate(subset.groups):
+    assert np.all(labels[indices[group]] == c)
+  assert sum([len(g) for g in subset.groups]) == 40
+  # Per-step targets in data_dict must not be used as class labels
+  targets = [np.eye(C)[np.random.randint(C, size=len(x))] for x in features]
+  subset = SequenceSet(features, targets, NUM_CLASSES=C)[indices]
+  try: groups = subset.groups
+  except AssertionError: groups = None
+  assert groups is None
+  console.show_status('All checks passed')
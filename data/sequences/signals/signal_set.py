@@ -12,6 +12,7 @@ from tframe.data.sequences.seq_set import SequenceSet
 from tframe.data.sequences.signals.tf_signal import Signal
 
 import tframe.utils.misc as misc
+from tframe.utils.maths import dsp
 
 
 class SignalSet(SequenceSet):
@@ -221,26 +222,23 @@ class SignalSet(SequenceSet):
   # region : Public Static Methods
 
   @staticmethod
-  def chop_with_stride(x, y, size, stride, rand_shift=True):
+  def chop_with_stride(x, y, size, stride, rand_shift=True, as_view=False):
+    """Chop x (and y if it has the same length as x) into frames of `size`
+       with `stride`. Frames are read-only views if as_view is True"""
     assert isinstance(x, np.ndarray) and isinstance(y, np.ndarray)
     checker.check_type([size, stride], int)
 
     out_len = SignalSet.chop_with_stride_len_f(len(x), size, stride)
-    x_out = np.zeros(shape=(out_len, size))
-    y_out = np.zeros(shape=(out_len, *y.shape[1:]))
 
     if rand_shift:
       remain = len(x) - ((out_len - 1) * stride + size)
       shift = np.random.randint(remain + 1)
     else: shift = 0
-    for i in range(out_len):
-      # Fill in x
-      x_out[i] = x[shift + stride * i:shift + stride * i + size]
-      # Fill in y if necessary
-      if len(x) == len(y):
-        y_out[i] = y[shift + stride * i:shift + stride * i + size]
-
-    if len(x) != len(y):
+
+    x_out = dsp.sliding_window(x[shift:], size, stride, as_view)[:out_len]
+    if len(x) == len(y):
+      y = dsp.sliding_window(y[shift:], size, stride, as_view)[:out_len]
+    else:
       assert len(y) == 1
       y = np.tile(y, (out_len, 1))
 
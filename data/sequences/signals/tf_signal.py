@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import numpy as np
 from tframe import checker
+from tframe.utils.maths import dsp
 
 
 class Signal(np.ndarray):
@@ -110,14 +111,16 @@ class Signal(np.ndarray):
 
   # region : Public Methods
 
-  def causal_matrix(self, memory_depth, skip_head=False):
+  def causal_matrix(self, memory_depth, skip_head=False, as_view=False):
+    """Return a matrix whose i-th row is [x_{i-D+1}, ..., x_i] with zeros
+       padded at the head. If as_view is True, the matrix is a read-only
+       view of a padded copy of this signal"""
     checker.check_positive_integer(memory_depth)
     assert isinstance(self, np.ndarray)
     if memory_depth == 1: return np.reshape(self, (-1, 1))
-    N, D = self.size, memory_depth
+    D = memory_depth
     x = np.append(np.zeros(shape=(D - 1,)), self)
-    matrix = np.zeros(shape=(N, D))
-    for i in range(N): matrix[i] = x[i:i+D]
+    matrix = dsp.sliding_window(x, D, as_view=as_view)
     return matrix[D - 1:] if skip_head else matrix
 
   def auto_correlation(self, lags, keep_dim=False):
@@ -3,7 +3,9 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+import hashlib
 import numpy as np
+import multiprocessing as mp
 
 from collections import OrderedDict
 
@@ -26,6 +28,27 @@ def clusters2list(clusters):
   for cluster in clusters: result.extend(list(cluster))
   return result
 
+
+def _extract_feature(args):
+  """Calculate un-normalized [MFCC12, energy] feature of a signal. Defined
+     at module level so that it can be dispatched to a process pool"""
+  import librosa
+  signal_, sr, pre_emp_coef, n_fft, hop_length = args
+  # Do pre-emphasis
+  signal_ = dsp.pre_emphasize(np.asarray(signal_), pre_emp_coef)
+  # Generate 12 channels using MFCC
+  mfcc12 = librosa.feature.mfcc(
+    signal_, sr=sr, n_mfcc=12, n_fft=n_fft, hop_length=hop_length)
+  # Transpose mfcc matrix to shape (length, 12)
+  mfcc12 = np.transpose(mfcc12)
+
+  # Calculate energy
+  energy = dsp.short_time_energy(signal_, n_fft, stride=hop_length)
+  energy = energy.reshape((-1, 1))
+  assert mfcc12.shape[0] == energy.shape[0]
+  return np.concatenate((mfcc12, energy), axis=1)
+
+
 class TIMIT25(DataAgent):
   """Totally 25 classes of audio signals each of which has 7
      different examplars. These 25 classes are arranged in 5 clusters based on
@@ -39,6 +62,11 @@ class TIMIT25(DataAgent):
   DATA_NAME = 'TIMIT-25'
   TFD_FILE_NAME = 'timit-25.tfds'
 
+  # Keys of properties passing arguments to converter. They are popped by
+  # .. converter so that they will not be carried by the converted data set
+  FEATURE_CACHE_DIR = 'FEATURE_CACHE_DIR'
+  NUM_WORKERS = 'NUM_WORKERS'
+
   # Sampling rate is 16000 according to `https://catalog.ldc.upenn.edu/LDC93S1`
   SAMPLING_RATE = 16000
 
@@ -57,8 +85,18 @@ class TIMIT25(DataAgent):
 
   @classmethod
   def load(cls, data_dir, num_train_foreach, raw_data_dir='TIMIT25',
-           random=True, **kwargs):
+           random=True, num_workers=None, cache_features=True, **kwargs):
+    """Load TIMIT25 as (train_set, test_set)
+    :param num_workers: number of processes used for feature extraction,
+                        use all CPUs if not provided
+    :param cache_features: whether to cache features in
+                           `data_dir/feature_cache` so that they will not be
+                           computed again when the data set is rebuilt
+    """
     signal_set = cls.load_as_tframe_data(data_dir)
+    signal_set.properties[cls.NUM_WORKERS] = num_workers
+    signal_set.properties[cls.FEATURE_CACHE_DIR] = os.path.join(
+      data_dir, 'feature_cache') if cache_features else None
     signal_set = signal_set.as_sequence_set
     return signal_set.split(
       num_train_foreach, None, names=('train_set', 'test_set'),
@@ -144,25 +182,38 @@ class TIMIT25(DataAgent):
     pre_emp_coef = 0.97
     n_fft = int(cls.SAMPLING_RATE / 1000 * 25)
     hop_length = int(cls.SAMPLING_RATE / 1000 * 10)
-    features = []
-    for signal_ in signal_set.signals:
+    params = (cls.SAMPLING_RATE, pre_emp_coef, n_fft, hop_length)
+    cache_dir = signal_set.properties.pop(cls.FEATURE_CACHE_DIR, None)
+    num_workers = signal_set.properties.pop(cls.NUM_WORKERS, None)
+
+    # Look up cache, features are keyed by (signal content, parameters)
+    features, paths = [None] * len(signal_set.signals), []
+    for i, signal_ in enumerate(signal_set.signals):
       assert isinstance(signal_, Signal)
-      # Do pre-emphasis
-      signal_ = dsp.pre_emphasize(signal_, pre_emp_coef)
-      # Generate 12 channels using MFCC
-      mfcc12 = librosa.feature.mfcc(
-        signal_, sr=cls.SAMPLING_RATE, n_mfcc=12,
-        n_fft=n_fft, hop_length=hop_length)
-      # Transpose mfcc matrix to shape (length, 12)
-      mfcc12 = np.transpose(mfcc12)
-
-      # Calculate energy
-      energy = dsp.short_time_energy(signal_, n_fft, stride=hop_length)
-      energy = energy.reshape((-1, 1))
-      assert mfcc12.shape[0] == energy.shape[0]
-      feature = np.concatenate((mfcc12, energy), axis=1)
-      # Append to feature
-      features.append(feature)
+      if cache_dir is None: continue
+      paths.append(cls._get_cache_path(cache_dir, signal_, params))
+      if os.path.exists(paths[i]): features[i] = np.load(paths[i])
+    misses = [i for i, f in enumerate(features) if f is None]
+    if cache_dir is not None:
+      if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+      console.show_status('{} of {} features found in cache'.format(
+        len(features) - len(misses), len(features)))
+
+    # Extract missing features in parallel
+    if len(misses) > 0:
+      if num_workers is None: num_workers = os.cpu_count() or 1
+      num_workers = min(checker.check_positive_integer(num_workers),
+                        len(misses))
+      console.show_status('Extracting features with {} workers ...'.format(
+        num_workers))
+      args = [(np.asarray(signal_set.signals[i]),) + params for i in misses]
+      if num_workers == 1: results = [_extract_feature(a) for a in args]
+      else:
+        with mp.get_context('fork').Pool(num_workers) as pool:
+          results = pool.map(_extract_feature, args)
+      for i, feature in zip(misses, results):
+        features[i] = feature
+        if cache_dir is not None: cls._save_to_cache(paths[i], feature)
 
     # Calculate mean and variance for each channel
     stack = np.concatenate(features)
@@ -175,13 +226,31 @@ class TIMIT25(DataAgent):
     signal_set.features = features
     return signal_set
 
+  @staticmethod
+  def _get_cache_path(cache_dir, signal_, params):
+    signal_ = np.ascontiguousarray(signal_)
+    md5 = hashlib.md5(signal_.view(np.uint8))
+    md5.update(repr((signal_.dtype.str, signal_.shape, params)).encode())
+    return os.path.join(cache_dir, '{}.npy'.format(md5.hexdigest()))
+
+  @staticmethod
+  def _save_to_cache(path, feature):
+    # Write to a temporary file first so that a broken file will never be read
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, feature)
+    os.replace(tmp_path, path)
+
   @classmethod
   def preprocessor(cls, data_set, is_training):
     if not is_training: return data_set
     assert isinstance(data_set, SequenceSet)
     sigma = 0.6
-    for i, input_ in enumerate(data_set.features):
-      data_set.features[i] = input_ + np.random.randn(*input_.shape) * sigma
+    # Add noise to all sequences at once
+    features = data_set.features
+    stack = np.concatenate(features)
+    stack = stack + np.random.randn(*stack.shape) * sigma
+    indices = np.cumsum([len(input_) for input_ in features])[:-1]
+    data_set.features = np.split(stack, indices)
     return data_set
 
   @classmethod
@@ -205,3 +274,38 @@ class TIMIT25(DataAgent):
     trainer.model.agent.put_down_criterion('Error %', err)
     trainer.model.agent.take_notes(msg)
 
+
+if __name__ == '__main__':
+  import sys
+  import time
+  import shutil
+  import tempfile
+  import scipy.io.wavfile as wavfile
+
+  # Usage: python timit25.py [num_workers]
+  # Build TIMIT25 from a synthetic corpus cold (empty cache) and warm
+  num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+  data_dir = tempfile.mkdtemp()
+  try:
+    for word in clusters2list(TIMIT25.CLUSTERS):
+      path = os.path.join(data_dir, 'TIMIT25', word)
+      os.makedirs(path)
+      for i in range(7):
+        length = np.random.randint(8000, 16000)
+        wave = np.sin(np.arange(length) * np.random.rand() * 0.1)
+        wave = wave + np.random.randn(length) * 0.1
+        wavfile.write(os.path.join(path, '{}.wav'.format(i + 1)),
+                      TIMIT25.SAMPLING_RATE, (wave * 8000).astype(np.int16))
+
+    for name in ('cold', 'warm'):
+      # .tfds file is removed so that the data set is rebuilt each time
+      tfds_path = os.path.join(data_dir, TIMIT25.TFD_FILE_NAME)
+      if os.path.exists(tfds_path): os.remove(tfds_path)
+      tic = time.time()
+      data_sets = TIMIT25.load(data_dir, 5, num_workers=num_workers)
+      print('>> {}: {:.2f} secs'.format(name, time.time() - tic))
+      # Converter arguments must not be carried by the data sets
+      for data_set in data_sets:
+        assert TIMIT25.NUM_WORKERS not in data_set.properties
+        assert TIMIT25.FEATURE_CACHE_DIR not in data_set.properties
+  finally: shutil.rmtree(data_dir)
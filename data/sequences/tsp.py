@@ -3,6 +3,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+import functools
 import numpy as np
 from collections import OrderedDict
 
@@ -13,9 +14,7 @@ from tframe.data.sequences.seq_set import SequenceSet
 from tframe.data.perpetual_machine import PerpetualMachine
 
 
-def engine(number, N=3, T_or_interval=100, var_x=0.2, add_noise=False,
-           var_y=0.1):
-  # Check input
+def _get_length_range(N, T_or_interval):
   if isinstance(T_or_interval, int):
     L_min = T_or_interval
     L_max = int(np.round(L_min * 1.1))
@@ -23,7 +22,15 @@ def engine(number, N=3, T_or_interval=100, var_x=0.2, add_noise=False,
     checker.check_type(T_or_interval, int)
     L_min, L_max = T_or_interval
   checker.check_positive_integer(N)
-  assert number in (1, -1) and 0 < N <= L_min <= L_max
+  assert 0 < N <= L_min <= L_max
+  return L_min, L_max
+
+
+def engine(number, N=3, T_or_interval=100, var_x=0.2, add_noise=False,
+           var_y=0.1):
+  # Check input
+  L_min, L_max = _get_length_range(N, T_or_interval)
+  assert number in (1, -1)
   # Decide the length
   L = np.random.randint(L_min, L_max + 1)
   sequence = np.random.randn(L) * np.sqrt(var_x)
@@ -33,22 +40,45 @@ def engine(number, N=3, T_or_interval=100, var_x=0.2, add_noise=False,
   return sequence, np.array([target])
 
 
+def batch_engine(numbers, N=3, T_or_interval=100, var_x=0.2, add_noise=False,
+                 var_y=0.1):
+  """Vectorized version of `engine` generating len(numbers) sequences.
+     All sequences are drawn at once as views of a single array"""
+  # Check input
+  L_min, L_max = _get_length_range(N, T_or_interval)
+  numbers = np.asarray(numbers)
+  assert np.all(np.abs(numbers) == 1)
+  size = numbers.size
+  # Decide the lengths
+  lengths = np.random.randint(L_min, L_max + 1, size=size)
+  data = np.random.randn(np.sum(lengths)) * np.sqrt(var_x)
+  starts = np.cumsum(lengths) - lengths
+  data[(starts[:, None] + np.arange(N)).ravel()] = np.repeat(numbers, N)
+  targets = (numbers + 1.) / 2.
+  if add_noise:
+    targets = targets - (numbers * 0.2 - np.random.randn(size) * np.sqrt(var_y))
+  return np.split(data, starts[1:]), list(targets.reshape(size, 1))
+
+
 class TSP(DataAgent):
   """Two Sequence Problem"""
   DATA_NAME = 'TwoSequenceProblem'
 
   @classmethod
   def engine(cls, N, T, var_x, noisy, var_y):
-    def _engine(size):
-      return cls._get_one_data_set(size, N, T, var_x, noisy, var_y)
-    return _engine
+    # A partial of a class method is picklable and can thus be sent to
+    # .. process workers of PerpetualMachine
+    return functools.partial(cls._get_one_data_set, N=N, T=T, var_x=var_x,
+                             noisy=noisy, var_y=var_y)
 
   @classmethod
   def load(cls, data_dir, validate_size=512, test_size=2560, N=3, T=100,
-           var_x=0.2, add_noise=False, var_y=0.1, **kwargs):
+           var_x=0.2, add_noise=False, var_y=0.1, num_workers=0, seed=None,
+           backend=PerpetualMachine.THREAD, **kwargs):
     # Load train set
     train_set = PerpetualMachine(
-      'TSPPM', cls.engine(N, T, var_x, add_noise, var_y))
+      'TSPPM', cls.engine(N, T, var_x, add_noise, var_y),
+      num_workers=num_workers, seed=seed, backend=backend)
     # Load validation set and test set
     load_as_tfd = lambda size, prefix, vary=var_y: cls.load_as_tframe_data(
       data_dir, size, N=N, T=T, var_x=var_x, add_noise=add_noise,
@@ -76,12 +106,8 @@ class TSP(DataAgent):
 
   @classmethod
   def _get_one_data_set(cls, size, N, T, var_x, noisy, var_y):
-    features, targets = [], []
-    for _ in range(size):
-      number = np.random.choice([-1, 1])
-      x, y = engine(number, N, T, var_x, noisy, var_y)
-      features.append(x)
-      targets.append(y)
+    numbers = np.random.choice([-1, 1], size=size)
+    features, targets = batch_engine(numbers, N, T, var_x, noisy, var_y)
     # Wrap data into a SequenceSet
     data_set = SequenceSet(
       features, summ_dict={'targets': targets}, n_to_one=True,
@@ -186,5 +212,40 @@ class TSP(DataAgent):
 
 
 if __name__ == '__main__':
-  train_set, val_set, test_set = TSP.load('E:/tmp')
+  import time
+
+  # Throughput of the training stream (sequences/sec) for several lengths
+  def _get_one_data_set_loop(size, N, T, var_x, noisy, var_y):
+    features, targets = [], []
+    for _ in range(size):
+      x, y = engine(np.random.choice([-1, 1]), N, T, var_x, noisy, var_y)
+      features.append(x)
+      targets.append(y)
+    return SequenceSet(features, summ_dict={'targets': targets},
+                       n_to_one=True)
+
+  batch_size, rounds = 128, 50
+  print('>> {} CPUs'.format(os.cpu_count()))
+  for T in (100, 500, 1000):
+    for name, num_workers, backend in (
+        ('loop', None, None), ('vectorized', 0, PerpetualMachine.THREAD),
+        ('vectorized x 4 threads', 4, PerpetualMachine.THREAD),
+        ('vectorized x 4 processes', 4, PerpetualMachine.PROCESS)):
+      if num_workers is None:
+        gen_data_set = lambda: _get_one_data_set_loop(
+          batch_size, 3, T, 0.2, False, 0.1)
+      else:
+        pm = PerpetualMachine('TSPPM', TSP.engine(3, T, 0.2, False, 0.1),
+                              num_workers=num_workers, seed=0,
+                              backend=backend)
+        name += '' if pm.backend == backend else ' (as threads)'
+        data_sets = pm._gen_data_sets(batch_size)
+        gen_data_set = lambda: next(data_sets)
+      # Workers are warmed up by the first data set
+      gen_data_set()
+      tic = time.time()
+      for _ in range(rounds): gen_data_set()
+      print('>> T = {}, {}: {:.0f} sequences/sec'.format(
+        T, name, batch_size * rounds / (time.time() - tic)))
+      if num_workers: data_sets.close()
 
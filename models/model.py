@@ -90,6 +90,8 @@ class Model(object):
     self._optimizer = None
     self._built = False
     self._scheme = None
+    # (collection size, [(placeholder, getter, required), ...], status dicts)
+    self._feed_plan = None
 
     # Public attributes
     self.counter = None
@@ -149,6 +151,13 @@ class Model(object):
     assert isinstance(self._built, bool)
     return self._built
 
+  @property
+  def summary_due(self):
+    """Whether train step summaries should be evaluated in current step"""
+    if not hub.summary: return False
+    cycle = checker.check_positive_integer(hub.summary_cycle)
+    return self.counter is None or self.counter % cycle == 0
+
   @property
   def record(self):
     if not self.key_metric.activated: return None
@@ -225,6 +234,8 @@ class Model(object):
     if 'optimizer' not in kwargs: kwargs['optimizer'] = hub.get_optimizer()
     # Call successor's _build method
     self._build(**kwargs)
+    # Build etch ops before session is launched
+    if tfr.context.pruner is not None: tfr.context.pruner.build_etch_ops()
     # Initialize monitor
     self._init_monitor()
     # Set built flag
@@ -338,7 +349,8 @@ class Model(object):
   def update_model(self, data_batch, **kwargs):
     """Default model updating method, should be overrode"""
     feed_dict = self._get_default_feed_dict(data_batch, is_training=True)
-    return self._update_group.run(feed_dict)
+    # summary_cycle applies to train step summaries only
+    return self._update_group.run(feed_dict, allow_sum=self.summary_due)
 
   def get_data_batches(self, data_set, batch_size, num_steps=None,
                        shuffle=False, is_training=False):
@@ -483,13 +495,28 @@ class Model(object):
     tensor_slots = self.validate_group.tensor_slots
     quantity_defs = [s.quantity_definition for s in tensor_slots]
     fetches = [q.quantities for q in quantity_defs]
-    values = self.evaluate(
-      fetches, data_set, batch_size, verbose=verbose, num_steps=num_steps)
+    # Quantities with decomposable summ methods are aggregated batch by batch
+    # .. unless detail of each sequence should be shown
+    reducers = [None if seq_detail else q.new_running_summary()
+                for q in quantity_defs]
+    values = self.evaluate(fetches, data_set, batch_size, verbose=verbose,
+                           num_steps=num_steps, reducers=reducers)
+    # Quantities found not exactly reducible after the first batch are
+    # .. evaluated again and gathered
+    indices = [i for i, r in enumerate(reducers)
+               if r is not None and not r.exact]
+    if len(indices) > 0:
+      redo = self.evaluate([fetches[i] for i in indices], data_set,
+                           batch_size, verbose=verbose, num_steps=num_steps)
+      for i, val in zip(indices, redo): values[i], reducers[i] = val, None
     result_dict = OrderedDict()
 
-    for val, qd, slot in zip(values, quantity_defs, tensor_slots):
+    for val, qd, slot, r in zip(values, quantity_defs, tensor_slots, reducers):
       # Sanity check
       assert isinstance(qd, Quantity)
+      if r is not None:
+        result_dict[slot] = val
+        continue
       if self.input_type is InputTypes.BATCH:
         assert isinstance(val, np.ndarray) and len(val) > 0
       else:
@@ -594,10 +621,13 @@ class Model(object):
     self.agent.shutdown()
 
   def launch_model(self, overwrite=False):
-    return self.agent.launch_model(overwrite)
+    result = self.agent.launch_model(overwrite)
+    self._compile_feed_plan()
+    return result
 
   def evaluate(self, fetches, data, batch_size=None, postprocessor=None,
-               verbose=False, num_steps=None, suppress_n_to_one=False):
+               verbose=False, num_steps=None, suppress_n_to_one=False,
+               reducers=None):
     """
     Evaluate tensors based on data
     TODO: note that if num_steps != -1, outputs from a same sequence may be
@@ -613,6 +643,12 @@ class Model(object):
                        assigned accordingly. If assigned with a positive
                        integer, evaluation will be performed batch by batch.
     :param postprocessor: post-processor for outputs
+    :param reducers: a list of RunningSummary (or None) corresponding to
+                     fetches. Outputs of a fetch with a reducer are aggregated
+                     batch by batch and its summary will be returned instead.
+                     A reducer found not exact in the first batch is replaced
+                     by None in place and outputs are gathered. If found not
+                     exact afterwards, None is returned for its fetch
     :return: commonly a (list of) tf.Tensor(s), each of which has the
              same batch size with the provided data
     """
@@ -626,6 +662,8 @@ class Model(object):
 
     # Get outputs (sometimes fetches may contain operations which yields None)
     outputs = [[] for op in fetches if not isinstance(op, tf.Operation)]
+    if reducers is None: reducers = [None] * len(outputs)
+    assert len(reducers) == len(outputs)
 
     if verbose:
       bar = ProgressBar(data.get_round_length(batch_size, num_steps))
@@ -650,6 +688,13 @@ class Model(object):
       for i, batch_output in enumerate(batch_outputs):
         assert isinstance(outputs[i], list)
         output_is_a_batch = fetches[i].shape.as_list()[0] is None
+        reducer = reducers[i]
+        if reducer is not None:
+          if self.input_type is InputTypes.RNN_BATCH and output_is_a_batch:
+            for s in batch_output: reducer.update(s)
+          else: reducer.update(batch_output)
+          if reducer.exact or cursor > 0: continue
+          reducers[i] = None
         if self.input_type is InputTypes.RNN_BATCH and output_is_a_batch:
           # batch_output is [s1_1, s1_2, ..., s1_N]
           assert isinstance(batch_output, list)
@@ -663,7 +708,11 @@ class Model(object):
 
     # Merge outputs if necessary
     if self.input_type is InputTypes.BATCH:
-      outputs = [np.concatenate(array_list, axis=0) for array_list in outputs]
+      outputs = [np.concatenate(array_list, axis=0) if r is None else None
+                 for array_list, r in zip(outputs, reducers)]
+    # Replace reduced outputs with their summaries
+    outputs = [o if r is None else r.result if r.exact else None
+               for o, r in zip(outputs, reducers)]
 
     # Post-proceed and return
     if postprocessor is not None:
@@ -683,26 +732,44 @@ class Model(object):
 
   @with_graph
   def _get_default_feed_dict(self, batch, is_training):
+    collection = self.graph.get_collection_ref(pedia.default_feed_dict)
+    if self._feed_plan is None or self._feed_plan[0] != len(collection):
+      self._compile_feed_plan()
+    _, plan, status_feed_dicts = self._feed_plan
+
     feed_dict = {}
-    for tensor in tf.get_collection(pedia.default_feed_dict):
+    for tensor, get_value, required in plan:
+      val = get_value(batch)
+      if required or val is not None: feed_dict[tensor] = val
+
+    feed_dict.update(status_feed_dicts[is_training])
+
+    return feed_dict
+
+  def _compile_feed_plan(self):
+    """Resolve which field of a batch each placeholder in default feed dict
+       collection should be fed with. The plan is compiled when model is
+       launched and recompiled only when the collection changes"""
+    collection = self.graph.get_collection_ref(pedia.default_feed_dict)
+    plan = []
+    for tensor in collection:
       if 'input' in tensor.name.lower():
-        feed_dict[tensor] = batch[pedia.features]
+        plan.append((tensor, lambda b: b[pedia.features], True))
       elif tensor.name.lower() in ('target', 'targets'):
       # elif 'target' in tensor.name:
         # TODO: when predict without outputting loss ...
-        if batch.targets is not None: feed_dict[tensor] = batch.targets
+        plan.append((tensor, lambda b: b.targets, False))
       elif pedia.gather_indices in tensor.name:
         # TODO: when  batch.size is 1, gather_indices is not necessary
         #       However, Quantity will never know the exact batch size
-        feed_dict[tensor] = batch.gather_indices
+        plan.append((tensor, lambda b: b.gather_indices, True))
       else:
         name = tensor.name.split('/')[-1].split(':')[0]
-        val = batch.data_dict.get(name, None)
-        if val is not None: feed_dict[tensor] = val
-
-    feed_dict.update(self.agent.get_status_feed_dict(is_training))
-
-    return feed_dict
+        plan.append(
+          (tensor, lambda b, key=name: b.data_dict.get(key, None), False))
+    status_feed_dicts = {
+      flag: self.agent.get_status_feed_dict(flag) for flag in (True, False)}
+    self._feed_plan = (len(collection), plan, status_feed_dicts)
 
   def _sanity_check_before_use(self, data):
     # Make sure data is legal
@@ -14,7 +14,7 @@ from tframe.nets import RNet
 from tframe.layers import Input
 
 from tframe.core.decorators import with_graph
-from tframe.core import NestedTensorSlot
+from tframe.core import NestedTensorSlot, OperationSlot
 
 from tframe.utils.misc import transpose_tensor
 from tframe.utils.misc import ravel_nested_stuff
@@ -34,6 +34,7 @@ class Recurrent(Model, RNet):
     self._default_net = self
     # Attributes
     self._state_slot = NestedTensorSlot(self, 'State')
+    self._update_state_slot = OperationSlot(self, 'UpdateState')
     # mascot will be initiated as a placeholder with no shape specified
     # .. and will be put into initializer argument of tf.scan
     self._mascot = None
@@ -141,7 +142,11 @@ class Recurrent(Model, RNet):
 
     # Plug last state to corresponding slot
     self._state_slot.plug(last_state)
-    self._update_group.add(self._state_slot)
+    if hub.state_on_device:
+      # State buffers are updated on device within the train step
+      self._update_state_slot.plug(self._build_state_ops(last_state))
+      self._update_group.add(self._update_state_slot)
+    else: self._update_group.add(self._state_slot)
 
     # TODO: BETA
     if hub.use_rtrl: self._update_group.add(self.grad_buffer_slot)
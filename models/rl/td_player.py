@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import copy
 import numpy as np
 import time
 import tensorflow as tf
@@ -10,8 +11,8 @@ from tframe.models.feedforward import Feedforward
 
 from tframe import console
 from tframe import pedia
-from tframe import FLAGS
-from tframe import with_graph
+from tframe import hub
+from tframe.core.decorators import with_graph
 
 from tframe.models.rl.interfaces import FMDPAgent
 from tframe.models.rl.interfaces import Player
@@ -25,8 +26,14 @@ class TDPlayer(Feedforward, Player):
     Feedforward.__init__(self, mark)
     self._next_value = None
     self._update_op = None
+    self._merged_summary = None
+    # For batched updates over episodes
+    self._episode_ids = None
+    self._batch_update_op = None
+    self._batch_summary = None
 
     self._opponent = None
+    self._snapshot_function = None
 
   # region : Properties
 
@@ -39,17 +46,18 @@ class TDPlayer(Feedforward, Player):
   # region : Build
 
   @with_graph
-  def _build(self, lamda=0.5, learning_rate=0.01):
+  def _build(self, lamda=0.5, learning_rate=0.01, **kwargs):
     Feedforward._build(self)
+    outputs = self.outputs.tensor
     # Initialize target placeholder
     self._next_value = tf.placeholder(
-      self._outputs.dtype, self._outputs.get_shape(), name='next_value')
+      outputs.dtype, outputs.get_shape(), name='next_value')
 
     # Define loss
     with tf.name_scope('Loss'):
-      delta = tf.reduce_sum(self._next_value - self._outputs, name='delta')
-      self._loss = 0.5 * tf.square(delta)
-      tf.summary.scalar('loss_sum', self._loss)
+      delta = tf.reduce_sum(self._next_value - outputs, name='delta')
+      self._loss.plug(0.5 * tf.square(delta))
+      tf.summary.scalar('loss_sum', self._loss.op)
 
     # Define update op
     update_op = []
@@ -57,7 +65,7 @@ class TDPlayer(Feedforward, Player):
       # Define gradient
       with tf.name_scope('Gradients'):
         vars = tf.trainable_variables()
-        grads = tf.gradients(self._outputs, vars)
+        grads = tf.gradients(outputs, vars)
       # Update model with eligibility traces
       for var, grad in zip(vars, grads):
         with tf.variable_scope('trace'):
@@ -72,11 +80,45 @@ class TDPlayer(Feedforward, Player):
       # Group ops into a single op
       self._update_op = tf.group(*update_op, name='train')
 
-    # Print status and model structure
-    self._show_building_info(FeedforwardNet=self)
+    # Define batched update op
+    with tf.variable_scope('Batch_Update_Ops'):
+      self._batch_update_op = self._define_batch_update_op(
+        vars, lamda, learning_rate)
+
+    self._merged_summary = tf.summary.merge_all()
 
     # Launch session
-    self.launch_model(FLAGS.overwrite and FLAGS.train)
+    self.launch_model(hub.overwrite and hub.train)
+
+  def _define_batch_update_op(self, vars, lamda, learning_rate):
+    """Offline TD(lambda) over a batch of episodes. States of all episodes
+       are stacked along the batch axis and `episode_ids` tells which
+       episode each state belongs to. The accumulated update
+         sum_t delta_t * sum_{k<=t} lambda^(t-k) * grad V(s_k)
+       is rearranged as sum_k c_k * grad V(s_k) with
+         c_k = delta_k + lambda * c_{k+1}  (c_{k+1} = 0 across episodes)
+       which is calculated by a reverse scan in O(T), so that the update can
+       be applied by a single backward pass.
+    """
+    outputs = self.outputs.tensor
+    self._episode_ids = tf.placeholder(tf.int32, [None], name='episode_ids')
+    delta = tf.reshape(self._next_value - outputs, [-1])
+    # Whether state k+1 belongs to the same episode as state k
+    ids = self._episode_ids
+    continued = tf.concat([tf.cast(tf.equal(ids[:-1], ids[1:]), delta.dtype),
+                           tf.zeros([1], delta.dtype)], axis=0)
+    coefs = tf.scan(lambda c, x: x[0] + lamda * x[1] * c, (delta, continued),
+                    initializer=tf.zeros([], delta.dtype), reverse=True)
+    coefs = tf.stop_gradient(coefs)
+    # Summary of squared TD errors over the batch, written by _update_episodes
+    self._batch_summary = tf.summary.scalar(
+      'batch_loss_sum', 0.5 * tf.reduce_sum(tf.square(delta)),
+      collections=[pedia.invisible])
+    # Gradients weighted by coefs
+    grads = tf.gradients(outputs, vars,
+                         grad_ys=tf.reshape(coefs, tf.shape(outputs)))
+    return tf.group(*[var.assign_add(learning_rate * grad)
+                      for var, grad in zip(vars, grads)], name='batch_train')
 
   # endregion : Build
 
@@ -84,7 +126,16 @@ class TDPlayer(Feedforward, Player):
 
   def train(self, agent, episodes=500, print_cycle=0, snapshot_cycle=0,
              match_cycle=0, rounds=100, rate_thresh=1.0, shadow=None,
-             save_cycle=100, snapshot_function=None):
+             save_cycle=100, snapshot_function=None, replay_episodes=0,
+             parallel_games=1):
+    """Train player by self-play
+    :param replay_episodes: if positive, TD(lambda) updates are accumulated
+                            over this number of episodes and applied in a
+                            single run. Otherwise model is updated after
+                            each move
+    :param parallel_games: number of games played in lock-step in batched
+                           mode so that their forward passes are stacked
+    """
     # Validate agent
     if not isinstance(agent, FMDPAgent):
       raise TypeError('Agent should be a FMDP-agent')
@@ -95,23 +146,13 @@ class TDPlayer(Feedforward, Player):
         raise ValueError('snapshot_function must be callable')
       self._snapshot_function = snapshot_function
 
-    print_cycle = FLAGS.print_cycle if FLAGS.print_cycle >= 0 else print_cycle
-    snapshot_cycle = (FLAGS.snapshot_cycle if FLAGS.snapshot_cycle >= 0
-                      else snapshot_cycle)
-    match_cycle = FLAGS.match_cycle if FLAGS.match_cycle >= 0 else match_cycle
 
     # Show configurations
     console.show_status('Configurations:')
     console.supplement('episodes: {}'.format(episodes))
 
     # Do some preparation
-    if self._session is None:
-      self.launch_model()
-
-    assert isinstance(self._graph, tf.Graph)
-    with self._graph.as_default():
-      if self._merged_summary is None:
-        self._merged_summary = tf.summary.merge_all()
+    if not self.launched: self.launch_model()
 
     # Set opponent
     if match_cycle > 0:
@@ -127,17 +168,31 @@ class TDPlayer(Feedforward, Player):
     # Begin training iteration
     assert isinstance(agent, FMDPAgent)
     console.section('Begin episodes')
+    # In batched mode agent may be in the middle of a game when matches begin
+    match_agent = copy.deepcopy(agent) if replay_episodes > 0 else agent
+    end_episode = lambda epi, start_time, steps: self._end_episode(
+      match_agent, epi, start_time, steps, episodes, print_cycle,
+      snapshot_cycle, match_cycle, rounds, rate_thresh, save_cycle)
+    if replay_episodes > 0:
+      self._train_batched(agent, episodes, replay_episodes, parallel_games,
+                          end_episode)
+    else: self._train_sequential(agent, episodes, end_episode)
+
+    # End training
+    console.clear_line()
+    if hub.summary: self.agent.summary_writer.flush()
+    self.shutdown()
+
+  def _train_sequential(self, agent, episodes, end_episode):
+    summary = None
     for epi in range(1, episodes + 1):
       # Initialize variable
-      agent.restart()
-      if hasattr(agent, 'default_first_move'):
-        agent.default_first_move()
+      self._restart(agent)
       # Record episode start time
       start_time = time.time()
       steps = 0
 
       state = agent.state
-      summary = None
       # Begin current episode
       while not agent.terminated:
         # Make a move
@@ -146,33 +201,82 @@ class TDPlayer(Feedforward, Player):
         # Update model
         state = np.reshape(state, (1,) + state.shape)
         next_value = np.reshape(np.array(next_value), (1, 1))
-        feed_dict = {self.input_[0]: state, self._next_value: next_value}
-        feed_dict.update(self._get_status_feed_dict(is_training=True))
-        assert isinstance(self._session, tf.Session)
-        summary, _ = self._session.run(
+        feed_dict = {self.input_tensor: state, self._next_value: next_value}
+        feed_dict.update(self.agent.get_status_feed_dict(is_training=True))
+        summary, _ = self.session.run(
           [self._merged_summary, self._update_op], feed_dict)
 
         state = agent.state
 
       # End of current episode
-      self.counter += 1
-
-      assert isinstance(self._summary_writer, tf.summary.FileWriter)
-      self._summary_writer.add_summary(summary, self.counter)
-
-      if print_cycle > 0 and np.mod(self.counter, print_cycle) == 0:
-        self._print_progress(epi, start_time, steps, total=episodes)
-      if snapshot_cycle > 0 and np.mod(self.counter, snapshot_cycle) == 0:
-        self._snapshot(epi / episodes)
-      if match_cycle > 0 and np.mod(self.counter, match_cycle) == 0:
-        self._training_match(agent, rounds, epi / episodes, rate_thresh)
-      if np.mod(self.counter, save_cycle) == 0:
-        self._save(self.counter)
-
-    # End training
-    console.clear_line()
-    self._summary_writer.flush()
-    self.shutdown()
+      self.agent.write_summary(summary, self.counter + 1)
+      end_episode(epi, start_time, steps)
+
+  def _train_batched(self, agent, episodes, replay_episodes, parallel_games,
+                     end_episode):
+    """Play games in lock-step and update model every `replay_episodes`
+       finished episodes"""
+    # Each game holds (agent, states, next_values, start_time)
+    agents = [agent] + [copy.deepcopy(agent)
+                        for _ in range(parallel_games - 1)]
+    games, buffer, started, finished = [], [], 0, 0
+    while finished < episodes:
+      # Start new games if possible
+      for a in agents:
+        if started == episodes or any([g[0] is a for g in games]): continue
+        self._restart(a)
+        games.append((a, [], [], time.time()))
+        started += 1
+      # Make a move in all games with a single forward pass
+      states = [np.array(a.state) for a, _, _, _ in games]
+      next_values = self.next_steps([a for a, _, _, _ in games])
+      for (a, s_list, v_list, _), s, v in zip(games, states, next_values):
+        s_list.append(s)
+        v_list.append(v)
+      # Collect finished games
+      for game in [g for g in games if g[0].terminated]:
+        games.remove(game)
+        buffer.append(game[1:3])
+        finished += 1
+        if len(buffer) == replay_episodes or finished == episodes:
+          self._update_episodes(buffer)
+          buffer = []
+        end_episode(finished, game[3], len(game[1]))
+
+  def _update_episodes(self, episodes):
+    """Apply TD(lambda) updates accumulated over a list of
+       (states, next_values) episodes in a single run"""
+    states = np.stack([s for states, _ in episodes for s in states])
+    next_values = np.reshape(np.array(
+      [v for _, values in episodes for v in values]), (-1, 1))
+    episode_ids = np.concatenate([
+      np.full(len(states), i) for i, (states, _) in enumerate(episodes)])
+    feed_dict = {self.input_tensor: states, self._next_value: next_values,
+                 self._episode_ids: episode_ids}
+    feed_dict.update(self.agent.get_status_feed_dict(is_training=True))
+    summary, _ = self.session.run(
+      [self._batch_summary, self._batch_update_op], feed_dict)
+    self.agent.write_summary(summary, self.counter + len(episodes))
+
+  @staticmethod
+  def _restart(agent):
+    agent.restart()
+    if hasattr(agent, 'default_first_move'):
+      agent.default_first_move()
+
+  def _end_episode(self, agent, epi, start_time, steps, episodes, print_cycle,
+                   snapshot_cycle, match_cycle, rounds, rate_thresh,
+                   save_cycle):
+    self.counter += 1
+
+    if print_cycle > 0 and np.mod(self.counter, print_cycle) == 0:
+      self._print_progress(epi, start_time, steps, total=episodes)
+    if snapshot_cycle > 0 and np.mod(self.counter, snapshot_cycle) == 0:
+      self._snapshot(epi / episodes)
+    if match_cycle > 0 and np.mod(self.counter, match_cycle) == 0:
+      self._training_match(agent, rounds, epi / episodes, rate_thresh)
+    if save_cycle > 0 and np.mod(self.counter, save_cycle) == 0:
+      self.agent.save_model()
 
   def _print_progress(self, epi, start_time, steps, **kwargs):
     """Use a awkward way to avoid IDE warning :("""
@@ -187,7 +291,7 @@ class TDPlayer(Feedforward, Player):
       return
 
     filename = 'train_{}_episode'.format(self.counter)
-    fullname = "{}/{}".format(self.snapshot_dir, filename)
+    fullname = "{}/{}".format(self.agent.snapshot_dir, filename)
     self._snapshot_function(fullname)
 
     console.clear_line()
@@ -205,7 +309,7 @@ class TDPlayer(Feedforward, Player):
     rate = self.compete(agent, rounds, self._opponent, title=title)
     if rate >= rate_thresh and isinstance(self._opponent, TDPlayer):
       # Find an stronger opponent
-      self._opponent._load()
+      _, self._opponent.counter, _ = self._opponent.agent.load()
       self._opponent.player_name = 'Shadow_{}'.format(self._opponent.counter)
       console.show_status('Opponent updated')
 
@@ -232,16 +336,29 @@ class TDPlayer(Feedforward, Player):
     reward = agent.act(action_index)
     return reward if agent.terminated else values[action_index]
 
+  def next_steps(self, agents):
+    """Make a move in each agent with candidate states of all agents
+       estimated in a single run"""
+    candidates = [agent.candidate_states for agent in agents]
+    values = self.estimate(np.concatenate(candidates))
+    values = np.split(values, np.cumsum([len(c) for c in candidates])[:-1])
+    next_values = []
+    for agent, v in zip(agents, values):
+      assert isinstance(agent, FMDPAgent)
+      action_index = agent.action_index(v)
+      reward = agent.act(action_index)
+      next_values.append(reward if agent.terminated else v[action_index])
+    return next_values
+
   def estimate(self, states):
-    if self._outputs is None:
+    if not self.outputs.activated:
       raise ValueError('Model not built yet')
-    if self._session is None:
-      self.launch_model(overwrite=False)
+    if not self.launched: self.launch_model(overwrite=False)
 
-    feed_dict = {self.input_[0]: states}
-    feed_dict.update(self._get_status_feed_dict(False))
+    feed_dict = {self.input_tensor: states}
+    feed_dict.update(self.agent.get_status_feed_dict(False))
 
-    outputs = self._session.run(self._outputs, feed_dict)
+    outputs = self.session.run(self.outputs.tensor, feed_dict)
 
     return outputs
 
@@ -252,3 +369,60 @@ class TDPlayer(Feedforward, Player):
   # endregion : Private Methods
 
   '''For some reason, do not remove this line'''
+
+
+if __name__ == '__main__':
+  from tframe.layers import Input, Linear
+
+  class RandomWalk(FMDPAgent):
+    """Random walk in Sutton (1988) with n non-terminal states. Reward is 1
+       if the walk ends on the right and 0 otherwise"""
+    def __init__(self, n=5):
+      self.n = n
+      self.position = None
+      self.restart()
+
+    def _encode(self, position):
+      state = np.zeros(self.n)
+      if 0 < position <= self.n: state[position - 1] = 1.0
+      return state
+
+    @property
+    def state(self): return self._encode(self.position)
+
+    @property
+    def candidate_states(self):
+      return np.stack([self._encode(self.position + d) for d in (-1, 1)])
+
+    @property
+    def terminated(self): return self.position in (0, self.n + 1)
+
+    def restart(self): self.position = (self.n + 1) // 2
+
+    def action_index(self, values): return np.random.randint(2)
+
+    def act(self, action):
+      self.position += 2 * action - 1
+      return float(self.position == self.n + 1)
+
+  # Time per episode and learning curve (RMS error of state values) of
+  # .. sequential and batched TD(lambda) on the 5-state random walk
+  true_values = np.arange(1, 6) / 6.
+  hub.save_model, hub.overwrite, hub.summary = False, True, False
+  for replay_episodes, parallel_games in ((0, 1), (10, 10)):
+    np.random.seed(0)
+    player = TDPlayer(mark='td_random_walk')
+    player.add(Input(sample_shape=[5]))
+    player.add(Linear(output_dim=1))
+    player.build(optimizer=None, lamda=0.8, learning_rate=0.02)
+    errors = []
+    rms = lambda: np.sqrt(np.mean(np.square(
+      player.estimate(np.eye(5)).flatten() - true_values)))
+    tic = time.time()
+    player.train(RandomWalk(), episodes=1000, snapshot_cycle=100,
+                 save_cycle=0, snapshot_function=lambda _: errors.append(rms()),
+                 replay_episodes=replay_episodes, parallel_games=parallel_games)
+    print('>> replay = {}, parallel = {}: {:.2f} ms per episode'.format(
+      replay_episodes, parallel_games, (time.time() - tic)))
+    print('.. RMS error every 100 episodes: {}'.format(
+      ', '.join(['{:.3f}'.format(e) for e in errors])))
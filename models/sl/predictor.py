@@ -190,8 +190,9 @@ class Predictor(Feedforward, Recurrent):
       return Feedforward.update_model(self, data_batch, **kwargs)
     # Update recurrent model
     feed_dict = self._get_default_feed_dict(data_batch, is_training=True)
-    results = self._update_group.run(feed_dict)
-    self.set_buffers(results.pop(self._state_slot), is_training=True)
+    results = self._update_group.run(feed_dict, allow_sum=self.summary_due)
+    if not hub.state_on_device:
+      self.set_buffers(results.pop(self._state_slot), is_training=True)
 
     # TODO: BETA
     assert not hub.use_rtrl
@@ -223,7 +224,8 @@ class Predictor(Feedforward, Recurrent):
     if dynamic:
       from tframe.trainers.eval_tools.dynamic_eval import DynamicEvaluator as de
       de.dynamic_evaluate(
-        self, data, kwargs.get('val_set', None), kwargs.get('delay', None))
+        self, data, kwargs.get('val_set', None), kwargs.get('delay', None),
+        kwargs.get('model_builder', None))
       return
     # If hub.val_progress_bar is True, this message will be showed in
     #   model.evaluate method
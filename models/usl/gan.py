@@ -67,6 +67,8 @@ class GAN(Model):
     self._loss_Dr, self._loss_Df = None, None
     self._train_step_G, self._train_step_D = None, None
     self._merged_summary_G, self._merged_summary_D = None, None
+    # Fused D/G step, see _define_fused_train_step
+    self._z_G, self._loss_G_fused, self._train_step_fused = None, None, None
 
   # region : Properties
 
@@ -92,13 +94,15 @@ class GAN(Model):
 
   @with_graph
   def _build(self, loss='cross_entropy', G_optimizer=None, D_optimizer=None,
-             smooth_factor=0.9):
+             smooth_factor=0.9, fuse_steps=False):
     """
     Build model
     :param loss: either a string or a function with:
                   (1) params: an instance of GAN
                   (2) return: G_loss, D_loss
     :param optimizer: a tensorflow optimizer
+    :param fuse_steps: whether to define a train step running the last D
+                       step and the G step in a single session run
     """
 
     if self._conditional:
@@ -110,19 +114,22 @@ class GAN(Model):
       self.D.children[0].children.insert(0, merge.Concatenate(
         companions={self._targets: 1}))
 
-    # Link G and D to produce _G and _D
-    self._G = self.Generator()
-    # :: Check shape
-    g_shape = self._G.get_shape().as_list()[1:]
-    d_shape = self.D.input_[0].get_shape()[1:]
-    if g_shape != d_shape:
-      raise ValueError('Output shape of generator {} does not match the input '
-                        'shape of discriminator {}'.format(g_shape, d_shape))
-
-    self._Dr, self._logits_Dr = (self.Discriminator(),
-                                 self.Discriminator.logits_tensor)
-    self._Df, self._logits_Df = (self.Discriminator(self._G),
-                                 self.Discriminator.logits_tensor)
+    # Link G and D to produce _G and _D. If steps are to be fused, variables
+    # .. are created as resource variables, see _define_fused_train_step
+    scope = tf.get_variable_scope()
+    with tf.variable_scope(scope, use_resource=True if fuse_steps else None):
+      self._G = self.Generator()
+      # :: Check shape
+      g_shape = self._G.get_shape().as_list()[1:]
+      d_shape = self.D.input_[0].get_shape()[1:]
+      if g_shape != d_shape: raise ValueError(
+        'Output shape of generator {} does not match the input shape of '
+        'discriminator {}'.format(g_shape, d_shape))
+
+      self._Dr, self._logits_Dr = (self.Discriminator(),
+                                   self.Discriminator.logits_tensor)
+      self._Df, self._logits_Df = (self.Discriminator(self._G),
+                                   self.Discriminator.logits_tensor)
 
     # Define output tensor
     if self._output_shape is None:
@@ -154,6 +161,11 @@ class GAN(Model):
     # Add summaries
     self._add_summaries()
 
+    # Define fused train step
+    if fuse_steps:
+      with tf.name_scope('Fused_Train_Step'):
+        self._define_fused_train_step(loss, smooth_factor, G_optimizer)
+
     # Print status and model structure
     self._show_building_info(Generator=self.G, Discriminator=self.D)
 
@@ -171,23 +183,19 @@ class GAN(Model):
       raise TypeError('loss must be callable or a string')
 
     loss = loss.lower()
-    loss_Dr_raw, loss_Df_raw, loss_G_raw = None, None, None
+    loss_Dr_raw, loss_Df_raw = None, None
     if loss == pedia.default:
       loss_Dr_raw = -tf.log(self._Dr, name='loss_D_real_raw')
       loss_Df_raw = -tf.log(1. - self._Df, name='loss_D_fake_raw')
-      loss_G_raw = -tf.log(self._Df, name='loss_G_raw')
     elif loss == pedia.cross_entropy:
       loss_Dr_raw = tf.nn.sigmoid_cross_entropy_with_logits(
         logits=self._logits_Dr, labels=tf.ones_like(self._logits_Dr) * alpha)
       loss_Df_raw = tf.nn.sigmoid_cross_entropy_with_logits(
         logits=self._logits_Df, labels=tf.zeros_like(self._logits_Df))
-      loss_G_raw = tf.nn.sigmoid_cross_entropy_with_logits(
-        logits=self._logits_Df, labels=tf.ones_like(self._logits_Df))
     else:
       raise ValueError('Can not resolve "{}"'.format(loss))
 
     reg_loss_D = self.D.regularization_loss
-    reg_loss_G = self.G.regularization_loss
     with tf.name_scope('D_losses'):
       self._loss_Dr = tf.reduce_mean(loss_Dr_raw, name='loss_D_real')
       self._loss_Df = tf.reduce_mean(loss_Df_raw, name='loss_D_fake')
@@ -195,9 +203,40 @@ class GAN(Model):
       self._loss_D = (self._loss_D if reg_loss_D is None
                       else self._loss_D + reg_loss_D)
     with tf.name_scope('G_loss'):
-      self._loss_G = tf.reduce_mean(loss_G_raw, name='loss_G')
-      self._loss_G = (self._loss_G if reg_loss_G is None
-                      else self._loss_G + reg_loss_G)
+      self._loss_G = self._get_loss_G(loss, self._Df, self._logits_Df)
+
+  def _get_loss_G(self, loss, Df, logits_Df):
+    if loss == pedia.default:
+      loss_G_raw = -tf.log(Df, name='loss_G_raw')
+    else:
+      assert loss == pedia.cross_entropy
+      loss_G_raw = tf.nn.sigmoid_cross_entropy_with_logits(
+        logits=logits_Df, labels=tf.ones_like(logits_Df))
+    loss_G = tf.reduce_mean(loss_G_raw, name='loss_G')
+    reg_loss_G = self.G.regularization_loss
+    return loss_G if reg_loss_G is None else loss_G + reg_loss_G
+
+  def _define_fused_train_step(self, loss, alpha, G_optimizer):
+    """Define a train step which updates D and then G in one session run.
+       Since the forward pass of D(G(z)) is shared with D step, G and D are
+       linked again on a separate z placeholder under the control dependency
+       of D step. A reference variable is read through a snapshot created
+       along with the variable, which is not ordered by this dependency.
+       Resource variables are read where they are used instead, thus G step
+       sees the updated D as it does in separate runs.
+    """
+    assert all([v.op.type == 'VarHandleOp' for v in self._theta_D])
+    if not isinstance(loss, six.string_types): raise TypeError(
+      '!! Steps can be fused only when loss is specified by a string')
+    self._z_G = tf.placeholder(
+      self.G.input_tensor.dtype, self.G.input_tensor.get_shape(), name='z_G')
+    with tf.control_dependencies([self._train_step_D]):
+      G = self.Generator(self._z_G)
+      Df = self.Discriminator(G)
+      logits_Df = self.Discriminator.logits_tensor
+      self._loss_G_fused = self._get_loss_G(loss.lower(), Df, logits_Df)
+      self._train_step_fused = G_optimizer.minimize(
+        loss=self._loss_G_fused, var_list=self._theta_G)
 
   def _add_summaries(self):
     # Get activation summaries
@@ -257,7 +296,11 @@ class GAN(Model):
     sample_num = features.shape[0]
 
     loss_D, loss_G = None, None
-    summaries_D, summaries_G = None, None
+    results_D, results_G = None, None
+    # Summaries are evaluated in separate runs only when necessary
+    summarize = self.summary_due
+    fuse = all([self._train_step_fused is not None, not summarize,
+                D_iterations > 0, G_iterations > 0])
 
     assert isinstance(self._session, tf.Session)
     # Update discriminator
@@ -267,26 +310,38 @@ class GAN(Model):
     if self._conditional:
       feed_dict_D[self._targets] = data_batch[pedia.targets]
 
-    for _ in range(D_iterations):
-      _, loss_D, summaries_D = self._session.run(
-        [self._train_step_D, self._loss_D, self._merged_sum_D],
-        feed_dict=feed_dict_D)
+    fetches_D = [self._train_step_D, self._loss_D]
+    if summarize: fetches_D.append(self._merged_sum_D)
+    # The last D step will be run along with the first G step if fused
+    for _ in range(D_iterations - 1 if fuse else D_iterations):
+      results_D = self._session.run(fetches_D, feed_dict=feed_dict_D)
+      loss_D = results_D[1]
 
     # Update generator
-    feed_dict_G = {self.G.input_tensor: self._random_z(sample_num)}
+    z_G = self._random_z(sample_num)
+    feed_dict_G = {self.G.input_tensor: z_G}
     feed_dict_G.update(self._get_status_feed_dict(is_training=True))
     if self._conditional:
       feed_dict_G[self._targets] = data_batch[pedia.targets]
 
-    for _ in range(G_iterations):
-      _, loss_G, summaries_G = self._session.run(
-        [self._train_step_G, self._loss_G, self._merged_sum_G],
-        feed_dict=feed_dict_G)
+    if fuse:
+      feed_dict_D[self._z_G] = z_G
+      _, loss_D, loss_G = self._session.run(
+        [self._train_step_fused, self._loss_D, self._loss_G_fused],
+        feed_dict=feed_dict_D)
+    fetches_G = [self._train_step_G, self._loss_G]
+    if summarize: fetches_G.append(self._merged_sum_G)
+    for _ in range(G_iterations - 1 if fuse else G_iterations):
+      results_G = self._session.run(fetches_G, feed_dict=feed_dict_G)
+      loss_G = results_G[1]
 
     # Write summaries to file
-    assert isinstance(self._summary_writer, tf.summary.FileWriter)
-    self._summary_writer.add_summary(summaries_D, self.counter)
-    self._summary_writer.add_summary(summaries_G, self.counter)
+    if summarize:
+      assert isinstance(self._summary_writer, tf.summary.FileWriter)
+      # D or G may not be updated in this step
+      for results in (results_D, results_G):
+        if results is None: continue
+        self._summary_writer.add_summary(results[2], self.counter)
 
     # Return loss dict
     return {'Discriminator loss': loss_D, 'Generator loss': loss_G}
@@ -433,8 +488,68 @@ class GAN(Model):
   """Don't remove this line"""
 
 
-
-
-
-
-
+if __name__ == '__main__':
+  import time
+
+  # Fused vs separate D/G steps on a small MLP GAN under fixed seeds. The
+  # .. graph mirrors GAN._build with fuse_steps=True
+  def mlp(x, name, dims):
+    with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
+      for i, dim in enumerate(dims):
+        w = tf.get_variable('w{}'.format(i), [x.shape[1], dim])
+        b = tf.get_variable('b{}'.format(i), [dim],
+                            initializer=tf.zeros_initializer())
+        x = tf.matmul(x, w) + b
+        if i < len(dims) - 1: x = tf.nn.relu(x)
+    return x
+
+  def cross_entropy(logits, label):
+    return tf.reduce_mean(tf.nn.sigmoid_cross_entropy_with_logits(
+      logits=logits, labels=tf.ones_like(logits) * label))
+
+  def train(fuse, steps=1000, batch_size=128, z_dim=64, x_dim=784):
+    tf.reset_default_graph()
+    tf.set_random_seed(0)
+    rng = np.random.RandomState(0)
+    x = tf.placeholder(tf.float32, [None, x_dim])
+    z = tf.placeholder(tf.float32, [None, z_dim])
+    G = lambda z: tf.nn.tanh(mlp(z, 'G', [256, x_dim]))
+    D = lambda x: mlp(x, 'D', [256, 1])
+    with tf.variable_scope(tf.get_variable_scope(), use_resource=True):
+      logits_Dr, logits_Df = D(x), D(G(z))
+    loss_D = cross_entropy(logits_Dr, 0.9) + cross_entropy(logits_Df, 0.)
+    loss_G = cross_entropy(logits_Df, 1.)
+    theta = lambda name: tf.trainable_variables(name)
+    step_D = tf.train.AdamOptimizer().minimize(loss_D, var_list=theta('D'))
+    G_optimizer = tf.train.AdamOptimizer()
+    step_G = G_optimizer.minimize(loss_G, var_list=theta('G'))
+    if fuse:
+      z_G = tf.placeholder(tf.float32, [None, z_dim])
+      with tf.control_dependencies([step_D]):
+        loss_G_fused = cross_entropy(D(G(z_G)), 1.)
+        step_fused = G_optimizer.minimize(loss_G_fused, var_list=theta('G'))
+
+    losses = []
+    with tf.Session() as sess:
+      sess.run(tf.global_variables_initializer())
+      tic = time.time()
+      for _ in range(steps):
+        feed_dict = {x: np.tanh(rng.standard_normal([batch_size, x_dim])),
+                     z: rng.standard_normal([batch_size, z_dim])}
+        z_batch = rng.standard_normal([batch_size, z_dim])
+        if fuse:
+          feed_dict[z_G] = z_batch
+          _, lD, lG = sess.run([step_fused, loss_D, loss_G_fused], feed_dict)
+        else:
+          lD = sess.run([step_D, loss_D], feed_dict)[1]
+          lG = sess.run([step_G, loss_G], {z: z_batch})[1]
+        losses.append((lD, lG))
+      steps_per_sec = steps / (time.time() - tic)
+    return np.array(losses), steps_per_sec
+
+  separate, sps_separate = train(fuse=False)
+  fused, sps_fused = train(fuse=True)
+  print('>> Separate runs: {:.1f} steps/sec'.format(sps_separate))
+  print('>> Fused run: {:.1f} steps/sec'.format(sps_fused))
+  print('>> Max loss difference: {:.3g}'.format(np.max(abs(separate - fused))))
+  assert np.allclose(separate, fused, rtol=1e-5, atol=1e-6)
@@ -153,12 +153,16 @@ class VAE(Model):
     # Set feed dictionary
     feed_dict = {self.Q.input_tensor: features}
     feed_dict.update(self._get_status_feed_dict(is_training=True))
-    _, loss, summaries = self._session.run(
-      [self._train_step, self._loss, self._merged_summary], feed_dict=feed_dict)
+    # Evaluate summaries only when necessary
+    fetches = [self._train_step, self._loss]
+    if self.summary_due: fetches.append(self._merged_summary)
+    results = self._session.run(fetches, feed_dict=feed_dict)
+    loss = results[1]
 
     # Write summaries to file
-    assert isinstance(self._summary_writer, tf.summary.FileWriter)
-    self._summary_writer.add_summary(summaries, self.counter)
+    if self.summary_due:
+      assert isinstance(self._summary_writer, tf.summary.FileWriter)
+      self._summary_writer.add_summary(results[2], self.counter)
 
     # Return loss dict
     return {'VAE loss': loss}
@@ -13,6 +13,7 @@ from tframe import console
 from tframe import context
 from tframe import checker
 from tframe import linker
+from tframe import pedia
 from tframe.nets.net import Net
 from tframe.utils.misc import ravel_nested_stuff
 
@@ -52,6 +53,15 @@ class RNet(Net):
 
     self._custom_vars = None
 
+    # Used only when hub.state_on_device is True
+    # .. {init_state placeholder: state variable}
+    self._state_variables = None
+    self._state_batch_size = None
+    self._update_state_op = None
+    self._reset_state_op = None
+    self._gather_state_op = None
+    self._state_placeholders = None
+
     # Gate activations should be registered here
     self._gate_dict = OrderedDict()
 
@@ -93,8 +103,7 @@ class RNet(Net):
       assert self._state_size is not None
       # The initialization of init_state must be done under with_graph
       # .. decorator
-      self._init_state = tf.placeholder(
-        dtype=hub.dtype, shape=(None, self._state_size), name='init_state')
+      self._init_state = self._get_placeholder('init_state', self._state_size)
 
     return self._init_state
 
@@ -220,7 +229,12 @@ class RNet(Net):
 
   def reset_buffers(self, batch_size, is_training=True):
     assert self.is_root
-    if is_training: self._train_state_buffer = self._get_zero_state(batch_size)
+    if is_training and hub.state_on_device:
+      self.session.run(self._reset_state_op, feed_dict={
+        self._state_placeholders[0]: batch_size})
+      self._state_batch_size = batch_size
+    elif is_training:
+      self._train_state_buffer = self._get_zero_state(batch_size)
     else: self._eval_state_buffer = self._get_zero_state(batch_size)
     if 'reset_buffer' in hub.verbose_config:
       prefix = 'Train' if is_training else 'Eval'
@@ -234,7 +248,6 @@ class RNet(Net):
 
   def decrease_buffer_size(self, indices, is_training):
     assert self.is_root and isinstance(indices, (list, tuple))
-
     def _decrease(state):
       assert isinstance(state, np.ndarray) and len(state) > len(indices)
       return state[np.array(indices)]
@@ -253,7 +266,10 @@ class RNet(Net):
     #   self._train_state_buffer = _decrease(self._train_state_buffer)
     # else: self._eval_state_buffer = _decrease(self._eval_state_buffer)
 
-    if is_training:
+    if is_training and hub.state_on_device:
+      assert self._state_batch_size > len(indices)
+      self._gather_state_buffers(indices, [True] * len(indices))
+    elif is_training:
       self._train_state_buffer = self._apply_to_nested_array(
         self._train_state_buffer, _decrease)
     else: self._eval_state_buffer = self._apply_to_nested_array(
@@ -277,6 +293,11 @@ class RNet(Net):
     none_indices = [i for i in indices if i not in zero_indices]
     assert len(zero_indices) + len(none_indices) == len(indices)
 
+    if hub.state_on_device:
+      keep = [i for i in range(self._state_batch_size) if i not in none_indices]
+      self._gather_state_buffers(keep, [i not in zero_indices for i in keep])
+      return
+
     def _reset(state):
       assert isinstance(state, np.ndarray)
       if len(zero_indices) > 0: state[np.array(zero_indices), :] = 0
@@ -356,6 +377,8 @@ class RNet(Net):
     assert self.is_root and isinstance(is_training, bool)
 
     rnn_dict = {}
+    # Placeholders of init_state default to state variables on device
+    if is_training and hub.state_on_device: return rnn_dict
     if is_training:
       state = self._train_state_buffer
       assert state is not None
@@ -400,11 +423,81 @@ class RNet(Net):
     assert len(input_shape) == 2
     return input_shape[1]
 
-  @staticmethod
-  def _get_placeholder(name, size):
+  def _get_placeholder(self, name, size):
     if isinstance(size, (list, tuple)): shape = tuple([None] + list(size))
     else: shape = (None, checker.check_positive_integer(size))
-    return tf.placeholder(dtype=hub.dtype, shape=shape, name=name)
+    if not hub.state_on_device:
+      return tf.placeholder(dtype=hub.dtype, shape=shape, name=name)
+    # Create a state variable with a dynamic batch dimension. It is neither
+    # .. trained nor saved
+    variable = tf.Variable(
+      tf.zeros((0,) + shape[1:], dtype=hub.dtype), trainable=False,
+      validate_shape=False, use_resource=True, name=name + '_buffer',
+      collections=[tf.GraphKeys.GLOBAL_VARIABLES, pedia.do_not_save])
+    # The returned tensor can still be fed like a placeholder
+    placeholder = tf.placeholder_with_default(
+      variable.read_value(), shape=shape, name=name)
+    if self._state_variables is None: self._state_variables = OrderedDict()
+    self._state_variables[placeholder] = variable
+    return placeholder
+
+  def _collect_state_variables(self):
+    state_variables = OrderedDict(self._state_variables or {})
+    for child in self.children:
+      if isinstance(child, RNet):
+        state_variables.update(child._collect_state_variables())
+    return state_variables
+
+  def _build_state_ops(self, last_state):
+    """Build ops for keeping train state buffers on device. The state update
+       op should be run together with the train step so that states never
+       leave the device."""
+    assert self.is_root and hub.state_on_device
+    buffers = self._collect_state_variables()
+    init_states = ravel_nested_stuff(self.init_state)
+    new_states = ravel_nested_stuff(last_state)
+    assert len(init_states) == len(new_states)
+    variables = []
+    for s in init_states:
+      if s not in buffers: raise TypeError(
+        '!! State `{}` can not be kept on device'.format(s.name))
+      variables.append(buffers[s])
+
+    with tf.name_scope('StateBuffers'):
+      batch_size = tf.placeholder(tf.int32, shape=(), name='batch_size')
+      indices = tf.placeholder(tf.int32, shape=(None,), name='indices')
+      mask = tf.placeholder(tf.bool, shape=(None,), name='mask')
+      self._state_placeholders = (batch_size, indices, mask)
+
+      update_ops, reset_ops, gather_ops = [], [], []
+      for v, s, new_s in zip(variables, init_states, new_states):
+        # (1) Update state with the last state of the train step
+        if hub.state_nan_protection:
+          axis = list(range(1, len(new_s.shape)))
+          is_nan = tf.reduce_any(tf.is_nan(new_s), axis=axis)
+          new_s = tf.where(is_nan, tf.zeros_like(new_s), new_s)
+        update_ops.append(v.assign(new_s))
+        # (2) Reset to zeros with a given batch size
+        shape = tf.stack([batch_size] + s.shape.as_list()[1:])
+        reset_ops.append(v.assign(tf.zeros(shape, dtype=v.dtype)))
+        # (3) Select rows by indices and zero the rows masked as False. Used
+        # .. for decreasing batch size and partially resetting states
+        gathered = tf.gather(v.read_value(), indices)
+        gather_ops.append(v.assign(
+          tf.where(mask, gathered, tf.zeros_like(gathered))))
+
+      self._update_state_op = tf.group(*update_ops, name='update')
+      self._reset_state_op = tf.group(*reset_ops, name='reset')
+      self._gather_state_op = tf.group(*gather_ops, name='gather')
+
+    return self._update_state_op
+
+  def _gather_state_buffers(self, indices, mask):
+    assert len(indices) == len(mask)
+    _, indices_ph, mask_ph = self._state_placeholders
+    self.session.run(self._gather_state_op, feed_dict={
+      indices_ph: indices, mask_ph: mask})
+    self._state_batch_size = len(indices)
 
   def _distribute_last_tensors(self):
     assert self.is_root
@@ -724,3 +817,73 @@ class RNet(Net):
 
   # endregion : Export dL/dx
 
+
+
+if __name__ == '__main__':
+  import sys
+  import time
+  import subprocess
+  from tframe import Predictor
+  from tframe.data.sequences.nlp.ptb import PTB
+  from tframe.layers import Input, Activation
+  from tframe.layers.common import Onehot
+  from tframe.layers.hyper.dense import Dense
+  from tframe.models.recurrent import Recurrent
+  from tframe.nets.rnn_cells.lstms import LSTM
+
+  # Steps/sec and host-transfer bytes per step of training a char-level LSTM
+  # .. on PTB with state buffers fed from host (before) or kept on device
+  # .. (after). Usage: python rnet.py [data_dir]
+  # Each setting runs in a separate process since tframe context holds the
+  # .. graph of only one model
+  data_dir = sys.argv[1] if len(sys.argv) > 1 else './data'
+  if len(sys.argv) < 3:
+    for flag in ('0', '1'): subprocess.run(
+      [sys.executable, sys.argv[0], data_dir, flag], check=True)
+    sys.exit(0)
+  state_on_device = sys.argv[2] == '1'
+  train_set, _, _ = PTB.load(data_dir, 'char')
+  vocab_size = len(train_set['mapping'])
+  batch_size, num_steps, state_size, steps = 128, 100, 1000, 50
+
+  def nbytes(value):
+    if value is None: return 0
+    if isinstance(value, dict): value = list(value.values())
+    if isinstance(value, (list, tuple)): return sum([nbytes(v) for v in value])
+    return np.asarray(value).nbytes
+
+  hub.save_model, hub.overwrite, hub.summary = False, True, False
+  # Targets are fed as sparse labels
+  hub.target_dim, hub.target_dtype = 1, tf.int32
+  # Placeholders of init states are created according to this flag
+  hub.state_on_device = state_on_device
+  model = Predictor(mark='state_bench_{}'.format(int(state_on_device)),
+                    net_type=Recurrent)
+  model.add(Input(sample_shape=[1], dtype=tf.int32))
+  model.add(Onehot(vocab_size))
+  model.add(LSTM(state_size))
+  model.add(Dense(vocab_size))
+  model.add(Activation('softmax'))
+  model.build(tf.train.AdamOptimizer(1e-3), loss='cross_entropy')
+  model.launch_model(overwrite=True)
+
+  # Count bytes fed to and fetched from session
+  run, transferred = model.session.run, [0]
+  def counting_run(fetches, feed_dict=None, **kwargs):
+    results = run(fetches, feed_dict=feed_dict, **kwargs)
+    transferred[0] += nbytes(feed_dict) + nbytes(results)
+    return results
+  model.session.run = counting_run
+
+  # The first step, in which buffers are reset, is taken for warming up
+  tic, count = None, 0
+  for batch in train_set.gen_rnn_batches(
+      batch_size, num_steps, is_training=True):
+    if count == 1: tic, transferred[0] = time.time(), 0
+    model.update_model(batch)
+    count += 1
+    if count > steps: break
+  print('>> state_on_device = {}: {:.2f} steps/sec, {:.1f} KB transferred '
+        'per step'.format(state_on_device, steps / (time.time() - tic),
+                          transferred[0] / steps / 1024))
+  model.shutdown()
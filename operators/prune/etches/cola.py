@@ -2,16 +2,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import numpy as np
+import tensorflow as tf
 
-from tframe import console
-from tframe import context
-from tframe import hub
-from tframe import monitor
-
-from tframe.utils.maths.stat_tools import Statistic
-
-from .etch_kernel import EtchKernel
+from .etch_kernel import EtchKernel, percentile
 
 
 class Cola(EtchKernel):
@@ -25,32 +18,20 @@ class Cola(EtchKernel):
 
 
   def _get_new_mask(self):
-    # Get corresponding grads stats
-    assert hub.monitor_weight_grads
-    # When monitor_weight_grads is True, grads stats of self.weights will be
-    # .. monitored and can be accessed
-    grad_stats = monitor.get_weight_stats(self.weights)
-    assert isinstance(grad_stats, Statistic)
-
     # Get absolute running average of gradient and current weights
-    graa = grad_stats.running_abs_average
+    graa = self._get_grad_stat()
     # graa = np.abs(grad_stats.running_average)
-
-    wa = np.abs(self.weights_buffer)
-    assert isinstance(graa, np.ndarray) and isinstance(wa, np.ndarray)
-    assert graa.shape == wa.shape
+    wa = tf.abs(self.weights)
 
     # Get percentile
-    pctile = 100 - self.weights_fraction * (1 - self.ratio)
-
-    g_mask = graa < np.percentile(graa, pctile)
-    # g_mask = graa > np.percentile(graa, 100 - pctile)
+    pctile = 100 - self.weights_fraction_tensor * (1 - self.ratio)
 
-    # w_mask = wa < np.percentile(wa, pctile)
-    w_mask = wa > np.percentile(wa, 100 - pctile)
+    g_mask = graa < percentile(graa, pctile)
+    # g_mask = graa > percentile(graa, 100 - pctile)
 
-    mask = self.mask_buffer
-    mask[g_mask * w_mask] = 0.
+    # w_mask = wa < percentile(wa, pctile)
+    w_mask = wa > percentile(wa, 100 - pctile)
 
-    return mask
+    return tf.where(tf.logical_and(g_mask, w_mask),
+                    tf.zeros_like(self.mask), self.mask)
 
@@ -11,6 +11,41 @@ from tframe import hub
 from tframe.operators.masked_weights import MaskedWeights
 
 
+def percentile(x, q):
+  """Same as np.percentile(x, q) with default linear interpolation but built
+     as tensorflow ops. x is flattened and q can be a scalar tensor. An empty
+     x (e.g. when all weights have been pruned) yields 0"""
+  x = tf.reshape(x, [-1])
+  n = tf.size(x)
+
+  def _percentile():
+    pos = tf.cast(q, tf.float64) / 100. * tf.cast(n - 1, tf.float64)
+    lo = tf.cast(tf.floor(pos), tf.int32)
+    hi = tf.minimum(lo + 1, n - 1)
+
+    # The `lo`-th and `hi`-th smallest values are among the n - lo largest
+    # .. and among the hi + 1 smallest. The shorter top_k is taken
+    def _from_largest():
+      top = tf.nn.top_k(x, k=n - lo).values
+      return top[n - 1 - lo], top[n - 1 - hi]
+
+    def _from_smallest():
+      bottom = -tf.nn.top_k(-x, k=hi + 1).values
+      return bottom[lo], bottom[hi]
+
+    x_lo, x_hi = tf.cond(n - lo <= hi + 1, _from_largest, _from_smallest)
+    frac = tf.cast(pos - tf.floor(pos), x.dtype)
+    return x_lo + (x_hi - x_lo) * frac
+
+  return tf.cond(n > 0, _percentile, lambda: tf.zeros([], x.dtype))
+
+
+def fraction_of(mask):
+  """Percentage of non-zero entries in mask. Counted in float64 since float32
+     can not count beyond 2^24 exactly"""
+  return 100. * tf.reduce_mean(tf.cast(mask, tf.float64))
+
+
 class EtchKernel(MaskedWeights):
   """An EtchKernel is a MaskedWeights initiated with a dense mask."""
 
@@ -35,6 +70,33 @@ class EtchKernel(MaskedWeights):
     #  => net.structure_detail => pruner.get_variable_sizes
     self.weights_fraction = None
 
+    # Etch op is built by Pruner.build_etch_ops after model is built so that
+    # .. no op will be added to the graph during training. Kernels relying on
+    # .. gradient statistics recorded by monitor create this placeholder
+    self._etch_op = None
+    self.grad_stat_placeholder = None
+
+  # region : Properties
+
+  @property
+  def etch_op(self):
+    """An op assigning new mask and returning the new weights fraction"""
+    if self._etch_op is None: raise AssertionError(
+      '!! Etch op has not been built yet')
+    return self._etch_op
+
+  @property
+  def weights_fraction_tensor(self):
+    return fraction_of(self.mask)
+
+  # endregion : Properties
+
+
+  def build_etch_op(self):
+    if self._etch_op is not None: return
+    new_mask = tf.assign(self.mask, self._get_new_mask())
+    self._etch_op = fraction_of(new_mask)
+
 
   def get_assign_mask_op_dict(self, mask_value):
     assert isinstance(mask_value, np.ndarray)
@@ -43,23 +105,34 @@ class EtchKernel(MaskedWeights):
 
 
   def get_etch_op_dict(self):
-    """Before this method is called, corresponding buffers should be filled.
-       Since each EtchKernel may require different buffers to be set, it is
-       not necessary to check buffer here.
-    """
-    mask = self._get_new_mask()
-    assert isinstance(mask, np.ndarray)
-    # Update weights_fraction
-    self.weights_fraction = 100. * np.sum(mask) / mask.size
-    # Clear buffer
-    self.clear_buffers()
-    return self.get_assign_mask_op_dict(mask)
+    """Return etch op and the feed_dict it requires. Weights and mask never
+       leave the device during etching"""
+    op = self.etch_op
+    if self.grad_stat_placeholder is None: return op, {}
+    # When monitor_weight_grads is True, grads stats of self.weights will be
+    # .. monitored and can be accessed
+    assert hub.monitor_weight_grads
+    from tframe import monitor
+    grad_stats = monitor.get_weight_stats(self.weights)
+    return op, {self.grad_stat_placeholder: grad_stats.running_abs_average}
 
 
   def _get_new_mask(self):
+    """Return a tensor of new mask computed from self.weights and
+       self.mask"""
     raise NotImplementedError
 
 
+  def _get_grad_stat(self):
+    """Return a placeholder to be fed with running absolute average of
+       gradients of self.weights"""
+    if self.grad_stat_placeholder is None:
+      self.grad_stat_placeholder = tf.placeholder(
+        dtype=self.weights.dtype.base_dtype, shape=self.weights.shape,
+        name='grad_stat_placeholder')
+    return self.grad_stat_placeholder
+
+
   @staticmethod
   def get_etch_kernel(kernel_string):
     """kernel string example: `lottery:prune_frac=0.2`
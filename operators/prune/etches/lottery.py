@@ -2,15 +2,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import numpy as np
 import tensorflow as tf
 
 from tframe import hub
-from tframe import monitor
 
-from tframe.utils.maths.stat_tools import Statistic
-
-from .etch_kernel import EtchKernel
+from .etch_kernel import EtchKernel, percentile
 
 
 class Lottery(EtchKernel):
@@ -42,45 +38,31 @@ class Lottery(EtchKernel):
 
   def _g_constraint(self):
     # Get corresponding grads stats
-    assert hub.monitor_weight_grads
-    # When monitor_weight_grads is True, grads stats of self.weights will be
-    # .. monitored and can be accessed
-    grad_stats = monitor.get_weight_stats(self.weights)
-    assert isinstance(grad_stats, Statistic)
-    graa = grad_stats.running_abs_average
+    graa = self._get_grad_stat()
 
     # p is the fraction to prune
     p = self.prune_frac
     # Get mask and weights
-    m_float = self.mask_buffer
-    m_bool = np.asarray(m_float, np.bool)
-    abs_w = np.abs(self.weights_buffer * self.mask_buffer)
+    m_bool = tf.cast(self.mask, tf.bool)
+    abs_w = tf.abs(self.masked_weights)
 
     # Get mask according to |w| (remaining p smallest weights)
-    w_bound = np.percentile(abs_w[m_bool], 100 * p)
+    w_bound = percentile(tf.boolean_mask(abs_w, m_bool), 100 * p)
     w_mask = abs_w < w_bound
 
     # Get gradient mask
-    g_bound = np.percentile(graa[m_bool], 90)
+    g_bound = percentile(tf.boolean_mask(graa, m_bool), 90)
     g_mask = graa < g_bound
 
-    mask = self.mask_buffer
-    mask[w_mask * g_mask * m_bool] = 0.0
-    return mask
+    to_prune = tf.logical_and(tf.logical_and(w_mask, g_mask), m_bool)
+    return tf.where(to_prune, tf.zeros_like(self.mask), self.mask)
 
 
   def _lottery18(self):
     p = self.prune_frac
-    w = self.weights_buffer * self.mask_buffer
-    assert isinstance(w, np.ndarray) and np.isreal(self.weights_fraction)
-    assert 0 < self.weights_fraction <= 100
-    weight_fraction = self.weights_fraction * (1 - p)
+    weight_fraction = self.weights_fraction_tensor * (1 - p)
     # Get weights magnitude
-    w = np.abs(w)
+    w = tf.abs(self.masked_weights)
     # Create mask
-    mask = np.zeros_like(w, dtype=np.float32)
-    mask[w > np.percentile(w, 100 - weight_fraction)] = 1.0
-    # Return mask
-    return mask
-
+    return tf.cast(w > percentile(w, 100 - weight_fraction), self.mask.dtype)
 
@@ -4,10 +4,12 @@ from __future__ import print_function
 
 from collections import OrderedDict
 import numpy as np
+import tensorflow as tf
 
 import tframe as tfr
 
 from tframe.operators.prune.etches.etch_kernel import EtchKernel
+from tframe.operators.prune.etches.etch_kernel import fraction_of, percentile
 
 
 class Pruner(object):
@@ -20,6 +22,8 @@ class Pruner(object):
 
     # key: tf.Variable, value: EtchKernel
     self.variable_dict = OrderedDict()
+    # Ops used in global magnitude etching, built in build_etch_ops
+    self._global_etch_ops = None
 
     # Show status
     tfr.console.show_status('Pruner created.')
@@ -80,22 +84,36 @@ class Pruner(object):
   def clear(self):
     pass
 
+  def build_etch_ops(self):
+    """This method will be called in Model.build after model is built so
+       that etching adds no op to the graph during training"""
+    with self._model.graph.as_default():
+      with tf.name_scope('Etch'):
+        if tfr.hub.etch_global_frac is not None:
+          self._build_global_etch_ops(tfr.hub.etch_global_frac)
+        else:
+          for knl in self._dense_kernels: knl.build_etch_op()
+
   def etch_all(self, prompt='[Etch]'):
     """This method will only be called during training in Trainer._etch"""
     # Take down frac before pruning
     prev_frac = self.weights_fraction
-    # etching ia based on weights and mask buffers, which should be fetched
-    # here
-    self._write_weight_and_mask_buffer()
-    # Create empty op list and feed_dict
+    # New masks are computed and assigned on device. Each etch op returns
+    # .. the new weights fraction of its kernel
     ops, feed_dict = [], {}
-    for knl in self._dense_kernels:
-      assert isinstance(knl, EtchKernel)
-      op, d = knl.get_etch_op_dict()
-      ops.append(op)
-      feed_dict.update(d)
+    if tfr.hub.etch_global_frac is not None:
+      assert self._global_etch_ops is not None
+      ops = self._global_etch_ops
+    else:
+      for knl in self._dense_kernels:
+        assert isinstance(knl, EtchKernel)
+        op, d = knl.get_etch_op_dict()
+        ops.append(op)
+        feed_dict.update(d)
     # Run session to update kernels
-    self._update_kernels(ops, feed_dict)
+    fractions = self._run_op(ops, feed_dict)
+    for knl, frac in zip(self._dense_kernels, fractions):
+      knl.weights_fraction = frac
     # Show prune result
     curr_frac = self.weights_fraction
     tfr.console.show_status(
@@ -141,9 +159,22 @@ class Pruner(object):
       knl.mask_buffer = m_buffer
     tfr.console.show_status('Weights and mask buffers fetched.', prompt)
 
-  def _update_kernels(self, ops, feed_dict):
-    assert isinstance(ops, list) and isinstance(feed_dict, dict)
-    self._run_op(ops, feed_dict)
+  def _build_global_etch_ops(self, prune_frac):
+    """Prune `prune_frac` of remaining weights with the smallest magnitudes
+       across all dense kernels using a single threshold"""
+    if self._global_etch_ops is not None: return
+    assert 0 < prune_frac < 1
+    magnitudes = [tf.abs(knl.masked_weights) for knl in self._dense_kernels]
+    remaining = tf.add_n([tf.reduce_sum(tf.cast(knl.mask, tf.float64))
+                          for knl in self._dense_kernels])
+    fraction = 100. * remaining / float(self.total_size) * (1 - prune_frac)
+    threshold = percentile(
+      tf.concat([tf.reshape(m, [-1]) for m in magnitudes], axis=0),
+      100 - fraction)
+    self._global_etch_ops = []
+    for knl, m in zip(self._dense_kernels, magnitudes):
+      new_mask = tf.assign(knl.mask, tf.cast(m > threshold, knl.mask.dtype))
+      self._global_etch_ops.append(fraction_of(new_mask))
 
   # endregion : Private Methods
 
@@ -197,3 +228,52 @@ class Pruner(object):
     tfr.console.show_status('Model {} saved.'.format(model.mark))
 
   # endregion : Lottery 2018
+
+
+if __name__ == '__main__':
+  import time
+  from tframe import hub
+  from tframe.operators.prune.etches.lottery import Lottery
+
+  # Etch latency on a 50M-parameter MLP with lottery18
+  hub.lottery_kernel = 'lottery18'
+  sizes = [2048, 4096, 4096, 4096, 2048]
+  kernels = []
+  for i, (m, n) in enumerate(zip(sizes[:-1], sizes[1:])):
+    with tf.variable_scope('layer{}'.format(i)):
+      weights = tf.get_variable(
+        'W', shape=[m, n], initializer=tf.random_normal_initializer())
+      kernels.append(Lottery(weights, prune_frac=0.2))
+  reset_masks = [tf.assign(k.mask, tf.ones_like(k.mask)) for k in kernels]
+  for k in kernels: k.build_etch_op()
+  etch_ops = [k.etch_op for k in kernels]
+  print('>> {} parameters'.format(sum([k.total_size for k in kernels])))
+
+  with tf.Session() as sess:
+    sess.run(tf.global_variables_initializer())
+    # (1) Fetch weights and masks, compute masks on host and feed them back
+    tic = time.time()
+    buffers = sess.run([(k.weights, k.mask) for k in kernels])
+    ops, feed_dict = [], {}
+    for k, (w, m) in zip(kernels, buffers):
+      w = np.abs(w * m)
+      wf = 100. * np.sum(m) / m.size * (1 - k.prune_frac)
+      mask = np.zeros_like(w, dtype=np.float32)
+      mask[w > np.percentile(w, 100 - wf)] = 1.0
+      op, d = k.get_assign_mask_op_dict(mask)
+      ops.append(op)
+      feed_dict.update(d)
+    sess.run(ops, feed_dict)
+    print('>> Host etch: {:.2f} s'.format(time.time() - tic))
+    host_masks = sess.run([k.mask for k in kernels])
+
+    # (2) Etch on device in a single run
+    sess.run(reset_masks)
+    tic = time.time()
+    fractions = sess.run(etch_ops)
+    print('>> Device etch: {:.2f} s'.format(time.time() - tic))
+    device_masks = sess.run([k.mask for k in kernels])
+    agreement = np.mean([np.mean(h == d)
+                         for h, d in zip(host_masks, device_masks)])
+    print('>> Weights fractions: {}, mask agreement: {:.6f}'.format(
+      ', '.join(['{:.2f}'.format(f) for f in fractions]), agreement))
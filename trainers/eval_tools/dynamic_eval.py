@@ -2,7 +2,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import multiprocessing as mp
 from collections import OrderedDict
+from functools import cmp_to_key
 
 from tframe import hub as th
 from tframe import console, checker
@@ -26,6 +28,10 @@ class DynamicEvaluator(object):
          (2.2) set th.de_max_batches to specify max batches used for calculating
                gradient statistics
          (2.3) specify th.de_eta and th.de_lambda to fix corresponding HP
+         (2.4) set th.de_workers and provide a model builder to evaluate HP
+               grid on model replicas concurrently
+         (2.5) set th.de_halving_rounds to drop losing HP settings early on
+               prefixes of val_set
      (3) set de_num_steps. For character level model it should be approx 20.
          For word level model, it should be approx 5. (according to krause18)
 
@@ -36,10 +42,14 @@ class DynamicEvaluator(object):
 
   show_status = lambda _, s: console.show_status(s, '[Dynamic Evaluation]')
 
-  def __init__(self, model, delay=None):
+  def __init__(self, model, delay=None, model_builder=None):
     assert isinstance(model, Model)
     self.model = model
     self.delay = delay
+    # A picklable callable building a replica of model, used in HP searching.
+    # .. Since replicas are built in spawned processes, hub should be
+    # .. configured inside the builder as well
+    self.model_builder = model_builder
 
     # Preparation
     self._loss_tensor = self.model.loss.op
@@ -82,23 +92,27 @@ class DynamicEvaluator(object):
     assert lr > 0 and 0 < dc < 1
     self._dynamic_eval(data_set, lr, dc)
 
-  def _dynamic_eval(self, data_set, lr, lambd, prompt='[Dynamic Evaluation]'):
+  def _dynamic_eval(self, data_set, lr, lambd, prompt='[Dynamic Evaluation]',
+                    verbose=True):
     assert isinstance(data_set, DataSet)
     # console.show_status('lr = {}, lambd = {}'.format(lr, lambd), prompt)
-    console.show_status('', prompt)
+    if verbose: console.show_status('', prompt)
     # Reset parameters
-    self.optimizer.reset_parameters()
+    self.optimizer.reset_parameters(verbose)
     # Set HP to optimizer
-    self.optimizer.set_hyper_parameters(lr, lambd)
+    self.optimizer.set_hyper_parameters(lr, lambd, verbose)
     # Do dynamic evaluation
     output = self.model.evaluate(
-      self._dynamic_fetches, data_set, batch_size=1, verbose=True,
+      self._dynamic_fetches, data_set, batch_size=1, verbose=verbose,
       num_steps=th.de_num_steps)[0]
     assert isinstance(self._quantity, Quantity)
     metric = self._quantity.apply_np_summ_method(output)
+    if verbose: self._show_metric(metric)
+    return metric
+
+  def _show_metric(self, metric):
     console.supplement('Dynamic {} = {}'.format(
       self._quantity.name, th.decimal_str(metric, th.val_decimals)))
-    return metric
 
   def _dynamic_eval_with_delay(self, data_set, lr, lambd):
     assert isinstance(data_set, DataSet)
@@ -121,31 +135,98 @@ class DynamicEvaluator(object):
     if th.de_eval_val_set: self._validate(val_set)
     # Do grid search
     console.show_status('Searching hyper-parameters on validation set ...')
+    pool = self._create_replica_pool()
+    try:
+      # Drop losing HP settings on prefixes of val_set if required
+      candidates = self._successive_halving(val_set, hp_grid, pool)
+      metrics = self._evaluate_hp_grid(val_set, candidates, pool)
+    finally:
+      if pool is not None: pool.terminate()
     best_metric, best_lr, best_dc = None, None, None
-    result_dict = OrderedDict()
+    result_dict = OrderedDict([(lr, OrderedDict()) for lr, _ in hp_grid])
     assert isinstance(self._quantity, Quantity)
-    for i, (lr, lambd) in enumerate(hp_grid):
-      metric = self._dynamic_eval(
-        val_set, lr, lambd, '[{}/{}]'.format(i + 1, len(hp_grid)))
+    # Settings are compared in grid order thus the result is the same as
+    # .. evaluating them one by one
+    for (lr, lambd), metric in zip(candidates, metrics):
       # if best_metric is None or metric < best_metric:
       if best_metric is None or self.model.eval_metric.is_better_than(
         metric, best_metric):
         best_metric = metric
         best_lr, best_dc = lr, lambd
       # Check result dict
-      if lr not in result_dict: result_dict[lr] = OrderedDict()
       result_dict[lr][lambd] = metric
-    # Print result table
+    # Print result table (settings dropped during halving are shown as `-`)
     lrs = list(result_dict.keys())
-    decays = list(list(result_dict.values())[0].keys())
+    decays = list(OrderedDict.fromkeys([dc for _, dc in hp_grid]))
     widths = [11] + [8] * len(decays)
     table = Table(*widths, margin=1)
     table.specify_format('{}', *['{:.5f}' for _ in decays])
     table.print_header(r'lr\decay', *['{}'.format(d) for d in decays])
-    for lr in lrs: table.print_row(lr, *[result_dict[lr][d] for d in decays])
+    for lr in lrs: table.print_row(
+      lr, *[result_dict[lr].get(d, '-') for d in decays])
     table.hline()
     return best_lr, best_dc
 
+  def _evaluate_hp_grid(self, data_set, hp_grid, pool=None):
+    """Return metrics of HP settings in hp_grid on data_set. Settings are
+       evaluated on model replicas concurrently if pool is provided"""
+    prompts = ['[{}/{}]'.format(i + 1, len(hp_grid))
+               for i in range(len(hp_grid))]
+    if pool is None:
+      return [self._dynamic_eval(data_set, lr, lambd, prompt)
+              for (lr, lambd), prompt in zip(hp_grid, prompts)]
+    console.show_status('Evaluating {} HP settings on {} with {} '
+                        'replicas ...'.format(len(hp_grid), data_set.name,
+                                              th.de_workers))
+    metrics = pool.map(
+      _eval_on_replica, [(data_set, lr, lambd) for lr, lambd in hp_grid],
+      chunksize=1)
+    for (lr, lambd), prompt, metric in zip(hp_grid, prompts, metrics):
+      console.show_status('lr = {}, lambda = {}'.format(lr, lambd), prompt)
+      self._show_metric(metric)
+    return metrics
+
+  def _successive_halving(self, val_set, hp_grid, pool=None):
+    """In the r-th of R rounds, HP settings are evaluated on the first
+       1/2^(R-r+1) of val_set and the worse half of them are dropped.
+       Remaining settings are returned in grid order"""
+    candidates = list(hp_grid)
+    rounds = th.de_halving_rounds
+    compare = lambda a, b: (
+      -1 if self.model.eval_metric.is_better_than(a[1], b[1]) else
+      1 if self.model.eval_metric.is_better_than(b[1], a[1]) else 0)
+    for r in range(rounds):
+      if len(candidates) <= 2: break
+      prefix = self._get_prefix(val_set, 2 ** (rounds - r))
+      console.show_status('Halving round {}/{}: {} settings on {}'.format(
+        r + 1, rounds, len(candidates), prefix.name))
+      metrics = self._evaluate_hp_grid(prefix, candidates, pool)
+      ranked = sorted(enumerate(metrics), key=cmp_to_key(compare))
+      kept = sorted([i for i, _ in ranked[:(len(candidates) + 1) // 2]])
+      candidates = [candidates[i] for i in kept]
+    return candidates
+
+  @staticmethod
+  def _get_prefix(data_set, denominator):
+    if isinstance(data_set, SequenceSet):
+      size = max(1, data_set.size // denominator)
+    else: size = max(1, int(data_set.size / denominator))
+    prefix = data_set[:size]
+    prefix.name = '{}[:1/{}]'.format(data_set.name, denominator)
+    return prefix
+
+  def _create_replica_pool(self):
+    if th.de_workers <= 1: return None
+    if self.model_builder is None:
+      console.warning('A model builder should be provided to evaluate HP '
+                      'settings concurrently. Searching sequentially ...')
+      return None
+    # Replicas are built in spawned processes since a process running a
+    # .. tensorflow session can not be forked safely
+    return mp.get_context('spawn').Pool(
+      th.de_workers, initializer=_init_replica,
+      initargs=(self.model_builder, self.optimizer.get_state()))
+
   def _get_quantity(self):
     """TODO to be refactored using properties"""
     metric_quantity = self.model.eval_metric.quantity_definition
@@ -165,8 +246,31 @@ class DynamicEvaluator(object):
     # console.supplement('Metric = {:.3f}'.format(val))
 
   @staticmethod
-  def dynamic_evaluate(model, data_set, val_set=None, delay=None):
-    de = DynamicEvaluator(model, delay)
+  def dynamic_evaluate(model, data_set, val_set=None, delay=None,
+                       model_builder=None):
+    de = DynamicEvaluator(model, delay, model_builder)
     de.evaluate(data_set, val_set)
 
 
+# region : Replica Workers
+
+_replica = None
+
+
+def _init_replica(model_builder, state):
+  """Build a replica of model in a worker process and load parameters and
+     gradient statistics from the main process"""
+  global _replica
+  # Gradient statistics are loaded instead of being calculated
+  th.train_stats_exists, th.de_save_train_stats = True, False
+  model = model_builder()
+  _replica = DynamicEvaluator(model)
+  _replica.optimizer.load_state(state)
+
+
+def _eval_on_replica(args):
+  data_set, lr, lambd = args
+  return _replica._dynamic_eval(data_set, lr, lambd, verbose=False)
+
+# endregion : Replica Workers
+
@@ -15,6 +15,7 @@ from tframe import context
 from tframe.data.base_classes import TFRData
 from tframe.data.dataset import DataSet
 from tframe.data.perpetual_machine import PerpetualMachine
+from tframe.data.prefetcher import Prefetcher
 from tframe.data.sequences.seq_set import SequenceSet
 from tframe.enums import InputTypes, SaveMode
 from tframe.core import with_graph
@@ -195,9 +196,16 @@ class Trainer(object):
     # Maybe take down some notes
     self._take_notes_before_loops()
 
+    # Resolve flags once for the training loop if required
+    configs = [self.th, tfr.hub] if self.th.compile_hub else []
+    for config in configs: config.compile()
+
     # Train with graph
-    with self.session.as_default():
-      rounds = self._outer_loop()
+    try:
+      with self.session.as_default():
+        rounds = self._outer_loop()
+    finally:
+      for config in configs: config.decompile()
 
     # :: After training
     self._end_training(rounds)
@@ -457,6 +465,10 @@ class Trainer(object):
   # region : Private Methods
 
   def _update_model(self, data_batch):
+    # Gradients are fetched only every `monitor_grad_cycle` steps
+    if self.th.monitor_weight_grads:
+      self.model.grads_slot.sleep = np.mod(
+        self.counter, self.th.monitor_grad_cycle) != 0
     loss_dict = self.model.update_model(data_batch=data_batch)
     loss_slots = [s for s in loss_dict.keys() if s.name == 'Loss']
     # assert len(loss_slots) > 0
@@ -466,7 +478,7 @@ class Trainer(object):
 
     # Record grads if necessary
     # <monitor_grad_step_03: fetch and record>
-    if self.th.monitor_weight_grads:
+    if self.th.monitor_weight_grads and self.model.grads_slot in loss_dict:
       grads = loss_dict.pop(self.model.grads_slot)
       context.monitor.record_grads(grads)
 
@@ -514,9 +526,14 @@ class Trainer(object):
       #   raise AssertionError('!! parallel engine is not activated')
 
       pass
-    return self.model.get_data_batches(
+    batches = self.model.get_data_batches(
       self.training_set, self.th.batch_size, self.th.num_steps,
       self.th.shuffle, is_training=True)
+    # Prepare batches in background if required
+    if self.th.prefetch_depth > 0:
+      batches = Prefetcher(self.training_set, batches, self.th.prefetch_depth,
+                           self.th.prefetch_backend)
+    return batches
 
   @staticmethod
   def _check_data_batch(batch):
@@ -889,6 +906,10 @@ class TrainerHub(Config):
 
   def sanity_check(self):
     assert isinstance(self.trainer, Trainer)
+    # Session threads may be left in a broken state in forked children
+    if self.prefetch_depth > 0 and self.prefetch_backend != 'thread':
+      raise ValueError('!! Only thread backend can be used for prefetching '
+                       'training batches')
 
   def tic(self):
     self._start_time = time.time()
@@ -0,0 +1,207 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import hashlib
+import time
+import subprocess
+from collections import OrderedDict
+
+from tframe import checker
+from tframe import console
+from tframe.utils.note_store import NoteStore
+
+
+class Job(object):
+  """A job is a single run of a module with a list of config strings"""
+  PENDING = 'pending'
+  RUNNING = 'running'
+  DONE = 'done'
+  FAILED = 'failed'
+
+  def __init__(self, index, key, params_list, hyper_dict, run_id=0,
+               config_key=None):
+    self.index = index
+    self.key = key
+    self.params_list = params_list
+    # Runs of a same resolved config share this key
+    self.config_key = config_key
+    self.hyper_dict = hyper_dict
+    self.run_id = run_id
+
+    self.status = self.PENDING
+    self.returncode = None
+    self.gpu_id = None
+    self.process = None
+    self._files = ()
+
+  def start(self, cmd, log_dir, gpu_id=None):
+    self.gpu_id = gpu_id
+    if self.config_key is not None:
+      cmd = cmd + ['--job_key={}'.format(self.config_key)]
+    if gpu_id is not None:
+      cmd = [s for s in cmd if not s.startswith('--gpu_id=')]
+      cmd.append('--gpu_id={}'.format(gpu_id))
+    prefix = os.path.join(log_dir, 'job_{:03d}'.format(self.index))
+    self._files = (open(prefix + '.out', 'w'), open(prefix + '.err', 'w'))
+    self.process = subprocess.Popen(
+      cmd, stdout=self._files[0], stderr=self._files[1])
+    self.status = self.RUNNING
+
+  def poll(self):
+    """Return True if the running job has just finished"""
+    assert self.status == self.RUNNING
+    self.returncode = self.process.poll()
+    if self.returncode is None: return False
+    self.status = self.DONE if self.returncode == 0 else self.FAILED
+    self._release()
+    return True
+
+  def terminate(self):
+    if self.process is not None and self.process.poll() is None:
+      self.process.terminate()
+      self.process.wait()
+    self._release()
+    self.status = self.PENDING
+
+  def _release(self):
+    for f in self._files: f.close()
+    self._files = ()
+    self.process = None
+
+
+class JobScheduler(object):
+  """Runs jobs concurrently in subprocesses.
+
+     Status of each job is written to a queue file (if provided) after every
+     change so that an interrupted sweep resumes where it stopped. A job is
+     also regarded as finished if a note taken with the same resolved config
+     can be found in the gathered summary file (if provided). Each job is
+     run with `--job_key` which is taken down to its note for this purpose.
+  """
+  PROMPT = '[Scheduler]'
+  # Flags which do not change the config of a job
+  VOLATILE_FLAGS = ('gpu_id', 'script_suffix', 'job_key')
+
+  def __init__(self, python_cmd, module_name, workers=1, gpu_ids=None,
+               cpus_per_job=1, queue_file=None, log_dir='sweep_logs',
+               summ_path=None):
+    self._cmd_head = [python_cmd, module_name]
+    # Number of concurrent jobs is bounded by CPU slots
+    cpus_per_job = checker.check_positive_integer(cpus_per_job)
+    cpu_slots = max(1, (os.cpu_count() or 1) // cpus_per_job)
+    self._workers = min(checker.check_positive_integer(workers), cpu_slots)
+    # A GPU id may appear multiple times to run several jobs on one GPU
+    self._gpu_pool = None
+    if gpu_ids is not None:
+      if not isinstance(gpu_ids, (list, tuple)): gpu_ids = [gpu_ids]
+      self._gpu_pool = list(gpu_ids)
+      self._workers = min(self._workers, len(self._gpu_pool))
+    self._queue_file = queue_file
+    self._log_dir = log_dir
+    self._summ_path = summ_path
+
+    self._jobs = OrderedDict()
+
+  # region : Properties
+
+  @property
+  def jobs(self): return list(self._jobs.values())
+
+  def _get_jobs(self, status):
+    return [job for job in self.jobs if job.status == status]
+
+  # endregion : Properties
+
+  # region : Public Methods
+
+  def add(self, params_list, hyper_dict, run_id=0):
+    key = '{}:{}'.format(run_id, ' '.join(params_list))
+    if key in self._jobs: return
+    self._jobs[key] = Job(len(self._jobs), key, params_list, dict(hyper_dict),
+                          run_id, self._get_config_key(params_list))
+
+  def run(self):
+    self._resume()
+    if not os.path.exists(self._log_dir): os.makedirs(self._log_dir)
+    console.show_status('{} jobs to run with {} workers. Logs will be written '
+                        'to `{}`'.format(len(self._get_jobs(Job.PENDING)),
+                                         self._workers, self._log_dir),
+                        self.PROMPT)
+    try:
+      while True:
+        changed = self._start_jobs()
+        for job in self._get_jobs(Job.RUNNING):
+          if not job.poll(): continue
+          changed = True
+          if self._gpu_pool is not None: self._gpu_pool.append(job.gpu_id)
+          if job.status == Job.FAILED: console.warning(
+            'Job {} failed with return code {}, see `{}`'.format(
+              job.index, job.returncode, self._log_dir))
+        if changed:
+          self._save()
+          self._show_summary()
+        if not any([self._get_jobs(Job.RUNNING), self._get_jobs(Job.PENDING)]):
+          break
+        time.sleep(1.0)
+    except KeyboardInterrupt:
+      # Running jobs will be restarted next time
+      for job in self._get_jobs(Job.RUNNING): job.terminate()
+      self._save()
+      console.show_status('Sweep interrupted', self.PROMPT)
+      raise
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  def _start_jobs(self):
+    started = False
+    for job in self._get_jobs(Job.PENDING):
+      if len(self._get_jobs(Job.RUNNING)) >= self._workers: break
+      gpu_id = None if self._gpu_pool is None else self._gpu_pool.pop(0)
+      job.start(self._cmd_head + job.params_list, self._log_dir, gpu_id)
+      started = True
+    return started
+
+  def _resume(self):
+    """Mark jobs finished in previous sweeps as done"""
+    # (1) Check queue file
+    if self._queue_file is not None and os.path.exists(self._queue_file):
+      with open(self._queue_file, 'r') as f: status = json.load(f)
+      for key, s in status.items():
+        if key in self._jobs and s == Job.DONE:
+          self._jobs[key].status = Job.DONE
+    # (2) Check gathered notes
+    if self._summ_path is not None and os.path.exists(self._summ_path):
+      job_keys = NoteStore.load_job_keys(self._summ_path)
+      for job in self._get_jobs(Job.PENDING):
+        # The i-th run of a config is done if it appears more than i times
+        if job_keys.count(job.config_key) > job.run_id:
+          job.status = Job.DONE
+    done = len(self._get_jobs(Job.DONE))
+    if done > 0: console.show_status(
+      '{} finished jobs will be skipped'.format(done), self.PROMPT)
+
+  def _get_config_key(self, params_list):
+    """Hash of the module and all resolved configs of a job"""
+    prefixes = tuple(['--{}='.format(name) for name in self.VOLATILE_FLAGS])
+    configs = sorted([p for p in params_list if not p.startswith(prefixes)])
+    text = ' '.join([self._cmd_head[1]] + configs)
+    return hashlib.md5(text.encode()).hexdigest()[:16]
+
+  def _save(self):
+    if self._queue_file is None: return
+    status = OrderedDict([(key, job.status) for key, job in self._jobs.items()])
+    tmp_path = self._queue_file + '.tmp'
+    with open(tmp_path, 'w') as f: json.dump(status, f, indent=1)
+    os.replace(tmp_path, self._queue_file)
+
+  def _show_summary(self):
+    counts = ['{}: {}'.format(s.capitalize(), len(self._get_jobs(s))) for s in
+              (Job.RUNNING, Job.DONE, Job.FAILED, Job.PENDING)]
+    console.show_status(', '.join(counts), self.PROMPT)
+
+  # endregion : Private Methods
@@ -11,6 +11,26 @@ def pre_emphasize(signal_, coefficient=0.97):
   return np.append(signal_[0], signal_[1:] - coefficient * signal_[:-1])
 
 
+def sliding_window(x, size, stride=1, as_view=False):
+  """Return frames x[i*stride:i*stride+size] along the first axis as an
+     array with shape [num_frames, size, *x.shape[1:]].
+  :param as_view: if True, a read-only strided view of x is returned thus
+                  no data is copied. Otherwise a contiguous copy is returned
+  """
+  x = np.asarray(x)
+  checker.check_positive_integer(size)
+  checker.check_positive_integer(stride)
+  if x.ndim == 0 or len(x) < size: raise ValueError(
+    '!! Signal length ({}) should be no less than window size ({})'.format(
+      0 if x.ndim == 0 else len(x), size))
+  num_frames = (len(x) - size) // stride + 1
+  shape = (num_frames, size) + x.shape[1:]
+  strides = (x.strides[0] * stride,) + x.strides
+  frames = np.lib.stride_tricks.as_strided(
+    x, shape=shape, strides=strides, writeable=False)
+  return frames if as_view else np.array(frames)
+
+
 def short_time_energy(signal_, window_size, stride, center=True):
   """Calculate short time energy
   :param center: If `True`, the signal `y` is padded so that frame
@@ -25,17 +45,83 @@ def short_time_energy(signal_, window_size, stride, center=True):
   if center:
     signal_ = np.pad(signal_, window_size // 2, mode='reflect')
   # Reshape signal
-  signal_ = np.reshape(signal_, newshape=(-1,))
-  # Form causal matrix
-  frames = []
-  cursor = 0
-  while True:
-    frames.append(signal_[cursor : cursor + window_size])
-    # Move cursor forward
-    cursor += stride
-    if cursor + window_size > signal_.size: break
-  # Calculate energy
-  stack = np.stack(frames, axis=0)
-  energy = np.multiply(stack, stack)
-  energy = np.sum(energy, axis=1)
-  return energy
+  signal_ = np.reshape(signal_, (-1,))
+  # A signal shorter than window_size forms a single frame
+  if signal_.size < window_size: return np.sum(signal_ * signal_, keepdims=True)
+  # Calculate energy over frames without copying
+  frames = sliding_window(signal_, window_size, stride, as_view=True)
+  return np.einsum('ij,ij->i', frames, frames)
+
+
+if __name__ == '__main__':
+  import time
+  from tframe.data.sequences.signals.tf_signal import Signal
+  from tframe.data.sequences.signals.signal_set import SignalSet
+
+  # Reference implementations replaying the original loops
+  def causal_matrix_loop(x, D, skip_head):
+    N = x.size
+    x = np.append(np.zeros(shape=(D - 1,)), x)
+    matrix = np.zeros(shape=(N, D))
+    for i in range(N): matrix[i] = x[i:i+D]
+    return matrix[D - 1:] if skip_head else matrix
+
+  def short_time_energy_loop(signal_, window_size, stride, center=True):
+    if center: signal_ = np.pad(signal_, window_size // 2, mode='reflect')
+    signal_ = np.reshape(signal_, (-1,))
+    frames, cursor = [], 0
+    while True:
+      frames.append(signal_[cursor:cursor + window_size])
+      cursor += stride
+      if cursor + window_size > signal_.size: break
+    stack = np.stack(frames, axis=0)
+    return np.sum(stack * stack, axis=1)
+
+  def chop_loop(x, y, size, stride):
+    out_len = (len(x) - size) // stride + 1
+    x_out = np.zeros(shape=(out_len, size))
+    y_out = np.zeros(shape=(out_len, size, *y.shape[1:]))
+    for i in range(out_len):
+      x_out[i] = x[stride * i:stride * i + size]
+      y_out[i] = y[stride * i:stride * i + size]
+    return x_out, y_out
+
+  # Equivalence checks on random signals
+  rng = np.random.RandomState(0)
+  for trial in range(500):
+    n = rng.randint(2, 300)
+    x = rng.randn(n)
+    D = rng.randint(1, 20)
+    for skip_head in (True, False):
+      matrix = Signal(x, fs=1).causal_matrix(D, skip_head)
+      assert matrix.flags.writeable
+      assert np.allclose(matrix, causal_matrix_loop(x, D, skip_head))
+      assert np.allclose(Signal(x, fs=1).causal_matrix(D, skip_head, True),
+                         matrix)
+    w, s = rng.randint(1, n + 1), rng.randint(1, 12)
+    center = bool(rng.randint(2)) and w // 2 < n
+    assert np.allclose(short_time_energy(x, w, s, center),
+                       short_time_energy_loop(x, w, s, center))
+    if w >= s:
+      y = rng.randn(n, 2)
+      x_ref, y_ref = chop_loop(x, y, w, s)
+      for as_view in (False, True):
+        x_out, y_out = SignalSet.chop_with_stride(
+          x, y, w, s, rand_shift=False, as_view=as_view)
+        assert x_out.flags.writeable is not as_view
+        assert np.allclose(x_out, x_ref) and np.allclose(y_out, y_ref)
+  print('>> All checks passed')
+
+  # Benchmark on a 10M-sample synthetic signal. Chopped frames are taken as
+  # .. views since a copy would take 8GB
+  x = np.random.randn(10000000)
+  for name, f in (
+      ('short_time_energy', lambda: short_time_energy(x, 400, 160)),
+      ('causal_matrix', lambda: Signal(x, fs=1).causal_matrix(10)),
+      ('causal_matrix (view)', lambda: Signal(x, fs=1).causal_matrix(
+        10, as_view=True)),
+      ('chop_with_stride (view)', lambda: SignalSet.chop_with_stride(
+        x, x, 1000, 10, rand_shift=False, as_view=True))):
+    tic = time.time()
+    f()
+    print('>> {}: {:.3f} secs'.format(name, time.time() - tic))
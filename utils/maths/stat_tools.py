@@ -2,27 +2,63 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from .. import checker
+from tframe.utils import checker
 import numpy as np
 
 
 class Statistic(object):
+  """Keeps the latest `max_length` values (scalars or arrays of the same
+     shape) in a preallocated ring buffer.
+
+     Sum of values inside the window is updated on each record so that running
+     average is read in O(1). Sum of absolute values is calculated on demand
+     and cached until the next record. Sums are recalculated from the buffer
+     each time it wraps around to keep float errors from accumulating.
+
+     If `keep_var` is True, global mean and variance are updated using
+     Welford's algorithm. If `ema_decay` is provided, an exponential moving
+     average is kept as well.
+
+     If `reduce_1st_dim` is True, each value is regarded as a batch of shape
+     [batch_size, *dim] and statistics are taken over all rows.
+  """
   def __init__(self, max_length=None, keep_acc=True, keep_abs_acc=False,
-               reduce_1st_dim=False):
+               reduce_1st_dim=False, keep_var=False, ema_decay=None):
     if max_length is not None: checker.check_positive_integer(max_length)
     self._max_length = max_length
     self._keep_acc = checker.check_type(keep_acc, bool)
     self._keep_abs_acc = checker.check_type(keep_abs_acc, bool)
-    self._value_list = []
+    self._keep_var = checker.check_type(keep_var, bool)
+    self._ema_decay = ema_decay
+    if ema_decay is not None: assert 0 < ema_decay < 1
+    self._reduce_1st_dim = checker.check_type(reduce_1st_dim, bool)
+
+    self._last_value = None
     self._value_count = 0
     self._accumulator = 0
     self._abs_accumulator = 0
-    self._reduce_1st_dim = checker.check_type(reduce_1st_dim, bool)
+    # Welford's algorithm
+    self._mean = 0
+    self._m2 = 0
+    self._ema = None
+
+    # Ring buffer storing values (or row sums if reduce_1st_dim) and weights
+    # .. (number of rows each record contains). Absolute row sums are stored
+    # .. only if reduce_1st_dim
+    self._buffer = None
+    self._abs_buffer = None
+    self._weights = None
+    self._head = 0
+    self._length = 0
+    self._sum = 0
+    self._abs_sum = None
+    self._weight_sum = 0
+
+  # region : Properties
 
   @property
   def last_value(self):
-    if self._value_list: return self._value_list[-1]
-    else: return None
+    return self._last_value
 
   @property
   def average(self):
@@ -34,39 +70,212 @@ class Statistic(object):
     assert self._keep_abs_acc
     return 1.0 * self._abs_accumulator / self._value_count
 
+  @property
+  def variance(self):
+    assert self._keep_var
+    return self._m2 / self._value_count
+
+  @property
+  def ema(self):
+    assert self._ema_decay is not None
+    return self._ema
+
+  @property
+  def values(self):
+    """Values inside the window from the oldest to the latest"""
+    assert not self._reduce_1st_dim
+    return self._roll(self._buffer)
+
   @property
   def running_average(self):
-    values = self._value_list
-    if self._reduce_1st_dim: values = np.concatenate(values)
-    return np.average(values, axis=0)
+    return self._sum / self._weight_sum
 
   @property
   def running_abs_average(self):
-    values = self._value_list
-    if self._reduce_1st_dim: values = np.concatenate(values)
-    return np.average(np.abs(values), axis=0)
+    if self._abs_sum is None:
+      n = self._length
+      abs_values = (self._abs_buffer[:n] if self._reduce_1st_dim
+                    else np.abs(self._buffer[:n]))
+      self._abs_sum = np.sum(abs_values, axis=0)
+    return self._abs_sum / self._weight_sum
+
+  @property
+  def running_variance(self):
+    assert not self._reduce_1st_dim
+    return np.var(self._buffer[:self._length], axis=0)
+
+  # endregion : Properties
+
+  # region : Public Methods
 
   def record(self, value):
     # Check type
     assert np.isscalar(value) or isinstance(value, np.ndarray)
-    # Take down the new coming scalar
-    self._value_list.append(value)
-    if (self._max_length is not None and
-        len(self._value_list) > self._max_length):
-      self._value_list.pop(0)
-    # Update global statistic
+    self._last_value = value
     # (values with shape [batch_size, dim] should be treated carefully)
-    if not self._reduce_1st_dim:
-      self._value_count += 1
-      if self._keep_acc: self._accumulator += value
-      if self._keep_abs_acc: self._abs_accumulator += np.abs(value)
+    if self._reduce_1st_dim:
+      count = len(value)
+      value_sum = np.sum(value, axis=0)
+      abs_sum = np.sum(np.abs(value), axis=0)
     else:
-      self._value_count += len(value)
-      if self._keep_acc: self._accumulator += np.sum(value, axis=0)
-      if self._keep_abs_acc: self._accumulator += np.sum(np.abs(value), axis=0)
+      count, value_sum, abs_sum = 1, value, None
+    # Update global statistic
+    self._value_count += count
+    if self._keep_acc: self._accumulator += value_sum
+    if self._keep_abs_acc:
+      self._abs_accumulator += np.abs(value) if abs_sum is None else abs_sum
+    if self._keep_var: self._update_welford(value, count)
+    if self._ema_decay is not None:
+      mean = value_sum / count
+      if self._ema is None: self._ema = np.array(mean, dtype=np.float64)
+      else: self._ema += (1 - self._ema_decay) * (mean - self._ema)
+    # Take down the new coming value
+    self._push(value_sum, abs_sum, count)
 
   def set_max_length(self, val):
     checker.check_positive_integer(val)
     self._max_length = val
-    while len(self._value_list) > self._max_length: self._value_list.pop(0)
+    if self._buffer is not None:
+      self._resize(val, min(self._length, val))
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  def _push(self, value, abs_value, weight):
+    if self._buffer is None:
+      value = np.asarray(value)
+      dtype = value.dtype if value.dtype.kind == 'f' else np.float64
+      capacity = self._max_length or 16
+      self._buffer = np.zeros((capacity,) + value.shape, dtype=dtype)
+      if self._reduce_1st_dim: self._abs_buffer = np.zeros_like(self._buffer)
+      self._weights = np.zeros(capacity, dtype=np.int64)
+      self._sum = np.zeros(value.shape, dtype=dtype)
+    capacity = len(self._buffer)
+    # Grow buffer if max_length is not specified
+    if self._max_length is None and self._length == capacity:
+      self._resize(capacity * 2, self._length)
+      capacity = len(self._buffer)
+    # Evict the oldest value if buffer is full
+    i = self._head
+    if self._length == capacity:
+      self._sum -= self._buffer[i]
+      self._weight_sum -= self._weights[i]
+    else: self._length += 1
+    self._buffer[i] = value
+    if self._reduce_1st_dim: self._abs_buffer[i] = abs_value
+    self._weights[i] = weight
+    self._sum += self._buffer[i]
+    self._weight_sum += weight
+    self._abs_sum = None
+    self._head = (i + 1) % capacity
+    if self._head == 0: self._refresh_sums()
+
+  def _resize(self, capacity, length):
+    """Reallocate buffer keeping the latest `length` values"""
+    def resize(buffer):
+      if buffer is None: return None
+      resized = np.zeros((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+      resized[:length] = self._roll(buffer)[self._length - length:]
+      return resized
+    self._buffer, self._abs_buffer, self._weights = [
+      resize(b) for b in (self._buffer, self._abs_buffer, self._weights)]
+    self._length = length
+    self._head = length % capacity
+    self._refresh_sums()
+
+  def _refresh_sums(self):
+    n = self._length
+    self._sum = np.sum(self._buffer[:n], axis=0)
+    self._abs_sum = None
+    self._weight_sum = int(np.sum(self._weights[:n]))
+
+  def _roll(self, buffer):
+    """Return the filled part of buffer from the oldest to the latest"""
+    if self._length < len(buffer): return buffer[:self._length]
+    return np.concatenate([buffer[self._head:], buffer[:self._head]])
+
+  def _update_welford(self, value, count):
+    if self._reduce_1st_dim:
+      # Merge statistics of a batch (Chan et al.)
+      n = self._value_count
+      batch_mean = np.mean(value, axis=0)
+      delta = batch_mean - self._mean
+      self._mean = self._mean + delta * count / n
+      self._m2 = self._m2 + np.sum(
+        np.square(value - batch_mean), axis=0) + np.square(
+        delta) * count * (n - count) / n
+    else:
+      delta = value - self._mean
+      self._mean = self._mean + delta / self._value_count
+      self._m2 = self._m2 + delta * (value - self._mean)
+
+  # endregion : Private Methods
+
+
+if __name__ == '__main__':
+  import time
+
+  class ListStatistic(object):
+    """Statistic before ring buffer was introduced, used as reference"""
+    def __init__(self, max_length):
+      self.max_length, self.values = max_length, []
+      self.accumulator, self.abs_accumulator = 0, 0
+    def record(self, value):
+      self.values.append(value)
+      if len(self.values) > self.max_length: self.values.pop(0)
+      self.accumulator += value
+      self.abs_accumulator += np.abs(value)
+    @property
+    def running_average(self): return np.average(self.values, axis=0)
+    @property
+    def running_abs_average(self):
+      return np.average(np.abs(self.values), axis=0)
+
+  # Equivalence check
+  rng = np.random.RandomState(0)
+  for shape in ((), (3, 4)):
+    s, r = Statistic(max_length=20, keep_var=True), ListStatistic(20)
+    for _ in range(137):
+      v = rng.randn(*shape)
+      s.record(v)
+      r.record(v)
+      assert np.allclose(s.running_average, r.running_average)
+      assert np.allclose(s.running_abs_average, r.running_abs_average)
+    assert np.allclose(s.values, r.values)
+  s = Statistic(max_length=5, reduce_1st_dim=True, keep_abs_acc=True,
+                keep_var=True)
+  batches = [rng.randn(rng.randint(1, 6), 3) for _ in range(12)]
+  for b in batches: s.record(b)
+  rows = np.concatenate(batches)
+  assert np.allclose(s.running_average, np.mean(
+    np.concatenate(batches[-5:]), axis=0))
+  assert np.allclose(s.running_abs_average, np.mean(
+    np.abs(np.concatenate(batches[-5:])), axis=0))
+  assert np.allclose(s.variance, np.var(rows, axis=0))
+  assert np.allclose(s.abs_average, np.mean(np.abs(rows), axis=0))
+  s.set_max_length(3)
+  assert np.allclose(s.running_average, np.mean(
+    np.concatenate(batches[-3:]), axis=0))
+  s = Statistic(keep_var=True, ema_decay=0.9)
+  for v in rows[:, 0]: s.record(v)
+  assert np.allclose(s.running_average, np.mean(rows[:, 0]))
+  assert np.allclose(s.variance, np.var(rows[:, 0]))
+  print('>> Ring buffer statistics agree with reference')
 
+  # Benchmark: 200 monitored gradients, running averages read every 10 steps
+  shapes = [(64, 64), (128, 128), (256,), (32, 256)] * 50
+  grads = [rng.randn(*shape).astype(np.float32) for shape in shapes]
+  for name, make, cycle in (
+      ('List', lambda: ListStatistic(20), 1),
+      ('Ring', lambda: Statistic(max_length=20, keep_abs_acc=True), 1),
+      ('Ring, grads recorded every 5 steps',
+       lambda: Statistic(max_length=20, keep_abs_acc=True), 5)):
+    stats = [make() for _ in shapes]
+    tic = time.time()
+    for step in range(100):
+      if step % cycle == 0:
+        for s, g in zip(stats, grads): s.record(g)
+      if step % 10 == 9:
+        for s in stats: _, _ = s.running_average, s.running_abs_average
+    print('>> {}: {:.2f} ms per step'.format(name, (time.time() - tic) * 10))
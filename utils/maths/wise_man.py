@@ -10,53 +10,55 @@ def apportion(length_list, batch_size):
      in customized gen_rnn_batches method of FI-2010 data set.
   :param length_list: a list containing lengths. e.g. structure of a SequenceSet
   :param batch_size: an non-negative integer
-  :return: a list of batches for each sequence, sum of which equals to
+  :return: an array of batches for each sequence, sum of which equals to
            the specified batch_size.
   """
-  L = int(sum(length_list) / batch_size)
-  if L > min(length_list):
+  lengths = np.asarray(length_list)
+  L = int(np.sum(lengths) / batch_size)
+  if L > np.min(lengths):
     raise ValueError('L ({}) must be less than minimum sequence '
-                     'length ({})'.format(L, min(length_list)))
-  batches_dec = [length / L for length in length_list]
-  batches = [int(np.round(b)) for b in batches_dec]
-  extra_dec = [b - bd for b, bd in zip(batches, batches_dec)]
+                     'length ({})'.format(L, np.min(lengths)))
+  batches_dec = lengths / L
+  batches = np.round(batches_dec).astype(int)
+  extra_dec = batches - batches_dec
   extra_rank = np.argsort(extra_dec)
 
-  lack = batch_size - sum(batches)
-  assert lack < len(length_list)
+  lack = batch_size - np.sum(batches)
+  assert lack < len(lengths)
   if lack > 0:
     # If sub-sequences are not enough, fill batches with ones with least
     #   extra_dec
-    for i in extra_rank[:lack]: batches[i] += 1
+    batches[extra_rank[:lack]] += 1
   elif lack < 0:
     # If the total number of sub-sequences to sample is more than batch_size,
     #   remove those with least lack values
-    for i in extra_rank[lack:]: batches[i] -= 1
+    batches[extra_rank[lack:]] -= 1
 
   # Check and return
-  assert sum(batches) == batch_size and len(batches) == len(length_list)
+  assert np.sum(batches) == batch_size and len(batches) == len(lengths)
   return batches
 
 
 def spread(length, N, L, radius=0):
   """Generate the start indices of N sub-sequences of length L sampled from a
-     sequence of given `length`.
+     sequence of given `length`. Starts of all sections are drawn before
+     random shifts. N can be 0, in which case an empty array is returned.
   """
-  bound = lambda i: min(max(0, i), length - L)
+  if N == 0: return np.zeros([0], dtype=int)
   # Divide the sequence
   SL = int(length / N)
-  section_indices = [[i * SL, (i + 1) * SL] for i in range(N)]
-  section_indices[-1][-1] = length
-  start_indices = []
-  for start_i, end_i in section_indices:
-    sl = end_i - start_i
-    if L <= sl: index = np.random.randint(start_i, end_i - L + 1)
-    else: index = np.random.randint(end_i - L, start_i + 1)
-    index = bound(index)
-    if radius > 0: index = bound(index + np.random.randint(-radius, radius))
-    start_indices.append(index)
+  start_i = np.arange(N) * SL
+  end_i = start_i + SL
+  end_i[-1] = length
+  # Sample an index from each section
+  fits = L <= end_i - start_i
+  low = np.where(fits, start_i, end_i - L)
+  high = np.where(fits, end_i - L, start_i) + 1
+  start_indices = np.clip(np.random.randint(low, high), 0, length - L)
+  if radius > 0:
+    shifts = np.random.randint(-radius, radius, size=N)
+    start_indices = np.clip(start_indices + shifts, 0, length - L)
 
   # Sanity check and return
   assert len(start_indices) == N
   return start_indices
-
@@ -162,8 +162,8 @@ class Monitor(object):
     self._grad_ops = tf.gradients(loss, self._weights_list)
 
   def record_grads(self, grads):
-    """This method will be only called in train.update_model.
-       Gradient statistics will be recorded.
+    """This method will be only called in train.update_model every
+       `monitor_grad_cycle` steps. Gradient statistics will be recorded.
     """
     assert isinstance(grads, list) and len(grads) == len(self._weights_list)
     for w, g in zip(self._weights_list, grads):
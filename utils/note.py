@@ -2,10 +2,14 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+import copy
 import pickle
 import numpy as np
 from collections import OrderedDict
 
+from tframe.utils.tensor_store import TensorStore
+
 
 class Note(object):
   """A Note is held be an agent"""
@@ -16,10 +20,14 @@ class Note(object):
     self._steps = []
     self._scalars = OrderedDict()
     self._tensors = OrderedDict()
+    # If set, tensors are streamed to this store instead of self._tensors
+    self._tensor_store = None
 
     # Configurations and criteria for SUMMARY VIEWER
     self._configs = OrderedDict()
     self._criteria = OrderedDict()
+    # Key of the sweep job in which this note is taken
+    self._job_key = None
 
   # region : Properties
 
@@ -38,8 +46,14 @@ class Note(object):
       sd[k] = np.array(v)
     return sd
 
+  @property
+  def tensor_store(self):
+    # Notes pickled before tensor store was introduced do not have this
+    return getattr(self, '_tensor_store', None)
+
   @property
   def tensor_dict(self):
+    if self.tensor_store is not None: return self.tensor_store.tensor_dict
     td = OrderedDict()
     for k, v in self._tensors.items():
       if isinstance(v, dict) and len(v) == 0: continue
@@ -53,6 +67,8 @@ class Note(object):
   @property
   def has_history(self):
     if getattr(self, '_tensors', None) is None: return False
+    if self.tensor_store is not None and self.tensor_store.size > 0:
+      return True
     return len(self._tensors) > 0 or len(self._scalars) > 0
 
   @property
@@ -65,12 +81,22 @@ class Note(object):
     assert isinstance(self._criteria, dict)
     return self._criteria
 
+  @property
+  def job_key(self):
+    # Notes pickled before job key was introduced do not have this
+    return getattr(self, '_job_key', None)
+
   # endregion : For SummaryViewer
 
   @property
   def content(self):
     return '\n'.join(self._lines)
 
+  @property
+  def tensor_store_relpath(self):
+    """Path of tensor store relative to the file this note is kept in"""
+    return getattr(self, '_tensor_store_relpath', None)
+
   @property
   def tensor_free(self):
     note = Note()
@@ -79,6 +105,7 @@ class Note(object):
     note._scalars = self._scalars
     note._configs = self._configs
     note._criteria = self._criteria
+    note._job_key = self.job_key
     return note
 
   # endregion : Properties
@@ -87,6 +114,11 @@ class Note(object):
 
   # region : For TensorViewer
 
+  def set_tensor_store(self, store):
+    """Stream tensors taken down afterwards to the given store"""
+    assert isinstance(store, TensorStore) and len(self._tensors) == 0
+    self._tensor_store = store
+
   def take_down_scalars_and_tensors(self, step, scalars, tensors=None):
     assert isinstance(scalars, dict) and isinstance(tensors, dict)
     # Take down step
@@ -94,8 +126,10 @@ class Note(object):
     # Take down scalars
     self._append_to_dict(self._scalars, scalars)
     # Take down parameters
-    if tensors is not None:
-      self._append_to_dict(self._tensors, tensors)
+    if tensors is None: return
+    if self.tensor_store is not None:
+      self.tensor_store.append(len(self._steps) - 1, step, tensors)
+    else: self._append_to_dict(self._tensors, tensors)
 
   # endregion : For TensorViewer
 
@@ -109,6 +143,10 @@ class Note(object):
     assert isinstance(name, str) and np.isscalar(value)
     self._criteria[name] = value
 
+  def put_down_job_key(self, key):
+    assert isinstance(key, str)
+    self._job_key = key
+
   # endregion : For SummaryViewer
 
   def write_line(self, line):
@@ -120,10 +158,36 @@ class Note(object):
     with open(file_name, 'wb') as f:
       pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
 
+  def anchored_to(self, file_name):
+    """Return a shallow copy of this note remembering where its tensor store
+       is relative to `file_name`, in which the copy is going to be kept"""
+    note = copy.copy(self)
+    if self.tensor_store is not None:
+      note._tensor_store_relpath = os.path.relpath(
+        self.tensor_store.path, os.path.dirname(os.path.abspath(file_name)))
+    return note
+
+  def relocate_tensor_store(self, file_name):
+    """Look for tensor store which has been moved along with `file_name`,
+       the .note or .sum file from which this note is loaded"""
+    store = self.tensor_store
+    if store is None or os.path.exists(store.path): return
+    directory = os.path.dirname(os.path.abspath(file_name))
+    candidates = [os.path.join(directory, os.path.basename(store.path))]
+    if self.tensor_store_relpath is not None:
+      candidates.insert(0, os.path.normpath(
+        os.path.join(directory, self.tensor_store_relpath)))
+    for path in candidates:
+      if not os.path.exists(path): continue
+      self._tensor_store = TensorStore(path, store.chunk_size, store.compress)
+      return
+
   @staticmethod
   def load(file_name):
     with open(file_name, 'rb') as f:
-      return pickle.load(f)
+      note = pickle.load(f)
+    note.relocate_tensor_store(file_name)
+    return note
 
   # endregion : Public Methods
 
@@ -158,5 +222,9 @@ class Note(object):
     l = len(self._steps)
     self._check_dict(self._scalars, l)
     self._check_dict(self._tensors, l)
+    if self.tensor_store is not None:
+      self.tensor_store.flush()
+      for name in self.tensor_store.names:
+        assert self.tensor_store.length_of(name) == l
 
   # endregion : Private Methods
@@ -0,0 +1,290 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import pickle
+import struct
+from contextlib import contextmanager
+
+from tframe import console
+from tframe.utils.note import Note
+
+try: import fcntl
+except ImportError: fcntl = None
+
+
+@contextmanager
+def locked(lock_path):
+  """Hold an exclusive lock on `lock_path` across processes. Locking is not
+     available on Windows thus does nothing there"""
+  with open(lock_path, 'a') as f:
+    if fcntl is not None: fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try: yield
+    finally:
+      if fcntl is not None: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class NoteStore(object):
+  """Append-only store of gathered notes.
+
+     A store `xxx.sum` is a single file beginning with MAGIC followed by
+     records, each of which is a pickled note prefixed with its length.
+     Notes are appended under an exclusive file lock so that concurrent
+     jobs gathering to the same store never overwrite each other. A record
+     left incomplete by a crashed writer is ignored by readers and dropped
+     on compaction.
+
+     An index file `xxx.sum.idx` holds one json line per record containing
+     its offset, length, stringified configs and criteria, so that notes can
+     be looked up by configuration without unpickling them. The index is
+     rebuilt from the records if it is missing or falls behind.
+
+     Legacy summaries (a pickled list of notes) remain readable via
+     `load_notes` and are converted in place on the first append.
+  """
+  MAGIC = b'TFNOTES\x01'
+  INDEX_EXTENSION = 'idx'
+  _HEAD = struct.Struct('<Q')
+
+  def __init__(self, path):
+    assert isinstance(path, str)
+    self.path = path
+
+  # region : Properties
+
+  @property
+  def index_path(self):
+    return '{}.{}'.format(self.path, self.INDEX_EXTENSION)
+
+  @property
+  def lock_path(self):
+    return '{}.lock'.format(self.path)
+
+  @property
+  def entries(self):
+    """Index entries of all complete records"""
+    if not os.path.exists(self.path): return []
+    entries, missing = self._read_index(os.path.getsize(self.path))
+    return entries + missing
+
+  # endregion : Properties
+
+  # region : Public Methods
+
+  def append(self, note):
+    """Append a note to store and return the number of notes in it"""
+    payload = pickle.dumps(note, pickle.HIGHEST_PROTOCOL)
+    with self._locked():
+      if os.path.exists(self.path) and os.path.getsize(self.path) > 0 and (
+          not self.is_store(self.path)): self.import_summary(self.path)
+      with open(self.path, 'ab') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+          f.write(self.MAGIC)
+          end = len(self.MAGIC)
+        entries = self._sync_index(end)
+        # A torn record left by a crashed writer is overwritten
+        offset = self._end_of(entries)
+        if offset < end: f.truncate(offset)
+        f.write(self._HEAD.pack(len(payload)) + payload)
+        f.flush()
+        os.fsync(f.fileno())
+      entry = self._make_entry(note, offset, len(payload))
+      with open(self.index_path, 'a') as f: f.write(json.dumps(entry) + '\n')
+    return len(entries) + 1
+
+  def find(self, configs):
+    """Return indices of notes whose configs match the given dictionary.
+       Values are compared as strings"""
+    configs = {k: str(v) for k, v in configs.items()}
+    return [i for i, entry in enumerate(self.entries) if all(
+      [entry['configs'].get(k, str(None)) == v for k, v in configs.items()])]
+
+  def load(self, indices=None):
+    """Load notes with given indices (all notes by default)"""
+    entries = self.entries
+    if indices is not None: entries = [entries[i] for i in indices]
+    return list(self.iterate(entries))
+
+  def iterate(self, entries):
+    """Yield notes of given index entries one by one"""
+    with open(self.path, 'rb') as f:
+      for entry in entries: yield self._read_record(f, entry)
+
+  def read(self, offset, length):
+    """Read a single note given its offset and length"""
+    with open(self.path, 'rb') as f:
+      return self._read_record(f, {'offset': offset, 'length': length})
+
+  def read_since(self, offset=0):
+    """Read notes appended after `offset`. Return the notes and the offset
+       from which the next read should start. Offsets are invalidated by
+       compaction"""
+    entries = [e for e in self.entries if e['offset'] >= offset]
+    if len(entries) == 0: return [], offset
+    return list(self.iterate(entries)), self._end_of(entries)
+
+  def compact(self, keep=None):
+    """Rewrite the store with complete records only.
+    :param keep: a callable taking a note and returning whether to keep it
+    :return: number of notes removed
+    """
+    with self._locked():
+      notes = self.load()
+      kept = notes if keep is None else [n for n in notes if keep(n)]
+      self.write(self.path, kept)
+    return len(notes) - len(kept)
+
+  # endregion : Public Methods
+
+  # region : Class Methods
+
+  @classmethod
+  def is_store(cls, path):
+    with open(path, 'rb') as f: return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+  @classmethod
+  def load_notes(cls, path):
+    """Load a list of notes from a store or a legacy summary file"""
+    if cls.is_store(path): return cls(path).load()
+    with open(path, 'rb') as f: notes = pickle.load(f)
+    assert isinstance(notes, list)
+    for note in notes:
+      if isinstance(note, Note): note.relocate_tensor_store(path)
+    return notes
+
+  @classmethod
+  def load_configs(cls, path):
+    """Load stringified configs of all notes in a store or a legacy summary
+       file. Notes in a store are not unpickled"""
+    if cls.is_store(path): return [e['configs'] for e in cls(path).entries]
+    return [{k: str(v) for k, v in note.configs.items()}
+            for note in cls.load_notes(path)]
+
+  @classmethod
+  def load_job_keys(cls, path):
+    """Load sweep job keys of all notes in a store or a legacy summary file.
+       Notes without a job key yield None"""
+    if cls.is_store(path):
+      return [e.get('job_key', None) for e in cls(path).entries]
+    return [note.job_key for note in cls.load_notes(path)]
+
+  @classmethod
+  def write(cls, path, notes):
+    """Write notes to a new store at `path` atomically"""
+    tmp_path = path + '.tmp'
+    entries = []
+    with open(tmp_path, 'wb') as f:
+      f.write(cls.MAGIC)
+      for note in notes:
+        payload = pickle.dumps(note, pickle.HIGHEST_PROTOCOL)
+        entries.append(cls._make_entry(note, f.tell(), len(payload)))
+        f.write(cls._HEAD.pack(len(payload)) + payload)
+    store = cls(path)
+    with open(store.index_path + '.tmp', 'w') as f:
+      for entry in entries: f.write(json.dumps(entry) + '\n')
+    # Index is replaced first since a stale index is repaired from records
+    os.replace(store.index_path + '.tmp', store.index_path)
+    os.replace(tmp_path, path)
+    return store
+
+  @classmethod
+  def import_summary(cls, sum_path, path=None):
+    """Convert a legacy summary file to a store"""
+    if path is None: path = sum_path
+    notes = cls.load_notes(sum_path)
+    cls.write(path, notes)
+    console.show_status('{} notes imported from `{}` to `{}`'.format(
+      len(notes), sum_path, path))
+    return cls(path)
+
+  # endregion : Class Methods
+
+  # region : Private Methods
+
+  def _locked(self):
+    # A separate lock file is used since the store may be replaced during
+    # .. compaction
+    return locked(self.lock_path)
+
+  @classmethod
+  def _make_entry(cls, note, offset, length):
+    criteria = {}
+    for k, v in note.criteria.items():
+      try: criteria[k] = float(v)
+      except (TypeError, ValueError): criteria[k] = str(v)
+    return {'offset': offset, 'length': length,
+            'configs': {k: str(v) for k, v in note.configs.items()},
+            'criteria': criteria, 'job_key': note.job_key}
+
+  def _end_of(self, entries):
+    if len(entries) == 0: return len(self.MAGIC)
+    return entries[-1]['offset'] + self._HEAD.size + entries[-1]['length']
+
+  def _read_index(self, size):
+    """Read index entries of records within `size` bytes, and recover those
+       of records not indexed yet"""
+    entries = []
+    if os.path.exists(self.index_path):
+      with open(self.index_path, 'r') as f:
+        for line in f:
+          # The last line may be incomplete
+          try: entries.append(json.loads(line))
+          except ValueError: break
+    # Drop entries beyond data (e.g., store is being rewritten)
+    while len(entries) > 0 and self._end_of(entries) > size: entries.pop()
+    return entries, self._scan(self._end_of(entries), size)
+
+  def _scan(self, offset, size):
+    entries = []
+    with open(self.path, 'rb') as f:
+      while offset + self._HEAD.size <= size:
+        f.seek(offset)
+        length = self._HEAD.unpack(f.read(self._HEAD.size))[0]
+        if offset + self._HEAD.size + length > size: break
+        note = pickle.loads(f.read(length))
+        entries.append(self._make_entry(note, offset, length))
+        offset += self._HEAD.size + length
+    return entries
+
+  def _sync_index(self, size):
+    """Make sure the index file covers exactly all complete records. Should
+       be called with the store locked"""
+    entries, missing = self._read_index(size)
+    entries += missing
+    with open(self.index_path, 'a+') as f:
+      f.seek(0)
+      if f.read() != ''.join([json.dumps(e) + '\n' for e in entries]):
+        f.seek(0)
+        f.truncate()
+        for entry in entries: f.write(json.dumps(entry) + '\n')
+    return entries
+
+  def _read_record(self, f, entry):
+    f.seek(entry['offset'] + self._HEAD.size)
+    return self._relocate(pickle.loads(f.read(entry['length'])))
+
+  def _relocate(self, note):
+    # Tensor stores are resolved relative to this file as well
+    if isinstance(note, Note): note.relocate_tensor_store(self.path)
+    return note
+
+  # endregion : Private Methods
+
+
+if __name__ == '__main__':
+  import sys
+
+  # Usage:
+  #   python note_store.py compact path/to/gather.sum
+  #   python note_store.py import path/to/legacy.sum [path/to/store.sum]
+  command, path = sys.argv[1:3]
+  if command == 'compact':
+    if not NoteStore.is_store(path): NoteStore.import_summary(path)
+    else: console.show_status('{} records removed'.format(
+      NoteStore(path).compact()))
+  elif command == 'import':
+    NoteStore.import_summary(path, *sys.argv[3:4])
+  else: raise ValueError('!! Unknown command `{}`'.format(command))
@@ -11,6 +11,7 @@ from tframe import checker
 from tframe import console
 from tframe.utils.local import re_find_single
 from tframe.utils.misc import date_string
+from tframe.utils.job_scheduler import JobScheduler
 from tframe.configs.flag import Flag
 from tframe.trainers import SmartTrainerHub
 
@@ -65,6 +66,7 @@ class Helper(object):
     # System argv info
     self.sys_keys = []
     self._sys_runs = None
+    self._sys_workers = None
     self._add_script_suffix = None
     self._register_sys_argv()
 
@@ -119,16 +121,54 @@ class Helper(object):
   def set_python_cmd_suffix(self, suffix='3'):
     self._python_cmd = 'python{}'.format(suffix)
 
-  def run(self, times=1, save=False, mark=''):
+  def run(self, times=1, save=False, mark='', workers=1, gpu_ids=None,
+          cpus_per_job=1, queue_file=None, log_dir='sweep_logs',
+          summ_path=None):
+    """Run all configurations. If workers > 1, or gpu_ids/queue_file is
+       provided, configurations will be scheduled by a JobScheduler
+    :param workers: maximum number of concurrent jobs
+    :param gpu_ids: a list of GPU ids, each job takes one from the pool
+    :param cpus_per_job: CPU slots taken by each job
+    :param queue_file: path of a file recording the status of each job,
+                       used for resuming an interrupted sweep
+    :param log_dir: directory for stdout/stderr of each job
+    :param summ_path: path of the gathered summary (.sum) file, jobs whose
+                      configs can be found in it will be skipped
+    """
     if self._sys_runs is not None:
       times = checker.check_positive_integer(self._sys_runs)
       console.show_status('Run # set to {}'.format(times))
+    if self._sys_workers is not None:
+      workers = checker.check_positive_integer(self._sys_workers)
+      console.show_status('Worker # set to {}'.format(workers))
     # Set the corresponding flags if save
     if save:
       self.common_parameters['save_model'] = True
     # Show parameters
     self._show_parameters()
-    # Begin iteration
+
+    if workers == 1 and gpu_ids is None and queue_file is None:
+      for run_id, _, params_list in self._gen_jobs(times, save, mark):
+        console.show_status(
+          'Loading task ...', '[Run {}/{}]'.format(run_id + 1, times))
+        call([self._python_cmd, self.module_name] + params_list)
+        # call(self.command_head + params_list)
+        print()
+      return
+
+    scheduler = JobScheduler(
+      self._python_cmd, self.module_name, workers, gpu_ids, cpus_per_job,
+      queue_file, log_dir, summ_path)
+    for run_id, hyper_dict, params_list in self._gen_jobs(times, save, mark):
+      scheduler.add(params_list, hyper_dict, run_id)
+    scheduler.run()
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  def _gen_jobs(self, times, save, mark):
+    """Generate (run_id, hyper_dict, params_list) for each job"""
     counter = 0
     for run_id in range(times):
       history = []
@@ -147,15 +187,7 @@ class Helper(object):
         params_string = ' '.join(params_list)
         if params_string in history: continue
         history.append(params_string)
-        console.show_status(
-          'Loading task ...', '[Run {}/{}]'.format(run_id + 1, times))
-        call([self._python_cmd, self.module_name] + params_list)
-        # call(self.command_head + params_list)
-        print()
-
-  # endregion : Public Methods
-
-  # region : Private Methods
+        yield run_id, OrderedDict(hyper_dict), params_list
 
   @staticmethod
   def _show_flag_if_necessary(flag_name, value):
@@ -257,6 +289,10 @@ class Helper(object):
         assert len(val_list) == 1
         self._sys_runs = checker.check_positive_integer(int(val_list[0]))
         continue
+      if k == 'workers':
+        assert len(val_list) == 1
+        self._sys_workers = checker.check_positive_integer(int(val_list[0]))
+        continue
       if k in ('save', 'brand'):
         assert len(val_list) == 1
         option = val_list[0]
@@ -6,6 +6,8 @@ import re
 import tkinter as tk
 import tkinter.ttk as ttk
 
+import numpy as np
+
 from collections import OrderedDict
 from .base_control import BaseControl
 from . import main_frame as centre
@@ -251,7 +253,7 @@ class ConfigPanel(BaseControl):
     self.active_dict = OrderedDict()
     self.inactive_dict = OrderedDict()
 
-    # Buffers for faster sorting
+    # Buffers for faster sorting, indices of notes are buffered
     self._candidates = None
     self._groups = None
     self._sorted_hyper = None
@@ -273,22 +275,24 @@ class ConfigPanel(BaseControl):
     return self._sorted_hyper
   
   @property
-  def qualified_notes(self):
+  def qualified_rows(self):
+    """Indices of notes possessing all active configs"""
     if self._candidates is not None: return self._candidates
-    flag_of_interest = set(self.active_config_dict.keys())
-    self._candidates = [
-      note for note in self.context.notes
-      if set(note.configs.keys()).issuperset(flag_of_interest)]
+    index = self.context.index
+    self._candidates = np.flatnonzero(
+      index.has_configs(self.active_config_dict.keys()))
     return self._candidates
 
+  @property
+  def qualified_notes(self):
+    return [self.context.notes[i] for i in self.qualified_rows]
+
   @property
   def groups(self):
+    """Indices of qualified notes grouped by hyper-parameters"""
     if self._groups is not None: return self._groups
-    self._groups = OrderedDict()
-    for note in self.qualified_notes:
-      key = self._get_config_tuple(note)
-      if key not in self._groups.keys(): self._groups[key] = []
-      self._groups[key].append(note)
+    self._groups = self.context.index.group(
+      self.qualified_rows, self.sorted_hyper_list)
     return self._groups
 
   @property
@@ -304,9 +308,14 @@ class ConfigPanel(BaseControl):
       return tuple([v for k, v in self.groups.items()
                     if set(k).issuperset(fixed_config_set)])
 
+  @property
+  def matched_rows(self):
+    return self.groups.get(
+      self._get_config_tuple(), np.zeros(0, dtype=np.int64))
+
   @property
   def matched_notes(self):
-    return self.groups.get(self._get_config_tuple(), [])
+    return [self.context.notes[i] for i in self.matched_rows]
     # return self._filter(self.qualified_notes, self.active_config_dict)
 
   @property
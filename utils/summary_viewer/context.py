@@ -3,9 +3,10 @@ from __future__ import division
 from __future__ import print_function
 
 import re
-import pickle
 from collections import OrderedDict
 from tframe.utils.note import Note
+from tframe.utils.note_store import NoteStore
+from tframe.utils.summary_viewer.note_index import NoteIndex, LazyNote
 
 
 class Context(object):
@@ -20,6 +21,9 @@ class Context(object):
                flags_to_ignore=()):
     self.summary_file_path = None
     self.notes = []
+    # Configs and criteria of notes are read from index
+    self.index = NoteIndex()
+    self._legacy_notes = None
 
     self.active_flag_set = set()
     self.inactive_flag_set = set()
@@ -66,11 +70,9 @@ class Context(object):
   def set_notes_by_path(self, summ_file_path):
     # Sanity check
     assert isinstance(summ_file_path, str)
-    # Try to load note file
+    # Try to load note index
     try:
-      with open(summ_file_path, 'rb') as f:
-        self.notes = pickle.load(f)
-      assert isinstance(self.notes, list)
+      self._set_index(summ_file_path)
       self.summary_file_path = summ_file_path
     except:
       print('!! Failed to load {}'.format(summ_file_path))
@@ -86,9 +88,10 @@ class Context(object):
     if not isinstance(self.summary_file_path, str): return
     pre_length = len(self.notes)
     try:
-      with open(self.summary_file_path, 'rb') as f:
-        self.notes = pickle.load(f)
-      assert isinstance(self.notes, list)
+      # Only notes appended to a note store since last loading are read
+      self._set_index(self.summary_file_path)
+      for key in self.index.codes.keys():
+        self.index.map_values(key, self._convert_flag_value)
     except:
       print('!! Failed to reload {}'.format(self.summary_file_path))
       return
@@ -103,21 +106,27 @@ class Context(object):
 
   # region : Private Methods
 
-  def _get_intersection_and_union(self, dict_attr):
-    intersection, union = set(), set()
-    for i, note in enumerate(self.notes):
-      # Get the specific dictionary attribute of note
-      attr = getattr(note, dict_attr)
-      assert isinstance(attr, dict)
-      keys = attr.keys()
-      # Update intersection and union
-      if i == 0:
-        intersection, union = set(keys), set(keys)
-      else:
-        key_set = set(attr.keys())
-        intersection.intersection_update(key_set)
-        union.update(key_set)
+  def _set_index(self, summ_file_path):
+    self.index = NoteIndex.open(summ_file_path)
+    self._legacy_notes = None
+    self.notes = [LazyNote(self.index, i, self._load_note)
+                  for i in range(self.index.size)]
+
+  def _load_note(self, row):
+    if self.index.size == len(self.index.offsets):
+      return NoteStore(self.summary_file_path).read(
+        self.index.offsets[row], self.index.lengths[row])
+    # Notes in legacy summary file can only be loaded all together
+    if self._legacy_notes is None:
+      self._legacy_notes = NoteStore.load_notes(self.summary_file_path)
+    return self._legacy_notes[row]
 
+  def _get_intersection_and_union(self, dict_attr):
+    if dict_attr == 'configs':
+      columns, has = self.index.codes, self.index.has_configs
+    else: columns, has = self.index.criteria, self.index.has_criteria
+    union = set(columns.keys())
+    intersection = set([k for k in union if has([k]).all()])
     return intersection, union
 
   def _init_flags(self):
@@ -131,35 +140,10 @@ class Context(object):
     self.inactive_flag_set = union - self.active_flag_set
 
     def get_flag_values(k):
-      values = set()
-      for note in self.notes:
-        if k in note.configs.keys():
-          value = note.configs[k]
-          # For type value
-          if isinstance(value, type):
-            value = str(value)
-            m = re.match(r"<class '([\w]+.)+([\w]+)'>", value)
-            if m is not None: value = m.group(1)
-            # Set string value back to note
-            note.configs[k] = value
-          # For list value
-          if isinstance(value, list):
-            value = tuple(value)
-            note.configs[k] = value
-          # TODO: for values if str(value) is too long
-          if not isinstance(value, str) and len(str(value)) > 15:
-            # For float value
-            if isinstance(value, float):
-              value = '{:.2f}'.format(value)
-              note.configs[k] = value
-            else:
-              m = re.match(r"<class '([\w]+.)+([\w]+)'>", str(type(value)))
-              if m is not None:
-                value = m.group(1)
-                note.configs[k] = value
-          values.add(value)
+      # Values are converted in the index and thus also in notes
+      self.index.map_values(k, self._convert_flag_value)
+      values = list(self.index.values[k])
       assert len(values) > 0
-      values = list(values)
 
       # TODO: workaround for avoiding sort stuff like (None, 4)
       try: values.sort()
@@ -181,6 +165,24 @@ class Context(object):
       set(self.default_inactive_criteria))
     self.inactive_criteria_set = union - self.active_criteria_set
 
+  @staticmethod
+  def _convert_flag_value(value):
+    # For type value
+    if isinstance(value, type):
+      value = str(value)
+      m = re.match(r"<class '([\w]+.)+([\w]+)'>", value)
+      if m is not None: value = m.group(1)
+    # For list value
+    if isinstance(value, list): value = tuple(value)
+    # TODO: for values if str(value) is too long
+    if not isinstance(value, str) and len(str(value)) > 15:
+      # For float value
+      if isinstance(value, float): value = '{:.2f}'.format(value)
+      else:
+        m = re.match(r"<class '([\w]+.)+([\w]+)'>", str(type(value)))
+        if m is not None: value = m.group(1)
+    return value
+
   @staticmethod
   def _set2list(s, reverse=False):
     l = list(s)
@@ -252,7 +252,7 @@ class CriteriaPanel(BaseControl):
     self.hidden_dict = OrderedDict()
 
     # Buffers for faster sorting
-    self._candidates_set = None
+    self._criteria_mask = None
     self._notes_buffer = None
     self.button_stamp = None
 
@@ -260,14 +260,20 @@ class CriteriaPanel(BaseControl):
 
   @property
   def groups_for_sorting(self):
-    groups = [self.criteria_filter(note_list)
-              for note_list in self.config_panel.selected_group_values]
+    groups = [self.criteria_filter(rows)
+              for rows in self.config_panel.selected_group_values]
     return [g for g in groups if len(g) > 0]
 
+  @property
+  def num_groups_for_sorting(self):
+    mask = self.active_criteria_mask
+    return len([rows for rows in self.config_panel.selected_group_values
+                if mask[rows].any()])
+
   @property
   def notes_buffer(self):
     if self._notes_buffer is None:
-      self._notes_buffer = self.criteria_filter(self.config_panel.matched_notes)
+      self._notes_buffer = self.criteria_filter(self.config_panel.matched_rows)
     return self._notes_buffer
 
   @notes_buffer.setter
@@ -276,14 +282,12 @@ class CriteriaPanel(BaseControl):
     self._notes_buffer = val
 
   @property
-  def notes_with_active_criteria(self):
-    if self._candidates_set is None:
-      self._candidates_set = set([
-        note for note in self.context.notes
-        if set(note.criteria.keys()).issuperset(
-          self.context.active_criteria_set)
-      ])
-    return self._candidates_set
+  def active_criteria_mask(self):
+    """Mask of notes possessing all active criteria"""
+    if self._criteria_mask is None:
+      self._criteria_mask = self.context.index.has_criteria(
+        self.context.active_criteria_set)
+    return self._criteria_mask
 
   @property
   def minimum_height(self):
@@ -345,7 +349,7 @@ class CriteriaPanel(BaseControl):
       self.hidden_dict[k].load_to_master()
 
   def refresh(self):
-    min_max_btn_enabled = len(self.groups_for_sorting) > 0
+    min_max_btn_enabled = self.num_groups_for_sorting > 0
     self._notes_buffer = None
     self.button_stamp = None
     # Refresh each explicit criteria control
@@ -357,12 +361,14 @@ class CriteriaPanel(BaseControl):
       criterion_control.refresh(min_max_btn_enabled)
 
   def clear_buffer(self):
-    self._candidates_set = None
+    self._criteria_mask = None
     self._notes_buffer = None
     self.button_stamp = None
 
-  def criteria_filter(self, note_set):
-    return list(set(note_set).intersection(self.notes_with_active_criteria))
+  def criteria_filter(self, rows):
+    """Return notes in rows possessing all active criteria"""
+    rows = rows[self.active_criteria_mask[rows]]
+    return [self.context.notes[i] for i in rows]
 
   # endregion : Public Methods
 
@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import pickle
 from tframe import console
+from tframe.utils.note_store import NoteStore
 
 
 class NoteList(object):
@@ -15,16 +16,17 @@ class NoteList(object):
 
   def load(self, path):
     try:
-      with open(path, 'rb') as f:
-        self.notes = pickle.load(f)
-      assert isinstance(self.notes, list)
+      self.notes = NoteStore.load_notes(path)
       self.summary_path = path
     except:
       print('!! Failed to load {}'.format(path))
 
   def save(self):
-    with open(self.summary_path, 'wb') as f:
-      pickle.dump(self.notes , f, pickle.HIGHEST_PROTOCOL)
+    if NoteStore.is_store(self.summary_path):
+      NoteStore.write(self.summary_path, self.notes)
+    else:
+      with open(self.summary_path, 'wb') as f:
+        pickle.dump(self.notes , f, pickle.HIGHEST_PROTOCOL)
     console.show_status('Note list (length {}) saved to `{}`'.format(
       len(self.notes), self.summary_path))
 
@@ -78,8 +78,8 @@ class HeaderControl(BaseControl):
   def refresh_header(self):
     # Refresh basic info label
     num_notes = len(self.context.notes)
-    num_qualified = len(self.config_panel.qualified_notes)
-    num_selected = len(self.config_panel.matched_notes)
+    num_qualified = len(self.config_panel.qualified_rows)
+    num_selected = len(self.config_panel.matched_rows)
     self.label_notes_info.config(text=self.notes_info.format(
       num_notes, num_qualified, num_selected))
 
@@ -99,13 +99,13 @@ class HeaderControl(BaseControl):
     if note is not None:
       console.show_status('Logs of selected note in header:')
       console.split()
-      print(note.content)
+      print(note.load().content)
       console.split()
 
   def save_selected_note(self, file_name):
     from tframe.utils.note import Note
     assert isinstance(file_name, str)
-    note = self.selected_note
+    note = self.selected_note.load()
     assert isinstance(note, Note)
     note.save(file_name)
     console.show_status('Note saved to `{}`'.format(file_name))
@@ -128,7 +128,7 @@ class HeaderControl(BaseControl):
       text += 'Groups [{}/{}]'.format(index + 1, len(groups))
     else:
       text += '{} Groups -'.format(
-        len(self.main_frame.criteria_panel.groups_for_sorting))
+        self.main_frame.criteria_panel.num_groups_for_sorting)
 
     text += ' Note [{}/{}] '.format(self._cursor + 1, len(self.buffer))
     for i, key in enumerate(self.context.active_criteria_list):
@@ -149,7 +149,7 @@ class HeaderControl(BaseControl):
   def on_label_detail_click(self):
     note = self.selected_note
     if note is not None and note.has_history:
-      viewer = TensorViewer(note=note, plugins=self.main_frame.plugins)
+      viewer = TensorViewer(note=note.load(), plugins=self.main_frame.plugins)
       viewer.show()
 
   def move_cursor(self, offset):
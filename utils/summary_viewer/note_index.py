@@ -0,0 +1,382 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import pickle
+import numpy as np
+from collections import OrderedDict
+
+from tframe.utils.note_store import NoteStore
+
+
+class NoteIndex(object):
+  """Columnar index of configs and criteria of notes in a summary file.
+
+     Each config is stored as an integer array of codes into the list of its
+     distinct values (-1 for notes without this config), and each criterion
+     as a float array (nan for notes without this criterion). Filter queries
+     in SummaryViewer are answered by comparing codes instead of scanning
+     notes.
+
+     The index is persisted to `xxx.sum.vidx`. For a note store, it is
+     extended with notes appended since it was saved, otherwise it is
+     rebuilt whenever the summary file changes.
+  """
+  EXTENSION = 'vidx'
+  VERSION = 2
+
+  def __init__(self):
+    self.size = 0
+    self.codes = OrderedDict()
+    self.values = OrderedDict()
+    self.criteria = OrderedDict()
+    # Presence of criteria, tracked apart from values since a criterion
+    # .. can be put down as NaN
+    self.present = OrderedDict()
+    # Criteria with non-integer values
+    self.float_criteria = set()
+    self.has_history = np.zeros(0, dtype=bool)
+    # Locations of notes in note store
+    self.offsets = np.zeros(0, dtype=np.int64)
+    self.lengths = np.zeros(0, dtype=np.int64)
+    # Signature of summary file
+    self.signature = None
+
+    self._lookup = {}
+
+  # region : Public Methods
+
+  def extend(self, notes, entries=None):
+    """Append notes to index. Notes can be a generator thus are visited
+       only once"""
+    configs, criteria, has_history = [], [], []
+    for note in notes:
+      configs.append(note.configs)
+      criteria.append(note.criteria)
+      has_history.append(note.has_history)
+    n = len(configs)
+    if n == 0: return
+
+    # Encode configs
+    for key in set().union(*[c.keys() for c in configs]):
+      if key not in self.codes:
+        self.codes[key] = np.full(self.size, -1, dtype=np.int32)
+        self.values[key] = []
+      codes = np.full(n, -1, dtype=np.int32)
+      for i, c in enumerate(configs):
+        if key in c: codes[i] = self._encode(key, c[key])
+      self.codes[key] = np.concatenate([self.codes[key], codes])
+    for key in self.codes.keys():
+      if len(self.codes[key]) == self.size: self.codes[key] = np.concatenate(
+        [self.codes[key], np.full(n, -1, dtype=np.int32)])
+
+    # Stack criteria
+    for key in set().union(*[c.keys() for c in criteria]):
+      if key not in self.criteria:
+        self.criteria[key] = np.full(self.size, np.nan)
+        self.present[key] = np.zeros(self.size, dtype=bool)
+      if not all([isinstance(c[key], (int, np.integer))
+                  for c in criteria if key in c]):
+        self.float_criteria.add(key)
+      column = [c.get(key, np.nan) for c in criteria]
+      self.criteria[key] = np.concatenate(
+        [self.criteria[key], np.array(column, dtype=np.float64)])
+      self.present[key] = np.concatenate(
+        [self.present[key], np.array([key in c for c in criteria])])
+    for key in self.criteria.keys():
+      if len(self.criteria[key]) == self.size:
+        self.criteria[key] = np.concatenate(
+          [self.criteria[key], np.full(n, np.nan)])
+        self.present[key] = np.concatenate(
+          [self.present[key], np.zeros(n, dtype=bool)])
+
+    self.has_history = np.concatenate(
+      [self.has_history, np.array(has_history, dtype=bool)])
+    if entries is not None:
+      self.offsets = np.concatenate(
+        [self.offsets, [e['offset'] for e in entries]]).astype(np.int64)
+      self.lengths = np.concatenate(
+        [self.lengths, [e['length'] for e in entries]]).astype(np.int64)
+    self.size += n
+
+  def map_values(self, key, func):
+    """Replace each distinct value v of config `key` with func(v). Codes
+       are merged if different values are mapped to the same one"""
+    mapped, lookup, remap = [], {}, []
+    for v in self.values[key]:
+      v = self._hashable(func(v))
+      if v not in lookup:
+        lookup[v] = len(mapped)
+        mapped.append(v)
+      remap.append(lookup[v])
+    codes = self.codes[key]
+    if len(remap) > 0:
+      # Code -1 is kept as -1
+      self.codes[key] = np.append(remap, -1).astype(np.int32)[codes]
+    self.values[key] = mapped
+    self._lookup[key] = lookup
+
+  def has_configs(self, keys, rows=None):
+    """Mask of notes (in rows) having all configs in keys"""
+    mask = np.ones(self.size if rows is None else len(rows), dtype=bool)
+    for key in keys:
+      codes = self.codes[key] if rows is None else self.codes[key][rows]
+      mask &= codes >= 0
+    return mask
+
+  def has_criteria(self, keys):
+    """Mask of notes having all criteria in keys"""
+    mask = np.ones(self.size, dtype=bool)
+    for key in keys: mask &= self.present[key]
+    return mask
+
+  def group(self, rows, keys):
+    """Group rows by values of configs in keys. Return an OrderedDict of
+       ((key, value), ...) -> rows, ordered by first appearance"""
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(keys) == 0: return OrderedDict([((), rows)])
+    if len(rows) == 0: return OrderedDict()
+    # Combine codes into a single integer key if possible. Code -1 is
+    # .. shifted to 0
+    radices = [len(self.values[key]) + 1 for key in keys]
+    if np.prod(radices, dtype=np.float64) < 2 ** 62:
+      combined = np.zeros(len(rows), dtype=np.int64)
+      for key, radix in zip(keys, radices):
+        combined = combined * radix + self.codes[key][rows] + 1
+    else: combined = np.stack([self.codes[key][rows] for key in keys], axis=1)
+    _, first, inverse = np.unique(
+      combined, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # Sort rows by group then split
+    order = np.argsort(inverse, kind='stable')
+    splits = np.split(rows[order], np.cumsum(np.bincount(inverse))[:-1])
+    groups = OrderedDict()
+    for g in np.argsort(first):
+      row = rows[first[g]]
+      groups[tuple([(k, self._value_of(k, row)) for k in keys])] = splits[g]
+    return groups
+
+  def get_configs(self, row):
+    return OrderedDict([(k, self.values[k][codes[row]])
+                        for k, codes in self.codes.items() if codes[row] >= 0])
+
+  def get_criteria(self, row):
+    criteria = OrderedDict()
+    for k, column in self.criteria.items():
+      if not self.present[k][row]: continue
+      criteria[k] = (float(column[row]) if k in self.float_criteria
+                     else int(column[row]))
+    return criteria
+
+  def save(self, path):
+    state = self.__dict__.copy()
+    state.pop('_lookup')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      pickle.dump((self.VERSION, state), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+  # endregion : Public Methods
+
+  # region : Class Methods
+
+  @classmethod
+  def get_index_path(cls, summary_path):
+    return '{}.{}'.format(summary_path, cls.EXTENSION)
+
+  @classmethod
+  def load(cls, path):
+    """Load index from `path`. Return None if failed"""
+    if not os.path.exists(path): return None
+    try:
+      with open(path, 'rb') as f: version, state = pickle.load(f)
+    except Exception: return None
+    if version != cls.VERSION: return None
+    index = cls()
+    index.__dict__.update(state)
+    for key, values in index.values.items():
+      index._lookup[key] = {v: i for i, v in enumerate(values)}
+    return index
+
+  @classmethod
+  def open(cls, summary_path):
+    """Get the index of a summary file, building or extending it if
+       necessary"""
+    index_path = cls.get_index_path(summary_path)
+    index = cls.load(index_path)
+    if NoteStore.is_store(summary_path):
+      store = NoteStore(summary_path)
+      entries = store.entries
+      # Notes can only be appended unless the store is rewritten as a new
+      # .. file, e.g., on compaction
+      signature = os.stat(summary_path).st_ino
+      offsets = np.array([e['offset'] for e in entries[:index.size]]
+                         if index is not None else [], dtype=np.int64)
+      if index is None or index.signature != signature or not np.array_equal(
+          offsets, index.offsets):
+        index = cls()
+        index.signature = signature
+      if index.size == len(entries): return index
+      new_entries = entries[index.size:]
+      index.extend(store.iterate(new_entries), new_entries)
+    else:
+      stat = os.stat(summary_path)
+      signature = (stat.st_size, stat.st_mtime)
+      if index is not None and index.signature == signature: return index
+      index = cls()
+      index.extend(NoteStore.load_notes(summary_path))
+      index.signature = signature
+    index.save(index_path)
+    return index
+
+  # endregion : Class Methods
+
+  # region : Private Methods
+
+  @staticmethod
+  def _hashable(value):
+    if isinstance(value, list): value = tuple(value)
+    try: hash(value)
+    except TypeError: value = str(value)
+    return value
+
+  def _value_of(self, key, row):
+    code = self.codes[key][row]
+    return self.values[key][code] if code >= 0 else None
+
+  def _encode(self, key, value):
+    value = self._hashable(value)
+    lookup = self._lookup.setdefault(key, {})
+    if value not in lookup:
+      lookup[value] = len(self.values[key])
+      self.values[key].append(value)
+    return lookup[value]
+
+  # endregion : Private Methods
+
+
+class LazyNote(object):
+  """Stands for a note in SummaryViewer. Configs and criteria are read from
+     note index while the note itself is loaded only when required, e.g.,
+     when its content or history is to be shown"""
+
+  def __init__(self, index, row, loader):
+    assert isinstance(index, NoteIndex)
+    self.row = row
+    self._index = index
+    self._loader = loader
+    self._configs = None
+    self._criteria = None
+    self._note = None
+
+  @property
+  def configs(self):
+    if self._configs is None: self._configs = self._index.get_configs(self.row)
+    return self._configs
+
+  @property
+  def criteria(self):
+    if self._criteria is None:
+      self._criteria = self._index.get_criteria(self.row)
+    return self._criteria
+
+  @property
+  def has_history(self):
+    return bool(self._index.has_history[self.row])
+
+  def load(self):
+    """Load the note with all its payloads"""
+    if self._note is None: self._note = self._loader(self.row)
+    return self._note
+
+
+if __name__ == '__main__':
+  import time
+  import tempfile
+  from tframe.utils.note import Note
+
+  # Headless benchmark of filter latency on a synthetic summary
+  num_notes = 50000
+  rng = np.random.RandomState(0)
+  hypers = OrderedDict([('lr', [0.1, 0.01, 0.001, 0.0001]),
+                        ('batch_size', [16, 32, 64, 128, 256]),
+                        ('num_layers', [1, 2, 3, 4, 5, 6]),
+                        ('dropout', [0.0, 0.1, 0.2, 0.3, 0.5]),
+                        ('optimizer', ['adam', 'sgd', 'rmsprop'])])
+  notes = []
+  for i in range(num_notes):
+    note = Note()
+    configs = OrderedDict([(k, v[rng.randint(len(v))])
+                           for k, v in hypers.items()])
+    configs['mark'] = 'job{}'.format(i % 5000)
+    if i % 7 == 0: configs['extra'] = i % 3
+    note.put_down_configs(configs)
+    note.put_down_criterion('Best Accuracy', rng.rand())
+    if i % 3: note.put_down_criterion('Total Rounds', int(rng.randint(100)))
+    note.take_down_scalars_and_tensors(
+      0, OrderedDict([('loss', rng.rand())]), OrderedDict())
+    notes.append(note)
+  path = os.path.join(tempfile.mkdtemp(), 'bench.sum')
+  NoteStore.write(path, notes)
+
+  tic = time.time()
+  index = NoteIndex.open(path)
+  print('>> Index built in {:.2f} secs'.format(time.time() - tic))
+  tic = time.time()
+  NoteIndex.open(path)
+  print('>> Index reopened in {:.3f} secs'.format(time.time() - tic))
+
+  # Reference: what ConfigPanel and CriteriaPanel did when (1) a config is
+  # .. (de)activated, i.e., groups are rebuilt, and (2) a config value is
+  # .. selected, i.e., groups are filtered by criteria and looked up
+  keys = sorted(hypers.keys())
+  active_criteria = {'Best Accuracy', 'Total Rounds'}
+  selected = tuple([(k, hypers[k][1]) for k in keys])
+
+  def scan_groups():
+    qualified = [n for n in notes if set(n.configs.keys()).issuperset(keys)]
+    groups = OrderedDict()
+    for n in qualified:
+      groups.setdefault(tuple([(k, n.configs[k]) for k in keys]), []).append(n)
+    with_criteria = set([n for n in notes if set(
+      n.criteria.keys()).issuperset(active_criteria)])
+    return groups, with_criteria
+
+  def scan_select(groups, with_criteria):
+    buffers = [list(set(g).intersection(with_criteria))
+               for g in groups.values()]
+    num_groups = len([b for b in buffers if len(b) > 0])
+    matched = set(groups.get(selected, [])).intersection(with_criteria)
+    return num_groups, sorted([n.configs['mark'] for n in matched])
+
+  def index_groups():
+    rows = np.flatnonzero(index.has_configs(keys))
+    return index.group(rows, keys), index.has_criteria(active_criteria)
+
+  def index_select(groups, mask):
+    num_groups = sum([mask[g].any() for g in groups.values()])
+    matched = groups.get(selected, np.zeros(0, dtype=np.int64))
+    return num_groups, sorted([index.values['mark'][index.codes['mark'][r]]
+                               for r in matched[mask[matched]]])
+
+  assert scan_select(*scan_groups()) == index_select(*index_groups())
+
+  # Criteria put down as NaN still count as present
+  nan_index = NoteIndex()
+  nan_notes = [Note() for _ in range(3)]
+  nan_notes[0].put_down_criterion('Best Accuracy', float('nan'))
+  nan_notes[1].put_down_criterion('Best Accuracy', 0.5)
+  nan_index.extend(nan_notes)
+  assert list(nan_index.has_criteria({'Best Accuracy'})) == [
+    True, True, False]
+  for r, n in enumerate(nan_notes):
+    assert list(nan_index.get_criteria(r).keys()) == list(n.criteria.keys())
+  for name, build, select in (('Scan', scan_groups, scan_select),
+                              ('Index', index_groups, index_select)):
+    tic = time.time()
+    for _ in range(5): buffers = build()
+    toc = time.time()
+    for _ in range(5): select(*buffers)
+    print('>> {}: regrouping {:.1f} ms, selecting {:.1f} ms'.format(
+      name, (toc - tic) / 5 * 1000, (time.time() - toc) / 5 * 1000))
@@ -0,0 +1,270 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import zlib
+import bisect
+import numpy as np
+from collections import OrderedDict
+
+
+class TensorStore(object):
+  """Append-only chunked store of tensor snapshots.
+
+     Snapshots of a tensor, named by the path of keys leading to it in the
+     tensor dict, are buffered and written to data file `xxx` in chunks of
+     at most `chunk_size` snapshots with the same shape and dtype. Each chunk
+     is written as raw bytes, or compressed by zlib if `compress` is True.
+
+     An index file `xxx.idx` holds one json line per chunk containing the
+     tensor name, the snapshot index and step of each snapshot, and the
+     position of the chunk in data file. An entry is appended only after its
+     chunk has been written, thus a chunk left incomplete by a crashed writer
+     is ignored.
+
+     A single snapshot can be read without loading the others. Chunks without
+     compression are read partially while compressed chunks are decompressed
+     as a whole and cached.
+  """
+  INDEX_EXTENSION = 'idx'
+  MAX_CACHED_CHUNKS = 8
+
+  def __init__(self, path, chunk_size=16, compress=False, truncate=False):
+    assert isinstance(path, str) and chunk_size > 0
+    self.path = path
+    self.chunk_size = chunk_size
+    self.compress = compress
+    if truncate:
+      for p in (self.path, self.index_path):
+        if os.path.exists(p): os.remove(p)
+    self._reset()
+
+  # region : Properties
+
+  @property
+  def index_path(self):
+    return '{}.{}'.format(self.path, self.INDEX_EXTENSION)
+
+  @property
+  def names(self):
+    return list(self._chunks.keys())
+
+  @property
+  def size(self):
+    """Number of snapshots taken down"""
+    return max([self.length_of(name) for name in self.names] + [0])
+
+  @property
+  def tensor_dict(self):
+    """Nested OrderedDict of TensorSeries in the order tensors were first
+       taken down"""
+    td = OrderedDict()
+    for name in self.names:
+      d = td
+      for key in name[:-1]: d = d.setdefault(key, OrderedDict())
+      d[name[-1]] = TensorSeries(self, name)
+    return td
+
+  # endregion : Properties
+
+  # region : Public Methods
+
+  def append(self, index, step, tensors):
+    """Take down a snapshot of each tensor in the nested dict `tensors`"""
+    for name, value in self._walk(tensors, ()):
+      value = np.asarray(value)
+      buffer = self._buffers.setdefault(name, [])
+      if len(buffer) > 0 and (value.shape != buffer[0][2].shape or
+                              value.dtype != buffer[0][2].dtype):
+        self._flush(name)
+      self._chunks.setdefault(name, [])
+      self._buffers[name].append((index, step, value))
+      if len(self._buffers[name]) >= self.chunk_size: self._flush(name)
+
+  def flush(self):
+    for name in list(self._buffers.keys()): self._flush(name)
+
+  def length_of(self, name):
+    chunks = self._chunks.get(name, [])
+    length = chunks[-1]['start'] + len(chunks[-1]['indices']) if chunks else 0
+    return length + len(self._buffers.get(name, []))
+
+  def shape_of(self, name):
+    buffer, chunks = self._buffers.get(name), self._chunks[name]
+    if chunks: return tuple(chunks[0]['shape'])
+    return buffer[0][2].shape
+
+  def read(self, name, i):
+    """Read the i-th snapshot of a tensor"""
+    chunks = self._chunks[name]
+    n = self.length_of(name)
+    if i < 0: i += n
+    if not 0 <= i < n: raise IndexError(
+      '!! Snapshot index {} out of range for `{}`'.format(i, '/'.join(name)))
+    # Snapshots not flushed yet are read from buffer
+    flushed = n - len(self._buffers.get(name, []))
+    if i >= flushed: return self._buffers[name][i - flushed][2]
+    chunk = chunks[bisect.bisect_right(self._starts[name], i) - 1]
+    return self._read_chunk(chunk, i - chunk['start'])
+
+  def steps_of(self, name):
+    steps = []
+    for chunk in self._chunks[name]: steps += chunk['steps']
+    return steps + [s for _, s, _ in self._buffers.get(name, [])]
+
+  # endregion : Public Methods
+
+  # region : Private Methods
+
+  def _reset(self):
+    self._chunks = OrderedDict()
+    self._starts = {}
+    self._buffers = OrderedDict()
+    self._cache = OrderedDict()
+    if not os.path.exists(self.index_path): return
+    size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+    with open(self.index_path, 'r') as f:
+      for line in f:
+        # The last line may be incomplete
+        try: chunk = json.loads(line)
+        except ValueError: break
+        if chunk['offset'] + chunk['length'] > size: break
+        self._add_chunk(chunk)
+
+  def _add_chunk(self, chunk):
+    name = tuple(chunk['name'])
+    chunk['start'] = self.length_of(name) - len(self._buffers.get(name, []))
+    self._chunks.setdefault(name, []).append(chunk)
+    self._starts.setdefault(name, []).append(chunk['start'])
+
+  def _flush(self, name):
+    buffer = self._buffers.pop(name, [])
+    if len(buffer) == 0: return
+    data = np.stack([v for _, _, v in buffer])
+    payload = np.ascontiguousarray(data).tobytes()
+    if self.compress: payload = zlib.compress(payload)
+    directory = os.path.dirname(os.path.abspath(self.path))
+    if not os.path.exists(directory): os.makedirs(directory)
+    with open(self.path, 'ab') as f:
+      offset = f.seek(0, os.SEEK_END)
+      f.write(payload)
+    chunk = {'name': list(name), 'indices': [i for i, _, _ in buffer],
+             'steps': [s for _, s, _ in buffer], 'offset': offset,
+             'length': len(payload), 'dtype': data.dtype.str,
+             'shape': list(data.shape[1:]), 'compressed': self.compress}
+    with open(self.index_path, 'a') as f: f.write(json.dumps(chunk) + '\n')
+    self._add_chunk(chunk)
+
+  def _read_chunk(self, chunk, j):
+    dtype, shape = np.dtype(chunk['dtype']), tuple(chunk['shape'])
+    if not chunk['compressed']:
+      nbytes = dtype.itemsize * int(np.prod(shape))
+      with open(self.path, 'rb') as f:
+        f.seek(chunk['offset'] + j * nbytes)
+        return np.frombuffer(f.read(nbytes), dtype=dtype).reshape(shape)
+    key = chunk['offset']
+    if key not in self._cache:
+      with open(self.path, 'rb') as f:
+        f.seek(chunk['offset'])
+        payload = zlib.decompress(f.read(chunk['length']))
+      self._cache[key] = np.frombuffer(payload, dtype=dtype).reshape(
+        (-1,) + shape)
+      if len(self._cache) > self.MAX_CACHED_CHUNKS:
+        self._cache.popitem(last=False)
+    self._cache.move_to_end(key)
+    return self._cache[key][j]
+
+  @staticmethod
+  def _walk(tensors, prefix):
+    assert isinstance(tensors, dict)
+    for key, val in tensors.items():
+      if isinstance(val, dict):
+        for item in TensorStore._walk(val, prefix + (key,)): yield item
+      else: yield prefix + (key,), val
+
+  def __getstate__(self):
+    # Buffered snapshots are written before the store is pickled with a note
+    self.flush()
+    return {'path': self.path, 'chunk_size': self.chunk_size,
+            'compress': self.compress}
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._reset()
+
+  # endregion : Private Methods
+
+
+class TensorSeries(object):
+  """Read-only list of snapshots of a tensor in a TensorStore. Snapshots are
+     read on indexing. `func`, if provided, is applied to each snapshot read"""
+  def __init__(self, store, name, func=None):
+    assert isinstance(store, TensorStore)
+    self.store = store
+    self.name = tuple(name)
+    self.func = func
+
+  @property
+  def shape(self):
+    """Shape of a single raw snapshot"""
+    return self.store.shape_of(self.name)
+
+  @property
+  def steps(self):
+    return self.store.steps_of(self.name)
+
+  def map(self, func):
+    f = func if self.func is None else lambda t: func(self.func(t))
+    return TensorSeries(self.store, self.name, f)
+
+  def __len__(self):
+    return self.store.length_of(self.name)
+
+  def __getitem__(self, item):
+    if isinstance(item, slice):
+      return [self[i] for i in range(*item.indices(len(self)))]
+    tensor = self.store.read(self.name, item)
+    return tensor if self.func is None else self.func(tensor)
+
+  def __iter__(self):
+    for i in range(len(self)): yield self[i]
+
+  def __array__(self, dtype=None, copy=None):
+    array = np.stack(list(self))
+    return array if dtype is None else array.astype(dtype)
+
+
+if __name__ == '__main__':
+  import time
+  import shutil
+  import pickle
+  import tempfile
+
+  root = tempfile.mkdtemp()
+  try:
+    n, shape = 200, (256, 256)
+    snapshots = [np.random.randn(*shape).astype(np.float32) for _ in range(n)]
+    for compress in (False, True):
+      store = TensorStore(os.path.join(root, 'notes.tensors'),
+                          compress=compress, truncate=True)
+      for i, s in enumerate(snapshots):
+        store.append(i, i * 10, OrderedDict(
+          [('W', OrderedDict([('w1', s)])), ('b', s[0])]))
+      # Round trip through pickle as done in Note.save
+      store = pickle.loads(pickle.dumps(store))
+      series = store.tensor_dict['W']['w1']
+      assert len(series) == n and series.steps[-1] == (n - 1) * 10
+      assert all([np.array_equal(series[i], snapshots[i]) for i in range(n)])
+      assert np.array_equal(store.tensor_dict['b'][-1], snapshots[-1][0])
+      tic = time.time()
+      for i in np.random.randint(0, n, 100): _ = series[i]
+      print('>> compress={}: {:.1f} MB on disk, {:.2f} ms per random '
+            'snapshot read'.format(compress, os.path.getsize(store.path) / 1e6,
+                                   (time.time() - tic) * 10))
+    tic = time.time()
+    for _ in range(100): pickle.loads(pickle.dumps(snapshots))
+    print('>> In-note list: {:.2f} ms to load all {} snapshots'.format(
+      (time.time() - tic) * 10, n))
+  finally: shutil.rmtree(root)
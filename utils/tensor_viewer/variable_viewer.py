@@ -17,6 +17,7 @@ from tkinter import ttk
 from tkinter import Frame
 
 from tframe import console
+from tframe.utils.tensor_store import TensorSeries
 from tframe.utils.tensor_viewer.plugin import Plugin, VariableWithView
 
 
@@ -78,7 +79,8 @@ class VariableViewer(Frame):
   def set_variable_dict(self, v_dict, plugins=None):
     """
     Set variable dict to this widgets
-    :param v_dict: a dict whose values are lists of numpy arrays
+    :param v_dict: a dict whose values are lists of numpy arrays or
+                   TensorSeries whose snapshots are read on display
     """
     # Sanity check
     assert isinstance(v_dict, OrderedDict) and len(v_dict) > 0
@@ -93,14 +95,18 @@ class VariableViewer(Frame):
           if len(vd) > 0: dst[k] = vd
           else:
             print(' ! Failed to set `{}` to viewer since its empty.'.format(k))
-        elif isinstance(v, list):
+        elif isinstance(v, (list, TensorSeries)):
+          # Plugins work on lists of numpy arrays
+          if plugins and isinstance(v, TensorSeries): v = list(v)
           flattened = self._flatten(v, name=k)
+          if flattened is None:
+            print(' ! Failed to set `{}` to viewer.'.format(k))
+            continue
           # Loosely check nan
           if np.isnan(flattened[0][0]).any():
             print(' ! Failed to set `{}` to viewer. np.nan detected.'.format(k))
             continue
-          if flattened is not None: dst[k] = flattened
-          else: print(' ! Failed to set `{}` to viewer.'.format(k))
+          dst[k] = flattened
         else: raise TypeError(
             '!! Unknown type {} found in variable dict'.format(type(v)))
       return dst
@@ -132,7 +138,7 @@ class VariableViewer(Frame):
       assert isinstance(combo, ttk.Combobox)
       key = combo.get()
       target = target[key]
-    assert isinstance(target, (tuple, list, VariableWithView))
+    assert isinstance(target, (tuple, list, TensorSeries, VariableWithView))
 
     # Show target
     # Remove color bar if necessary
@@ -319,8 +325,10 @@ class VariableViewer(Frame):
     """Try to re-arrange an image stack, say, of shape (h, w, N) into
         a single image of shape (H, W)
     """
-    assert isinstance(tensor_list, list)
-    tensor = tensor_list[0]
+    assert isinstance(tensor_list, (list, TensorSeries))
+    # Shape of a TensorSeries is known without reading snapshots
+    tensor = (tensor_list if isinstance(tensor_list, TensorSeries)
+              else tensor_list[0])
     if len(tensor.shape) in (2, 1): return tensor_list
     elif len(tensor.shape) == 3 and tensor.shape[2] == 3: return tensor_list
     elif len(tensor.shape) == 4 and tensor.shape[2] != 3: return None
@@ -332,9 +340,9 @@ class VariableViewer(Frame):
     total = tensor.shape[-1]
     edge = int(np.ceil(np.sqrt(total)))
     H, W = h * edge + edge - 1, w * edge + edge - 1
-    new_shape = [H, W] + [3] if len(tensor.shape) == 4 else []
-    new_list = []
-    for t in tensor_list:
+    new_shape = [H, W] + ([3] if len(tensor.shape) == 4 else [])
+
+    def tile(t):
       max_value = np.max(t)
       pie = np.zeros(shape=new_shape, dtype=np.float32)
       for i in range(total):
@@ -347,9 +355,11 @@ class VariableViewer(Frame):
         if len(tensor.shape) == 3:
           pie[i_slice, j_slice] = t[:, :, i] / max_value
         else: pie[i_slice, j_slice, :] = t[:, :, :, i] / max_value
-      new_list.append(pie)
-      # console.print_progress(i, total)
-    return new_list
+      return pie
+
+    # Snapshots in a TensorSeries are converted when displayed
+    if isinstance(tensor_list, TensorSeries): return tensor_list.map(tile)
+    return [tile(t) for t in tensor_list]
 
   # endregion : Utils
 